@@ -0,0 +1,140 @@
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import Column, Integer, MetaData, Table, Text, insert, or_
+
+from config import Config
+from database import DatabaseAdapter, FileRecord, Content
+from tokenizer import term_frequencies, term_offsets
+
+SYLLABLES = ["ka", "lo", "mi", "ren", "tu", "sa", "vor", "ne", "di", "pra", "gel", "os", "fa", "zu", "bin", "te"]
+
+def generate_vocabulary(size, rng):
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+def generate_documents(count, words_per_doc, vocabulary, seed=42):
+    # word frequencies follow Zipf's law like natural text: a few very common words, a long tail of rare ones
+    rng = random.Random(seed)
+    weights = [1.0 / rank for rank in range(1, len(vocabulary) + 1)]
+    for i in range(count):
+        words = rng.choices(vocabulary, weights=weights, k=words_per_doc)
+        content = " ".join(words)
+        file_name = f"doc_{i}.txt"
+        yield {
+            "file_path": f"/bench/dir_{i % 100}/{file_name}",
+            "file_name": file_name,
+            "file_size": len(content),
+            "extension": ".txt",
+            "last_modified": float(i),
+            "content": content,
+            "terms": term_frequencies(file_name, content),
+            "offsets": term_offsets(content),
+        }
+
+def make_config(ranking_method):
+    config = Config("config.json")
+    config.ranking_method = ranking_method
+    config.config["result_cache_mb"] = 0  # every run has to reach the database
+    return config
+
+# the stored text is compressed, so the ILIKE baseline scans a plain copy made for the benchmark
+plain_texts = Table("benchmark_plain_texts", MetaData(),
+                    Column("file_id", Integer, primary_key=True),
+                    Column("content_text", Text))
+
+def copy_plain_texts(db, chunk_size=500):
+    plain_texts.create(db.engine, checkfirst=True)
+    session = db.Session()
+    try:
+        last_id = 0
+        while True:
+            rows = (session.query(Content.file_id, Content.content_data).filter(Content.file_id > last_id)
+                    .order_by(Content.file_id).limit(chunk_size).all())
+            if not rows:
+                break
+            session.execute(insert(plain_texts), [{"file_id": file_id, "content_text": content}
+                                                  for file_id, content in rows])
+            last_id = rows[-1].file_id
+        session.commit()
+    finally:
+        session.close()
+
+def ilike_search(db, terms, limit):
+    # the search before the inverted index: a substring scan of every stored text
+    session = db.Session()
+    try:
+        q = session.query(FileRecord.id).join(plain_texts, plain_texts.c.file_id == FileRecord.id)
+        for term in terms:
+            q = q.filter(or_(plain_texts.c.content_text.ilike(f"%{term}%"), FileRecord.file_name.ilike(f"%{term}%")))
+        return q.order_by(FileRecord.path_score.desc()).limit(limit).all()
+    finally:
+        session.close()
+
+def measure(search, repeat):
+    search()  # warm-up
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = search()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), len(rows)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare ILIKE, postings (bm25) and native full-text search")
+    parser.add_argument("--db-url", help="empty database to fill (default: a temporary SQLite file)")
+    parser.add_argument("--files", type=int, default=5000)
+    parser.add_argument("--words", type=int, default=300, help="words per document")
+    parser.add_argument("--vocabulary", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--limit", type=int, default=50)
+    args = parser.parse_args()
+
+    db_url = args.db_url
+    if db_url is None:
+        db_url = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "benchmark.db")
+
+    # the full-text adapter is created first so its index is filled while the corpus is written
+    fulltext = DatabaseAdapter(db_url, make_config("fulltext"))
+    postings = DatabaseAdapter(db_url, make_config("bm25"))
+    vocabulary = generate_vocabulary(args.vocabulary, random.Random(7))
+    start = time.perf_counter()
+    batch = []
+    for document in generate_documents(args.files, args.words, vocabulary):
+        batch.append(document)
+        if len(batch) == 500:
+            postings.bulk_upsert_files(batch)
+            batch = []
+    if batch:
+        postings.bulk_upsert_files(batch)
+    print(f"Indexed {args.files} files into {db_url} in {time.perf_counter() - start:.1f}s "
+          f"(full-text backend: {fulltext.content_ranking})")
+    copy_plain_texts(postings)
+
+    queries = {
+        "common word": [vocabulary[0]],
+        "medium word": [vocabulary[500]],
+        "rare word": [vocabulary[-1]],
+        "prefix": [vocabulary[500][:3]],
+        "two words": [vocabulary[0], vocabulary[500]],
+    }
+    print(f"{'query':<14}{'method':<10}{'median ms':>10}{'rows':>7}")
+    for name, terms in queries.items():
+        methods = {
+            "ilike": lambda: ilike_search(postings, terms, args.limit),
+            "postings": lambda: postings.search_files(content_terms=terms, limit=args.limit),
+            "fulltext": lambda: fulltext.search_files(content_terms=terms, limit=args.limit),
+        }
+        for method, search in methods.items():
+            median_ms, rows = measure(search, args.repeat)
+            print(f"{name:<14}{method:<10}{median_ms:>10.1f}{rows:>7}")
+    plain_texts.drop(postings.engine)
+
+if __name__ == "__main__":
+    main()
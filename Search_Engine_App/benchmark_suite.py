@@ -0,0 +1,246 @@
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+import fitz
+from PIL import Image, ImageDraw
+
+from benchmark_search import generate_vocabulary, generate_documents, make_config
+from database import DatabaseAdapter
+from export_logs import export_logs_to_txt, export_index_report
+from filecrawler import FileCrawler
+from indexer import Indexer
+from query_parser import parse_query
+from textextractor import TextExtractor
+
+MTIME_BASE = 1_600_000_000  # generated files get fixed modification times, so reruns index the same corpus
+PDF_PAGE_WORDS = 400
+BYTES_PER_MB = 1024 * 1024
+
+def corpus_path(root, i, depth, fanout=8):
+    # file i lives depth directories down; neighbouring files share their parent directories
+    parts = [f"d{(i // fanout ** level) % fanout}" for level in range(depth, 0, -1)]
+    return os.path.join(root, *parts)
+
+def write_pdf(path, content):
+    words = content.split()
+    with fitz.open() as doc:
+        for start in range(0, len(words), PDF_PAGE_WORDS):
+            page = doc.new_page()
+            page.insert_textbox(page.rect + (36, 36, -36, -36), " ".join(words[start:start + PDF_PAGE_WORDS]),
+                                fontsize=8)
+        doc.save(path)
+
+def write_image(path, content):
+    img = Image.new("RGB", (800, 200), "white")
+    ImageDraw.Draw(img).text((10, 10), " ".join(content.split()[:12]), fill="black")
+    img.save(path)
+
+def generate_corpus(root, files, words, vocabulary_size=20000, pdf_ratio=0.1, image_ratio=0.05, depth=4, seed=42):
+    # Writes the same tree, texts and timestamps for the same arguments. Returns a summary.
+    rng = random.Random(seed)
+    vocabulary = generate_vocabulary(vocabulary_size, random.Random(seed + 1))
+    counts = {"txt": 0, "pdf": 0, "png": 0}
+    total_bytes = 0
+    for i, document in enumerate(generate_documents(files, words, vocabulary, seed)):
+        draw = rng.random()
+        kind = "pdf" if draw < pdf_ratio else "png" if draw < pdf_ratio + image_ratio else "txt"
+        directory = corpus_path(root, i, depth)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"doc_{i}.{kind}")
+        if kind == "pdf":
+            write_pdf(path, document["content"])
+        elif kind == "png":
+            write_image(path, document["content"])
+        else:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(document["content"])
+        os.utime(path, (MTIME_BASE + i, MTIME_BASE + i))
+        counts[kind] += 1
+        total_bytes += os.path.getsize(path)
+    return {"files": files, "bytes": total_bytes, "seed": seed, "depth": depth, "words_per_file": words,
+            "by_type": counts}, vocabulary
+
+def percentiles(timings_ms):
+    # p50/p95/p99 of a list of latencies in milliseconds
+    if len(timings_ms) == 1:
+        cuts = timings_ms * 99
+    else:
+        cuts = statistics.quantiles(timings_ms, n=100, method="inclusive")
+    return {"p50_ms": round(cuts[49], 3), "p95_ms": round(cuts[94], 3), "p99_ms": round(cuts[98], 3)}
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return time.perf_counter() - start, result
+
+def measure_queries(search, queries, repeat):
+    # latency percentiles per query and over all of them, plus queries per second
+    results = {}
+    all_timings = []
+    for name, raw_query in queries.items():
+        path_terms, content_terms, filters = parse_query(raw_query, with_filters=True)
+        search(path_terms, content_terms, filters)  # warm-up
+        timings = []
+        rows = 0
+        for _ in range(repeat):
+            seconds, rows = timed(lambda: search(path_terms, content_terms, filters))
+            timings.append(seconds * 1000)
+        results[name] = dict(percentiles(timings), rows=rows)
+        all_timings.extend(timings)
+    results["all"] = dict(percentiles(all_timings),
+                          queries_per_sec=round(len(all_timings) / (sum(all_timings) / 1000), 1))
+    return results
+
+def benchmark_queries(vocabulary):
+    common, medium = vocabulary[0], vocabulary[len(vocabulary) // 40]
+    return {
+        "common_word": common,
+        "medium_word": medium,
+        "prefix": medium[:3],
+        "two_words": f"{common} {medium}",
+        "path": "path:d1",
+        "filtered": f"{common} ext:pdf",
+    }
+
+def run_suite(root, db_url, corpus, vocabulary, workers=0, repeat=20, limit=50):
+    config = make_config("bm25")
+    config.config.update({"index_workers": workers, "extraction_cache": {"path": ""}})
+    db = DatabaseAdapter(db_url, config)
+    files, size_mb = corpus["files"], corpus["bytes"] / BYTES_PER_MB
+    results = {"corpus": corpus}
+
+    crawler = FileCrawler(config.get_ignore_patterns(), config.get_allowed_extensions())
+    seconds, crawled = timed(lambda: sum(1 for _ in crawler.crawl(root)))
+    results["crawl"] = {"seconds": round(seconds, 3), "files": crawled,
+                        "files_per_sec": round(crawled / seconds, 1)}
+
+    indexer = Indexer(db, TextExtractor(max_chars=config.get_max_indexed_chars()), config)
+    for run in ("index", "reindex_unchanged"):
+        seconds, _ = timed(lambda: indexer.process_files(crawler.crawl(root), root=root, total=files))
+        results[run] = {"seconds": round(seconds, 3), "files_per_sec": round(files / seconds, 1),
+                        "mb_per_sec": round(size_mb / seconds, 2), "errors": indexer.errors}
+    indexer.close()
+
+    queries = benchmark_queries(vocabulary)
+    results["search"] = measure_queries(
+        lambda path_terms, content_terms, filters: len(db.search_files(path_terms, content_terms, limit, filters)),
+        queries, repeat)
+
+    def first_page(path_terms, content_terms, filters):
+        rows, _ = db.search_files_page(path_terms, content_terms, limit, filters=filters)
+        db.get_snippets([row.id for row in rows], content_terms)
+        return len(rows)
+    results["search_page"] = measure_queries(first_page, queries, repeat)
+
+    export_dir = tempfile.mkdtemp()
+    try:
+        logs_seconds, _ = timed(lambda: export_logs_to_txt(db, os.path.join(export_dir, "logs.txt")))
+        report_seconds, _ = timed(lambda: export_index_report(db, config, os.path.join(export_dir, "report")))
+    finally:
+        shutil.rmtree(export_dir)
+    results["export"] = {"logs_seconds": round(logs_seconds, 3), "report_seconds": round(report_seconds, 3)}
+    db.engine.dispose()
+    return results
+
+def flatten(results, prefix=""):
+    # {"search": {"all": {"p95_ms": 3}}} -> {"search.all.p95_ms": 3}
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+def check_thresholds(results, thresholds):
+    # thresholds: {"search.all.p95_ms": {"max": 50}, "index.files_per_sec": {"min": 100}}
+    flat = flatten(results)
+    failures = []
+    for metric, limits in thresholds.items():
+        value = flat.get(metric)
+        if value is None:
+            continue
+        if "max" in limits and value > limits["max"]:
+            failures.append(f"{metric} = {value} is above the threshold {limits['max']}")
+        if "min" in limits and value < limits["min"]:
+            failures.append(f"{metric} = {value} is below the threshold {limits['min']}")
+    return failures
+
+def compare_to_baseline(results, baseline, tolerance):
+    # times may grow and throughputs may drop by at most `tolerance` relative to an earlier run
+    flat, base = flatten(results), flatten(baseline)
+    failures = []
+    for metric, value in flat.items():
+        old = base.get(metric)
+        if not old or metric.startswith("corpus."):
+            continue
+        if (metric.endswith("_ms") or metric.endswith("seconds")) and value > old * (1 + tolerance):
+            failures.append(f"{metric} = {value} regressed from {old}")
+        elif metric.endswith("_per_sec") and value < old * (1 - tolerance):
+            failures.append(f"{metric} = {value} regressed from {old}")
+    return failures
+
+def environment():
+    return {"python": platform.python_version(), "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(), "cpus": os.cpu_count()}
+
+def main():
+    parser = argparse.ArgumentParser(description="Crawl, index, search and export benchmark on a generated corpus")
+    parser.add_argument("--files", type=int, default=1000)
+    parser.add_argument("--words", type=int, default=300, help="words per document")
+    parser.add_argument("--vocabulary", type=int, default=20000)
+    parser.add_argument("--pdf-ratio", type=float, default=0.1)
+    parser.add_argument("--image-ratio", type=float, default=0.05)
+    parser.add_argument("--depth", type=int, default=4, help="directory levels above each file")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=0, help="index_workers used while indexing")
+    parser.add_argument("--repeat", type=int, default=20, help="runs per search query")
+    parser.add_argument("--corpus-dir", help="where to generate the corpus (default: a temporary directory)")
+    parser.add_argument("--db-url", help="empty database to fill (default: a temporary SQLite file)")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--thresholds", default="benchmark_thresholds.json",
+                        help="absolute limits per metric; only checked when the file exists")
+    parser.add_argument("--baseline", help="results of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown relative to the baseline")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp()
+    root = args.corpus_dir or os.path.join(work_dir, "corpus")
+    db_url = args.db_url or "sqlite:///" + os.path.join(work_dir, "benchmark.db")
+    try:
+        start = time.perf_counter()
+        corpus, vocabulary = generate_corpus(root, args.files, args.words, args.vocabulary, args.pdf_ratio,
+                                             args.image_ratio, args.depth, args.seed)
+        print(f"Generated {args.files} files ({corpus['bytes'] / BYTES_PER_MB:.1f} MB) in "
+              f"{time.perf_counter() - start:.1f}s")
+        results = run_suite(root, db_url, corpus, vocabulary, args.workers, args.repeat)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    results["environment"] = environment()
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    failures = []
+    if os.path.exists(args.thresholds):
+        with open(args.thresholds, encoding="utf-8") as f:
+            failures += check_thresholds(results, json.load(f))
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            failures += compare_to_baseline(results, json.load(f), args.tolerance)
+    for failure in failures:
+        print(f"REGRESSION: {failure}")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+from config import Config
+from database import DatabaseAdapter
+from filecrawler import FileCrawler
+from indexer import Indexer
+from metrics import REGISTRY, profiled
+from search_service import SearchService, format_cursor, parse_cursor, search_page, HttpError
+from textextractor import create_text_extractor
+from watcher import FileWatcher
+
+# pooled connections beyond one per search worker: indexing writes, the log sink and the watcher
+POOL_HEADROOM = 4
+
+def build_crawler(config):
+    return FileCrawler(config.get_ignore_patterns(), config.get_allowed_extensions())
+
+def write_metrics(config):
+    metrics_file = config.get_metrics_settings()["file"]
+    if metrics_file:
+        REGISTRY.write(metrics_file)
+
+def print_progress(progress):
+    total = f"/{progress['total']}" if progress["total"] else ""
+    print(f"\r{progress['files']}{total} files, {progress['files_per_sec']:.1f} files/s, "
+          f"{progress['errors']} errors", end="", flush=True)
+
+def index(args, config, db):
+    crawler = build_crawler(config)
+    indexer = Indexer(db, create_text_extractor(config), config)
+    indexer.progress_callback = print_progress
+    try:
+        with profiled(args.profile or config.get_metrics_settings()["profile"]):
+            indexer.process_files(crawler.crawl(args.root), root=args.root)
+        print()
+        if indexer.files_seen:
+            indexer.generate_report()
+        counts = indexer.change_counts
+        print(f"Indexed {args.root} in {indexer.progress()['elapsed']:.2f} seconds. {indexer.files_seen} file(s) found. "
+              f"New: {counts['new']}, changed: {counts['changed']}, unchanged: {counts['unchanged']}, "
+              f"failed: {counts['failed']}, deleted: {counts['deleted']}, errors: {indexer.errors}. "
+              f"{indexer.storage_summary()} {indexer.stage_summary()}")
+    except KeyboardInterrupt:
+        # process_files has committed the files extracted so far on its way out
+        print("\nIndexing cancelled.")
+    finally:
+        indexer.close()
+        write_metrics(config)
+    return 1 if indexer.errors else 0
+
+def start_watcher(config, db, roots):
+    watcher = FileWatcher(Indexer(db, create_text_extractor(config), config), build_crawler(config), roots,
+                          **config.get_watch_settings())
+    watcher.start()
+    print(f"Watching {', '.join(roots)} for changes.")
+    return watcher
+
+def stop_watcher(watcher):
+    watcher.stop()
+    watcher.indexer.close()
+
+def watch(args, config, db):
+    watcher = start_watcher(config, db, args.roots)
+    try:
+        while watcher.is_running():
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_watcher(watcher)
+    return 0
+
+def search(args, config, db):
+    try:
+        cursor = parse_cursor(args.cursor) if args.cursor else None
+    except HttpError as e:
+        print(e)
+        return 2
+    _, results, next_cursor = search_page(db, args.query, args.limit or config.get_page_size(), cursor)
+    if args.json:
+        print(json.dumps({"query": args.query, "results": results, "next_cursor": format_cursor(next_cursor)},
+                         indent=2))
+        return 0
+    for result in results:
+        page = f" (page {result['page']})" if result["page"] else ""
+        print(f"{result['score']:8.2f}  {result['path']}{page}")
+        if result["snippet"]:
+            print(f"          {' '.join(result['snippet'].split())}")
+    if not results:
+        print("No matching files.")
+    elif next_cursor is not None:
+        print(f"More results: --cursor {format_cursor(next_cursor)}")
+    return 0
+
+def serve(args, config, db):
+    settings = config.get_service_settings()
+    service = SearchService(db, Indexer(db, create_text_extractor(config), config), build_crawler(config),
+                            workers=settings["workers"], max_queued=settings["max_queued"],
+                            page_size=config.get_page_size(), log_queries=args.log_queries)
+    watcher = start_watcher(config, db, args.watch) if args.watch else None
+    try:
+        service.run(args.host or settings["host"], args.port if args.port is not None else settings["port"])
+    finally:
+        if watcher is not None:
+            stop_watcher(watcher)
+        service.indexer.close()
+        write_metrics(config)
+    return 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Index, watch and search without the GUI, or serve searches over HTTP")
+    parser.add_argument("--config", default="config.json")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    index_parser = commands.add_parser("index", help="index a folder once")
+    index_parser.add_argument("root")
+    index_parser.add_argument("--profile", help="write a cProfile of the run to this file")
+    index_parser.set_defaults(handler=index)
+
+    watch_parser = commands.add_parser("watch", help="keep the index of folders in sync until Ctrl+C")
+    watch_parser.add_argument("roots", nargs="+")
+    watch_parser.set_defaults(handler=watch)
+
+    search_parser = commands.add_parser("search", help="run one query, same syntax as the search bar")
+    search_parser.add_argument("query")
+    search_parser.add_argument("--limit", type=int)
+    search_parser.add_argument("--cursor", help="next page cursor printed by an earlier search")
+    search_parser.add_argument("--json", action="store_true")
+    search_parser.set_defaults(handler=search)
+
+    serve_parser = commands.add_parser("serve", help="HTTP/JSON search service (see search_service.py)")
+    serve_parser.add_argument("--host")
+    serve_parser.add_argument("--port", type=int)
+    serve_parser.add_argument("--watch", nargs="+", metavar="ROOT", help="also keep these folders indexed")
+    serve_parser.add_argument("--log-queries", action="store_true", help="record searches in the search history")
+    serve_parser.set_defaults(handler=serve)
+
+    args = parser.parse_args(argv)
+    for name in ("root", "roots", "watch"):
+        value = getattr(args, name, None)
+        if isinstance(value, str):
+            setattr(args, name, os.path.abspath(value))
+        elif value:
+            setattr(args, name, [os.path.abspath(root) for root in value])
+    config = Config(args.config)
+    pool_size = config.get_service_settings()["workers"] + POOL_HEADROOM if args.command == "serve" else None
+    db = DatabaseAdapter(config.get_db_url(), config, pool_size=pool_size)
+    try:
+        return args.handler(args, config, db)
+    finally:
+        db.engine.dispose()
+
+if __name__ == "__main__":
+    sys.exit(main())
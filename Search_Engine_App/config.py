@@ -41,4 +41,90 @@ class Config:
         return self.ranking_method
 
     def get_db_url(self):
-        return self.config.get("db_url", "")
\ No newline at end of file
+        return self.config.get("db_url", "")
+
+    def get_ranking_weights(self):
+        # how content relevance (bm25/tfidf) and path_score are combined
+        weights = {"content": 1.0, "path": 0.05}
+        weights.update(self.config.get("ranking_weights", {}))
+        return weights
+
+    def get_bm25_parameters(self):
+        params = {"k1": 1.2, "b": 0.75}
+        params.update(self.config.get("bm25", {}))
+        return params
+
+    def get_max_results(self):
+        return self.config.get("max_results", 200)
+
+    def get_index_workers(self):
+        # number of extraction processes; 1 keeps indexing in the calling thread, 0 = one per CPU
+        workers = self.config.get("index_workers", 1)
+        return workers if workers else (os.cpu_count() or 1)
+
+    def get_extraction_timeout(self):
+        # seconds a single file may spend in a worker before it is abandoned
+        return self.config.get("extraction_timeout", 300)
+
+    def get_max_indexed_chars(self):
+        # extracted text indexed per file; the rest of a larger file is neither read nor searchable
+        return int(self.config.get("max_indexed_mb", 64) * 1024 * 1024)
+
+    def get_write_batch_size(self):
+        # extracted files written per bulk upsert transaction
+        return self.config.get("write_batch_size", 200)
+
+    def get_log_batch_size(self):
+        # indexing log lines written per transaction
+        return self.config.get("log_batch_size", 500)
+
+    def get_export_settings(self):
+        # "full" rewrites an export, "delta" only covers what changed since the last one
+        # (appended for the logs, <name>_delta.<ext> for the index report)
+        settings = {"logs": "delta", "report": "full", "chunk_size": 1000}
+        settings.update(self.config.get("export", {}))
+        return settings
+
+    def get_watch_settings(self):
+        # backend: "auto" (inotify on Linux, polling elsewhere), "inotify" or "polling"
+        settings = {"debounce": 1.0, "poll_interval": 5.0, "backend": "auto"}
+        settings.update(self.config.get("watch", {}))
+        return settings
+
+    def get_extraction_cache_settings(self):
+        # path of the extraction cache (empty disables it) and its size bound
+        settings = {"path": "extraction_cache.db", "max_mb": 512}
+        settings.update(self.config.get("extraction_cache", {}))
+        return settings
+
+    def get_ocr_settings(self):
+        # image OCR runs after all other files in its own niced worker processes
+        settings = {"workers": 1, "nice": 10, "timeout": 120, "max_megapixels": 16}
+        settings.update(self.config.get("ocr", {}))
+        return settings
+
+    def get_metrics_settings(self):
+        # Prometheus text file written after indexing and on exit, optional local /metrics port
+        # (0 = off) and a cProfile output file for indexing runs (empty = off)
+        settings = {"file": "metrics.prom", "port": 0, "profile": ""}
+        settings.update(self.config.get("metrics", {}))
+        return settings
+
+    def get_service_settings(self):
+        # headless HTTP/JSON service: workers = searches run at once (one pooled connection each),
+        # max_queued = requests waiting for a worker before new ones are refused with 503
+        settings = {"host": "127.0.0.1", "port": 8765, "workers": 8, "max_queued": 256}
+        settings.update(self.config.get("service", {}))
+        return settings
+
+    def get_page_size(self):
+        # search results fetched per page in the GUI
+        return self.config.get("page_size", 50)
+
+    def get_live_search_debounce(self):
+        # milliseconds the search bar must be idle before a live search starts
+        return self.config.get("live_search_debounce_ms", 250)
+
+    def get_result_cache_mb(self):
+        # memory bound of the in-process search result cache
+        return self.config.get("result_cache_mb", 64)
@@ -0,0 +1,43 @@
+import zlib
+
+# Extracted texts are stored as one codec byte followed by the payload. The codec is
+# chosen per row by size: short texts are not worth a zlib header, long ones trade a
+# little ratio for speed.
+RAW = 0
+ZLIB = 1
+MIN_COMPRESS_BYTES = 512
+FAST_COMPRESS_BYTES = 4 * 1024 * 1024
+ZLIB_LEVEL = 6
+ZLIB_FAST_LEVEL = 1
+
+def compress_text(text):
+    if text is None:
+        return None
+    data = text.encode("utf-8", errors="replace")
+    if len(data) >= MIN_COMPRESS_BYTES:
+        level = ZLIB_FAST_LEVEL if len(data) >= FAST_COMPRESS_BYTES else ZLIB_LEVEL
+        compressed = zlib.compress(data, level)
+        if len(compressed) < len(data):
+            return bytes([ZLIB]) + compressed
+    return bytes([RAW]) + data
+
+def decompress_text(blob, max_chars=None):
+    # max_chars: only the head of the text is needed (snippets), stop inflating early
+    if blob is None:
+        return None
+    blob = bytes(blob)
+    codec, payload = blob[0], blob[1:]
+    # a character is at most 4 bytes in UTF-8
+    max_bytes = max_chars * 4 if max_chars is not None else None
+    if codec == ZLIB:
+        if max_bytes is None:
+            data = zlib.decompress(payload)
+        else:
+            data = zlib.decompressobj().decompress(payload, max_bytes)
+    elif codec == RAW:
+        data = payload if max_bytes is None else payload[:max_bytes]
+    else:
+        raise ValueError(f"Unknown content codec {codec}")
+    # a cut inside a multi-byte character is dropped
+    text = data.decode("utf-8", errors="ignore" if max_bytes is not None else "strict")
+    return text if max_chars is None else text[:max_chars]
@@ -1,13 +1,40 @@
-from sqlalchemy import create_engine, Column,or_, Integer, String, Float, Text, DateTime, ForeignKey, Index
+from sqlalchemy import (create_engine, event, inspect, text, Column, or_, and_, case, distinct, func, select, insert, update,
+                        table, column, literal, literal_column, type_coerce, Boolean, Integer, String, Float, Text, DateTime, LargeBinary,
+                        ForeignKey, Index)
+from sqlalchemy.engine import make_url
+from sqlalchemy.types import TypeDecorator
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.schema import CreateIndex
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship, sessionmaker, scoped_session, joinedload
 from datetime import datetime
 from config import Config
+from metrics import SEARCH_SECONDS
+from content_codec import compress_text, decompress_text
+from query_parser import normalize_query
+from tokenizer import PAGE_BREAK, tokenize, term_frequencies, term_offsets, prefix_upper_bound, page_starts
+from result_cache import SearchResultCache
+from snippets import SNIPPET_WINDOW, best_window, trim_to_words, highlight
 import pandas as pd
 from fpdf import FPDF
+import math
 import os
+import time
+from bisect import bisect_right
 
 Base = declarative_base()
+
+class CompressedText(TypeDecorator):
+    # extracted text, compressed per row by content_codec; queries read and write plain str
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return compress_text(value)
+
+    def process_result_value(self, value, dialect):
+        return decompress_text(value)
+
 # Table to store file metadata
 class FileRecord(Base):
     __tablename__ = 'files'
@@ -19,11 +46,19 @@ class FileRecord(Base):
     last_modified = Column(Float, nullable=False)
     updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
     path_score = Column(Float, default=0.0)
+    doc_length = Column(Integer, default=0)   # number of indexed tokens, for BM25 length normalisation
+    ocr_pending = Column(Boolean, default=False)  # image stored by name, OCR text not extracted yet
+    extraction_failed = Column(Boolean, default=False)  # stored by name only, extraction is retried next run
 
     content = relationship("Content", back_populates="file", cascade="all, delete-orphan", uselist=False)
 
     __table_args__ = (
         Index('ix_file_path', 'file_path'),
+        # ext:/size:/modified: filters; extensions are compared case-insensitively
+        Index('ix_files_extension', func.lower(extension)),
+        Index('ix_files_file_size', 'file_size'),
+        Index('ix_files_last_modified', 'last_modified'),
+        Index('ix_files_updated_at', 'updated_at'),   # delta exports
     )
 
 # Table to store file content
@@ -31,12 +66,20 @@ class Content(Base):
     __tablename__ = 'contents'
     id = Column(Integer, primary_key=True, autoincrement=True)
     file_id = Column(Integer, ForeignKey('files.id'), nullable=False)
-    content_text = Column(Text, nullable=True)
+    snippet = Column(Text, nullable=True)  # bounded head of the text, what result lists read
     updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+    content_size = Column(Integer, nullable=True)  # UTF-8 bytes of the text before compression
+    page_starts = Column(Text, nullable=True)  # comma separated offsets of pages 2..n, to place hits on a page
+    # the full text, last so reading the other columns never touches its overflow pages
+    content_data = Column(CompressedText, nullable=True)
 
     # Establish relationship with FileRecord
     file = relationship("FileRecord", back_populates="content")
 
+    __table_args__ = (
+        Index('ix_contents_file_id', 'file_id', unique=True),
+    )
+
 # Table to store log entries
 class LogEntry(Base):
     __tablename__ = 'logs'
@@ -45,6 +88,82 @@ class LogEntry(Base):
     level = Column(String, nullable=True)                               # Log level (INFO, ERROR)
     message = Column(Text, nullable=False)                             # Log message
 
+# One row per search that was run
+class SearchHistory(Base):
+    __tablename__ = 'search_history'
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    query_text = Column(Text, nullable=False)
+    normalized = Column(Text, nullable=False)
+    result_count = Column(Integer, nullable=True)
+    latency_ms = Column(Float, nullable=True)
+    timestamp = Column(DateTime, default=datetime.now, nullable=False)
+
+    __table_args__ = (
+        Index('ix_search_history_timestamp', 'timestamp'),
+        Index('ix_search_history_normalized', 'normalized'),
+    )
+
+# Search history aggregated per normalized query; suggestions read only this table
+class SearchQueryStats(Base):
+    __tablename__ = 'search_query_stats'
+    normalized = Column(Text, primary_key=True)
+    query_text = Column(Text, nullable=False)     # as last typed
+    search_count = Column(Integer, default=0, nullable=False)
+    last_result_count = Column(Integer, nullable=True)
+    last_searched = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index('ix_search_query_stats_last_searched', 'last_searched'),
+        Index('ix_search_query_stats_popular', 'search_count', 'last_searched'),
+    )
+
+# Where each export stopped, so the next one only writes what is new
+class ExportState(Base):
+    __tablename__ = 'export_state'
+    name = Column(String, primary_key=True)
+    last_log_id = Column(Integer, default=0)     # logs: highest id already written
+    last_run = Column(DateTime, nullable=True)   # index report: start of the last export
+
+# Moved on by every committed index change. It lives in the database, not the adapter, so a
+# search service sees writes from other processes (the CLI, a watcher) and drops stale cached results.
+class IndexState(Base):
+    __tablename__ = 'index_state'
+    name = Column(String, primary_key=True)
+    generation = Column(Integer, default=0, nullable=False)
+
+INDEX_STATE = "index"
+
+# Paths removed from the index (deleted or moved away), so delta index reports can list them.
+# Rows older than every export are pruned by prune_deleted_files().
+class DeletedFile(Base):
+    __tablename__ = 'deleted_files'
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    file_path = Column(String, nullable=False)
+    deleted_at = Column(DateTime, default=datetime.now, nullable=False)
+
+    __table_args__ = (
+        Index('ix_deleted_files_deleted_at', 'deleted_at'),
+    )
+
+# Inverted index: one row per distinct token
+class IndexTerm(Base):
+    __tablename__ = 'terms'
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    term = Column(String, unique=True, nullable=False)
+    doc_freq = Column(Integer, default=0)     # number of files containing the term
+
+# Inverted index: term -> files containing it
+class Posting(Base):
+    __tablename__ = 'postings'
+    term_id = Column(Integer, ForeignKey('terms.id'), primary_key=True)
+    file_id = Column(Integer, ForeignKey('files.id'), primary_key=True)
+    frequency = Column(Integer, nullable=False, default=1)
+    offsets = Column(Text, nullable=True)  # comma separated character offsets in the text, for snippets
+
+    __table_args__ = (
+        Index('ix_postings_file_id', 'file_id'),
+    )
+
 def compute_lenght_score(file_path):
     #compute lenght
     base_score = 100.0
@@ -69,65 +188,130 @@ def compute_depth_score(file_path):
         score = 1.0
     return score
 
+SNIPPET_LENGTH = 500
+POOL_TIMEOUT = 10  # seconds a caller waits for a free pooled connection before failing
+
+def make_snippet(content):
+    return content[:SNIPPET_LENGTH] if content else content
+
+def make_page_starts(content):
+    return ",".join(map(str, page_starts(content))) or None
+
+def text_size(content):
+    return len(content.encode("utf-8", errors="replace")) if content is not None else None
+
+# ranking_method "fulltext": the database's own full-text index replaces the postings for matching and scoring
+FULLTEXT_MAX_CHARS = 512 * 1024  # PostgreSQL rejects tsvectors over 1MB, only this much of a text is indexed
+TS_RANK_SCALE = 100.0  # ts_rank gives ~0.1 per hit; scaled to the range of BM25 so ranking_weights keep their meaning
+# the stored text is compressed, so the database cannot derive the tsvector itself: the adapter writes it.
+# Like the postings, the file name (with its extension) is indexed along with the text.
+POSTGRES_FULLTEXT_DDL = [
+    "ALTER TABLE contents ADD COLUMN IF NOT EXISTS content_tsv tsvector",
+    "CREATE INDEX IF NOT EXISTS ix_contents_tsv ON contents USING GIN (content_tsv)",
+]
+POSTGRES_TSVECTOR_UPDATE = text("UPDATE contents SET content_tsv = to_tsvector('simple', "
+                                "regexp_replace(files.file_name, '[^[:alnum:]]+', ' ', 'g') || ' ' || "
+                                "coalesce(:content, '')) "
+                                "FROM files WHERE contents.file_id = :file_id AND files.id = contents.file_id")
+# contentless FTS5 table: only the index is kept, the triggers feed it the file name and the
+# decompressed text. Deleting from it needs the indexed values, so contents rows go before their files row.
+SQLITE_FULLTEXT_NAME = "(SELECT file_name FROM files WHERE id = {}.file_id)"
+SQLITE_FULLTEXT_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS contents_fts USING fts5(file_name, content_text, content='')",
+    "CREATE TRIGGER IF NOT EXISTS contents_fts_insert AFTER INSERT ON contents BEGIN "
+    "INSERT INTO contents_fts(rowid, file_name, content_text) "
+    f"VALUES (new.id, {SQLITE_FULLTEXT_NAME.format('new')}, decompress_text(new.content_data)); END",
+    "CREATE TRIGGER IF NOT EXISTS contents_fts_delete AFTER DELETE ON contents BEGIN "
+    "INSERT INTO contents_fts(contents_fts, rowid, file_name, content_text) "
+    f"VALUES ('delete', old.id, {SQLITE_FULLTEXT_NAME.format('old')}, decompress_text(old.content_data)); END",
+    "CREATE TRIGGER IF NOT EXISTS contents_fts_update AFTER UPDATE OF content_data ON contents BEGIN "
+    "INSERT INTO contents_fts(contents_fts, rowid, file_name, content_text) "
+    f"VALUES ('delete', old.id, {SQLITE_FULLTEXT_NAME.format('old')}, decompress_text(old.content_data)); "
+    "INSERT INTO contents_fts(rowid, file_name, content_text) "
+    f"VALUES (new.id, {SQLITE_FULLTEXT_NAME.format('new')}, decompress_text(new.content_data)); END",
+    # rename_file changes the name of a stored text
+    "CREATE TRIGGER IF NOT EXISTS contents_fts_rename AFTER UPDATE OF file_name ON files "
+    "WHEN old.file_name IS NOT new.file_name BEGIN "
+    "INSERT INTO contents_fts(contents_fts, rowid, file_name, content_text) "
+    "SELECT 'delete', id, old.file_name, decompress_text(content_data) FROM contents WHERE file_id = new.id; "
+    "INSERT INTO contents_fts(rowid, file_name, content_text) "
+    "SELECT id, new.file_name, decompress_text(content_data) FROM contents WHERE file_id = new.id; END",
+]
+contents_fts = table("contents_fts", column("rowid"))
+
+# path: terms are '%term%' patterns no B-tree can serve; trigram indexes can
+POSTGRES_PATH_TRIGRAM_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_files_path_trgm ON files USING GIN (file_path gin_trgm_ops)",
+]
+SQLITE_PATH_TRIGRAM_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS files_path_trgm USING fts5(file_path, content='files', content_rowid='id', "
+    "tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS files_path_trgm_insert AFTER INSERT ON files BEGIN "
+    "INSERT INTO files_path_trgm(rowid, file_path) VALUES (new.id, new.file_path); END",
+    "CREATE TRIGGER IF NOT EXISTS files_path_trgm_delete AFTER DELETE ON files BEGIN "
+    "INSERT INTO files_path_trgm(files_path_trgm, rowid, file_path) VALUES ('delete', old.id, old.file_path); END",
+    "CREATE TRIGGER IF NOT EXISTS files_path_trgm_update AFTER UPDATE OF file_path ON files BEGIN "
+    "INSERT INTO files_path_trgm(files_path_trgm, rowid, file_path) VALUES ('delete', old.id, old.file_path); "
+    "INSERT INTO files_path_trgm(rowid, file_path) VALUES (new.id, new.file_path); END",
+]
+files_path_trgm = table("files_path_trgm", column("rowid"), column("file_path"))
+
+def _register_sqlite_functions(dbapi_connection, connection_record):
+    # SQLite has no ln() unless built with math functions; BM25/TF-IDF need it
+    dbapi_connection.create_function("ln", 1, lambda x: math.log(x) if x and x > 0 else 0.0,
+                                     deterministic=True)
+    # the full-text triggers index the text, contents only holds it compressed
+    dbapi_connection.create_function("decompress_text", 1, decompress_text, deterministic=True)
+
 class DatabaseAdapter:
-    def __init__(self, db_url, config):
+    def __init__(self, db_url, config, pool_size=None):
         # Create database connection
-        self.engine = create_engine(db_url, pool_pre_ping=True)
+        # pool_size: connections kept open for concurrent callers (the search service), default 5
+        pool_options = {}
+        if pool_size and make_url(db_url).database not in (None, "", ":memory:"):
+            pool_options = {"pool_size": pool_size, "max_overflow": pool_size // 2, "pool_timeout": POOL_TIMEOUT}
+        self.engine = create_engine(db_url, pool_pre_ping=True, **pool_options)
+        if self.engine.dialect.name == "sqlite":
+            event.listen(self.engine, "connect", _register_sqlite_functions)
         Base.metadata.create_all(self.engine)
+        added_columns = self._add_missing_columns()
+        self._create_missing_indexes()
+        # SQLite answers path: patterns from its trigram table, PostgreSQL's GIN index serves ILIKE directly
+        self.path_trigram_table = self._setup_path_trigrams() and self.engine.dialect.name == "sqlite"
         self.Session = scoped_session(sessionmaker(bind=self.engine))
+        self.compress_legacy_content()
+        # PostgreSQL's tsvector is written by whichever adapter stores the text, not only in fulltext mode
+        self.tsvector_column = (self.engine.dialect.name == "postgresql"
+                                and "content_tsv" in {c["name"] for c in inspect(self.engine).get_columns("contents")})
 
         method = config.get_ranking_method()
         if method == "depth":
             self.score_function = compute_depth_score
         else:
             self.score_function = compute_lenght_score
-    def insert_or_update_file(self, file_path, file_name, file_size, extension, content, last_modified):
-        session = self.Session()
-        try:
-            # Check if the file already exists
-
-            file_record = session.query(FileRecord).filter_by(file_path=file_path).first()
-            if file_record is None:
-                # Create new record if it does not exist
-                file_record = FileRecord(
-                    file_path=file_path,
-                    file_name=file_name,
-                    file_size=file_size,
-                    extension=extension,
-                    last_modified=last_modified,
-                    updated_at=datetime.now()
-                )
-                file_record.path_score = self.score_function(file_path)
+        # bm25/tfidf/fulltext rank by content relevance, combined with path_score
+        self.content_ranking = method if method in ("bm25", "tfidf", "fulltext") else None
+        if self.content_ranking == "fulltext" and not self._setup_fulltext():
+            self.content_ranking = "bm25"
+        self.ranking_weights = config.get_ranking_weights()
+        self.bm25_parameters = config.get_bm25_parameters()
+        self.max_results = config.get_max_results()
+        self.index_generation = self._init_index_generation()  # last value read from index_state
+        self.collection_stats = None  # (generation, n_docs, avg_length) for BM25/TF-IDF
+        self.result_cache = SearchResultCache(config.get_result_cache_mb() * 1024 * 1024)
 
-                session.add(file_record)
-                session.flush()
-                # Insert content in the separate table
-                content_record = Content(
-                    file_id=file_record.id,
-                    content_text=content,
-                    updated_at=datetime.now()
-                )
-                session.add(content_record)
-            else:
-                # Update record if file has changed
-                if last_modified > file_record.last_modified:
-                    file_record.file_name = file_name
-                    file_record.file_size = file_size
-                    file_record.extension = extension
-                    file_record.last_modified = last_modified
-                    file_record.updated_at = datetime.now()
-                    file_record.path_score = self.score_function(file_path)                    # Update content if available
-                    if file_record.content:
-                        file_record.content.content_text = content
-                        file_record.content.updated_at = datetime.now()
-                    else:
-                        content_record = Content(
-                            file_id=file_record.id,
-                            content_text=content,
-                            updated_at=datetime.now()
-                        )
-                        session.add(content_record)
+        self.backfill_postings()
+        if "files.doc_length" in added_columns or "terms.doc_freq" in added_columns:
+            self.refresh_index_statistics()
+        self.backfill_search_history()
 
+    def insert_or_update_file(self, file_path, file_name, file_size, extension, content, last_modified, terms=None,
+                              offsets=None, ocr_pending=False, extraction_failed=False):
+        session = self.Session()
+        try:
+            self._write_file(session, file_path, file_name, file_size, extension, content, last_modified, terms,
+                             offsets, ocr_pending, extraction_failed)
             session.commit()
         except Exception as e:
             session.rollback()
@@ -135,48 +319,781 @@ class DatabaseAdapter:
         finally:
             session.close()
 
+    def _write_file(self, session, file_path, file_name, file_size, extension, content, last_modified, terms=None,
+                    offsets=None, ocr_pending=False, extraction_failed=False, always=False):
+        # always: rewrite an existing row whatever its last_modified, like the native upsert does
+        # Check if the file already exists
+        file_record = session.query(FileRecord).filter_by(file_path=file_path).first()
+        if file_record is None:
+            # Create new record if it does not exist
+            file_record = FileRecord(
+                file_path=file_path,
+                file_name=file_name,
+                file_size=file_size,
+                extension=extension,
+                last_modified=last_modified,
+                ocr_pending=ocr_pending,
+                extraction_failed=extraction_failed,
+                updated_at=datetime.now()
+            )
+            file_record.path_score = self.score_function(file_path)
+            file_record.doc_length = sum(terms.values()) if terms else 0
 
+            session.add(file_record)
+            session.flush()
+            # Insert content in the separate table
+            content_record = Content(
+                file_id=file_record.id,
+                content_data=content,
+                content_size=text_size(content),
+                page_starts=make_page_starts(content),
+                snippet=make_snippet(content),
+                updated_at=datetime.now()
+            )
+            session.add(content_record)
+            self._replace_postings(session, {file_record.id: terms}, {file_record.id: offsets})
+            self._update_tsvectors(session, {file_record.id: content})
+        else:
+            # Update record if file has changed or its text is still missing
+            if (always or last_modified > file_record.last_modified or file_record.ocr_pending
+                    or file_record.extraction_failed):
+                file_record.file_name = file_name
+                file_record.file_size = file_size
+                file_record.extension = extension
+                file_record.last_modified = last_modified
+                file_record.ocr_pending = ocr_pending
+                file_record.extraction_failed = extraction_failed
+                file_record.updated_at = datetime.now()
+                file_record.path_score = self.score_function(file_path)
+                file_record.doc_length = sum(terms.values()) if terms else 0
+                # Update content if available
+                if file_record.content:
+                    file_record.content.content_data = content
+                    file_record.content.content_size = text_size(content)
+                    file_record.content.page_starts = make_page_starts(content)
+                    file_record.content.snippet = make_snippet(content)
+                    file_record.content.updated_at = datetime.now()
+                else:
+                    content_record = Content(
+                        file_id=file_record.id,
+                        content_data=content,
+                        content_size=text_size(content),
+                        page_starts=make_page_starts(content),
+                        snippet=make_snippet(content),
+                        updated_at=datetime.now()
+                    )
+                    session.add(content_record)
+                session.flush()
+                self._replace_postings(session, {file_record.id: terms}, {file_record.id: offsets})
+                self._update_tsvectors(session, {file_record.id: content})
 
-    def search_files(self, path_terms=None, content_terms=None):
+    def bulk_upsert_files(self, documents, chunk_size=500):
+        # documents: dicts with file_path, file_name, file_size, extension, last_modified, content, terms.
+        # The whole batch is written in one transaction with native upserts.
+        by_path = {doc["file_path"]: doc for doc in documents}  # a row may only be upserted once per statement
+        if not by_path:
+            return
+        files_stmt = self._dialect_insert(FileRecord.__table__)
+        if not hasattr(files_stmt, "on_conflict_do_update"):
+            # no native upsert: row by row, still one transaction whose errors reach the caller
+            session = self.Session()
+            try:
+                for doc in by_path.values():
+                    self._write_file(session, doc["file_path"], doc["file_name"], doc["file_size"], doc["extension"],
+                                     doc["content"], doc["last_modified"], terms=doc.get("terms"),
+                                     offsets=doc.get("offsets"), ocr_pending=doc.get("ocr_pending", False),
+                                     extraction_failed=doc.get("extraction_failed", False), always=True)
+                session.commit()
+            except Exception as e:
+                session.rollback()
+                print(f"Error in bulk_upsert_files: {e}")
+                raise
+            finally:
+                session.close()
+            return
 
         session = self.Session()
         try:
-            # Base query
-            q = session.query(
-                FileRecord.id,
-                FileRecord.file_path,
-                FileRecord.file_name,
-                FileRecord.file_size,
-                FileRecord.extension,
-                FileRecord.last_modified,
-                FileRecord.path_score,
-                Content.content_text
-            ).join(Content)
+            now = datetime.now()
+            files_stmt = files_stmt.on_conflict_do_update(
+                index_elements=["file_path"],
+                set_={column: files_stmt.excluded[column] for column in
+                      ("file_name", "file_size", "extension", "last_modified", "updated_at", "path_score",
+                       "doc_length", "ocr_pending", "extraction_failed")})
+            session.execute(files_stmt, [{
+                "file_path": doc["file_path"],
+                "file_name": doc["file_name"],
+                "file_size": doc["file_size"],
+                "extension": doc["extension"],
+                "last_modified": doc["last_modified"],
+                "updated_at": now,
+                "path_score": self.score_function(doc["file_path"]),
+                "doc_length": sum(doc["terms"].values()) if doc.get("terms") else 0,
+                "ocr_pending": doc.get("ocr_pending", False),
+                "extraction_failed": doc.get("extraction_failed", False),
+            } for doc in by_path.values()])
 
-            # Filter by path terms
-            from sqlalchemy import or_
+            paths = list(by_path)
+            file_ids = {}
+            for i in range(0, len(paths), chunk_size):
+                file_ids.update(session.query(FileRecord.file_path, FileRecord.id)
+                                .filter(FileRecord.file_path.in_(paths[i:i + chunk_size])))
 
-            # Path filtering (OR if more "path:", AND if only one"path:")
-            if path_terms:
-                if len(path_terms) == 1:
-                    q = q.filter(FileRecord.file_path.ilike(f"%{path_terms[0]}%"))
+            contents_stmt = self._dialect_insert(Content.__table__)
+            contents_stmt = contents_stmt.on_conflict_do_update(
+                index_elements=["file_id"],
+                set_={column: contents_stmt.excluded[column] for column in
+                      ("content_data", "content_size", "page_starts", "snippet", "updated_at")})
+            session.execute(contents_stmt, [
+                {"file_id": file_ids[path], "content_data": doc["content"], "content_size": text_size(doc["content"]),
+                 "page_starts": make_page_starts(doc["content"]), "snippet": make_snippet(doc["content"]),
+                 "updated_at": now}
+                for path, doc in by_path.items()
+            ])
+            self._update_tsvectors(session, {file_ids[path]: doc["content"] for path, doc in by_path.items()})
+
+            self._replace_postings(session,
+                                   {file_ids[path]: doc.get("terms") for path, doc in by_path.items()},
+                                   {file_ids[path]: doc.get("offsets") for path, doc in by_path.items()})
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            print(f"Error in bulk_upsert_files: {e}")
+            raise
+        finally:
+            session.close()
+
+    def search_files(self, path_terms=None, content_terms=None, limit=None, filters=None):
+        # top-k matches including the full extracted text
+        # filters: (column, op, value) tuples from parse_query(..., with_filters=True)
+        start = time.perf_counter()
+        limit = limit or self.max_results
+        query = self._normalize_query(path_terms, content_terms, filters)
+        key = ("full", query, limit)
+        generation = self.current_index_generation()
+        rows = self.result_cache.get(key, generation)
+        if rows is not None:
+            SEARCH_SECONDS.observe(time.perf_counter() - start, kind="full", cache="hit")
+            return rows
+
+        def run(candidate_ids=None):
+            session = self.Session()
+            try:
+                q, score = self._search_query(session, path_terms, content_terms, Content.content_data,
+                                              candidate_ids, filters)
+                # Best score first, only the top-k rows leave the database
+                return q.order_by(score.desc(), FileRecord.id).limit(limit).all()
+            finally:
+                session.close()
+
+        rows = self._narrow_cached("full", query, generation, run, limit)
+        if rows is None:
+            rows = run()
+        self.result_cache.put(key, generation, query, rows, complete=len(rows) < limit, rows=rows)
+        SEARCH_SECONDS.observe(time.perf_counter() - start, kind="full", cache="miss")
+        return rows
+
+    def search_files_page(self, path_terms=None, content_terms=None, limit=50, cursor=None, filters=None):
+        # One page of matches with a bounded snippet instead of the full text.
+        # cursor is the (score, id) of the last row of the previous page; returns (rows, next_cursor).
+        start = time.perf_counter()
+        query = self._normalize_query(path_terms, content_terms, filters)
+        key = ("page", query, limit, cursor)
+        generation = self.current_index_generation()
+        page = self.result_cache.get(key, generation)
+        if page is not None:
+            SEARCH_SECONDS.observe(time.perf_counter() - start, kind="page", cache="hit")
+            return page
+
+        def run(candidate_ids=None):
+            session = self.Session()
+            try:
+                q, score = self._search_query(session, path_terms, content_terms, Content.snippet,
+                                              candidate_ids, filters)
+                if cursor is not None:
+                    last_score, last_id = cursor
+                    q = q.filter(or_(score < last_score, and_(score == last_score, FileRecord.id > last_id)))
+                return q.order_by(score.desc(), FileRecord.id).limit(limit + 1).all()
+            finally:
+                session.close()
+
+        rows = self._narrow_cached("page", query, generation, run, limit + 1) if cursor is None else None
+        if rows is None:
+            rows = run()
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = (rows[-1].score, rows[-1].id)
+        page = (rows, next_cursor)
+        self.result_cache.put(key, generation, query, page, complete=cursor is None and next_cursor is None,
+                              rows=rows)
+        SEARCH_SECONDS.observe(time.perf_counter() - start, kind="page", cache="miss")
+        return page
+
+    def count_files(self, path_terms=None, content_terms=None, filters=None):
+        # number of files matching the query, not capped by a page or max_results; cached like results
+        query = self._normalize_query(path_terms, content_terms, filters)
+        key = ("count", query)
+        generation = self.current_index_generation()
+        count = self.result_cache.get(key, generation)
+        if count is not None:
+            return count
+        session = self.Session()
+        try:
+            q, _ = self._search_query(session, path_terms, content_terms, Content.file_id, filters=filters)
+            count = q.order_by(None).count()
+        finally:
+            session.close()
+        self.result_cache.put(key, generation, query, count, complete=False, rows=())
+        return count
+
+    def _init_index_generation(self):
+        with self.engine.begin() as conn:
+            generation = conn.execute(select(IndexState.generation).where(IndexState.name == INDEX_STATE)).scalar()
+            if generation is not None:
+                return generation
+            stmt = self._dialect_insert(IndexState.__table__).values(name=INDEX_STATE, generation=0)
+            if hasattr(stmt, "on_conflict_do_nothing"):
+                stmt = stmt.on_conflict_do_nothing(index_elements=["name"])  # another process got there first
+            conn.execute(stmt)
+            return 0
+
+    def current_index_generation(self):
+        # one primary key lookup per search; cached results of older generations are stale
+        with self.engine.connect() as conn:
+            generation = conn.execute(select(IndexState.generation).where(IndexState.name == INDEX_STATE)).scalar()
+        self.index_generation = generation or 0
+        return self.index_generation
+
+    def bump_index_generation(self):
+        # called by the Indexer after committing changes
+        with self.engine.begin() as conn:
+            conn.execute(update(IndexState).where(IndexState.name == INDEX_STATE)
+                         .values(generation=IndexState.generation + 1))
+            generation = conn.execute(select(IndexState.generation).where(IndexState.name == INDEX_STATE)).scalar()
+        self.index_generation = generation or 0
+
+    def _normalize_query(self, path_terms, content_terms, filters=None):
+        tokens, name_terms = self._split_content_terms(content_terms)
+        return (tuple(sorted({term.lower() for term in path_terms or []})),
+                tuple(tokens),
+                tuple(sorted({term.lower() for term in name_terms})),
+                tuple(sorted(set(filters or ()))))
+
+    def _narrow_cached(self, kind, query, generation, run, limit):
+        # A query that only extends a cached complete result (longer token prefix, longer
+        # path: substring) matches a subset of it, so that result can be narrowed instead of
+        # searching the whole index again. limit: rows the caller's own query would return.
+        path_terms, tokens, name_terms, filters = query
+
+        def implies(old):
+            old_paths, old_tokens, old_names, old_filters = old
+            if old_names != name_terms or old_filters != filters:
+                return False
+            if not all(any(token.startswith(old_token) for token in tokens) for old_token in old_tokens):
+                return False
+            if old_paths == path_terms:
+                return True
+            return len(old_paths) <= 1 and len(path_terms) == 1 and (not old_paths or old_paths[0] in path_terms[0])
+
+        found = self.result_cache.find_superset(generation, kind, implies)
+        if found is None:
+            return None
+        old_query, result = found
+        rows = result if kind == "full" else result[0]
+        if old_query[1] == tokens and not any(c in path for path in path_terms for c in "%_"):
+            # same content tokens: scores are unchanged, only the path filter got stricter;
+            # several path: terms are ORed, like in _path_condition
+            rows = [row for row in rows
+                    if not path_terms or any(path in row.file_path.lower() for path in path_terms)]
+            return rows[:limit]
+        # content tokens changed, so scores change too; rescore just the cached candidates
+        return run(candidate_ids=[row.id for row in rows])
+
+    def get_file_content(self, file_id):
+        # full extracted text, loaded and decompressed only when a caller really needs it
+        session = self.Session()
+        try:
+            row = session.query(Content.content_data).filter(Content.file_id == file_id).first()
+            return row.content_data if row else None
+        finally:
+            session.close()
+
+    def get_snippets(self, file_ids, content_terms, window=SNIPPET_WINDOW, with_pages=False):
+        # file_id -> highlight() segments of the window that best matches the query.
+        # The window is chosen from the term offsets stored at index time and each text is
+        # only decompressed up to the end of its window.
+        # with_pages: also return file_id -> page number of the window, for multi-page texts
+        file_ids = list(file_ids)
+        if not file_ids:
+            return ({}, {}) if with_pages else {}
+        tokens, _ = self._split_content_terms(content_terms)
+        session = self.Session()
+        try:
+            hits = {file_id: [] for file_id in file_ids}
+            if tokens:
+                rows = (session.query(Posting.file_id, IndexTerm.term, Posting.offsets)
+                        .join(IndexTerm, IndexTerm.id == Posting.term_id)
+                        .filter(Posting.file_id.in_(file_ids),
+                                or_(*[self._prefix_condition(token) for token in tokens])))
+                for file_id, term, offsets in rows:
+                    if not offsets:
+                        continue
+                    token_index = next(i for i, token in enumerate(tokens) if term.startswith(token))
+                    hits[file_id].extend((int(offset), token_index) for offset in offsets.split(","))
+
+            starts = {}
+            for file_id, file_hits in hits.items():
+                if file_hits:
+                    file_hits.sort()
+                    starts[file_id] = max(0, best_window(file_hits, window) - window // 4)
+
+            fragments = {}
+            pages = {}
+            if starts:
+                # the raw blob, decompress_text() below stops at the window
+                stored = type_coerce(Content.content_data, LargeBinary)
+                for file_id, data, file_page_starts in (session.query(Content.file_id, stored, Content.page_starts)
+                                                        .filter(Content.file_id.in_(list(starts)))):
+                    start = starts[file_id]
+                    fragments[file_id] = ((decompress_text(data, start + window) or "")[start:], start == 0)
+                    if file_page_starts:
+                        # the page of the first hit inside the window
+                        hit = next(offset for offset, _ in hits[file_id] if offset >= start)
+                        pages[file_id] = 1 + bisect_right([int(offset) for offset in file_page_starts.split(",")],
+                                                          hit)
+            # no stored offsets (e.g. only the file name matched): fall back to the head of the text
+            others = [file_id for file_id in file_ids if file_id not in fragments]
+            if others:
+                for file_id, snippet in session.query(Content.file_id, Content.snippet).filter(
+                        Content.file_id.in_(others)):
+                    fragments[file_id] = ((snippet or "")[:window], True)
+
+            snippets = {}
+            for file_id, (fragment, at_start) in fragments.items():
+                text = trim_to_words(fragment.replace(PAGE_BREAK, "\n"), at_start, len(fragment) < window)
+                snippets[file_id] = highlight(text, tokens)
+            return (snippets, pages) if with_pages else snippets
+        finally:
+            session.close()
+
+    def _search_query(self, session, path_terms, content_terms, text_column, candidate_ids=None, filters=None):
+        tokens, name_terms = self._split_content_terms(content_terms)
+        ranked = self.content_ranking is not None and tokens
+        if ranked:
+            scores = self._content_score_subquery(session, tokens, candidate_ids)
+            score = (self.ranking_weights["content"] * scores.c.content_score
+                     + self.ranking_weights["path"] * FileRecord.path_score)
+        else:
+            score = FileRecord.path_score
+
+        # Base query
+        q = session.query(
+            FileRecord.id,
+            FileRecord.file_path,
+            FileRecord.file_name,
+            FileRecord.file_size,
+            FileRecord.extension,
+            FileRecord.last_modified,
+            FileRecord.path_score,
+            text_column,
+            score.label("score")
+        ).join(Content)
+
+        # Path filtering (OR if more "path:", AND if only one"path:")
+        if path_terms:
+            q = q.filter(self._path_condition(path_terms))
+
+        if candidate_ids is not None:
+            q = q.filter(FileRecord.id.in_(candidate_ids))
+
+        # ext:/size:/modified: filters are plain indexed column comparisons
+        for condition in self._filter_conditions(filters):
+            q = q.filter(condition)
+
+        # punctuation-only terms: nothing was indexed for them, match the name
+        for term in name_terms:
+            q = q.filter(FileRecord.file_name.ilike(f"%{term}%"))
+
+        # Filter by content terms through the inverted index (prefix match per token)
+        if ranked:
+            q = q.join(scores, scores.c.file_id == FileRecord.id)
+        else:
+            for token in tokens:
+                q = q.filter(FileRecord.id.in_(self._term_match_subquery(token)))
+        return q, score
+
+    def _path_condition(self, path_terms):
+        # a file matches when its path contains any of the terms (case-insensitive)
+        patterns = [f"%{term}%" for term in path_terms]
+        if self.path_trigram_table:
+            return FileRecord.id.in_(select(files_path_trgm.c.rowid)
+                                     .where(or_(*[files_path_trgm.c.file_path.like(p) for p in patterns])))
+        return or_(*[FileRecord.file_path.ilike(p) for p in patterns])
+
+    def _filter_conditions(self, filters):
+        columns = {
+            "extension": func.lower(FileRecord.extension),
+            "file_size": FileRecord.file_size,
+            "last_modified": FileRecord.last_modified,
+        }
+        conditions = []
+        for column_name, op, value in filters or ():
+            column = columns[column_name]
+            if op == "in":
+                conditions.append(column.in_(value))
+            elif op == "<":
+                conditions.append(column < value)
+            elif op == "<=":
+                conditions.append(column <= value)
+            elif op == ">":
+                conditions.append(column > value)
+            elif op == ">=":
+                conditions.append(column >= value)
+            else:
+                conditions.append(column == value)
+        return conditions
+
+    def _split_content_terms(self, content_terms):
+        tokens, name_terms = [], []
+        for term in content_terms or []:
+            term_tokens = tokenize(term)
+            if term_tokens:
+                tokens.extend(term_tokens)
+            else:
+                name_terms.append(term)
+        # "qui quick": every file matching quick also matches qui, so qui adds nothing;
+        # what is left has disjoint prefix ranges
+        unique = sorted(set(tokens))
+        tokens = [t for t in unique if not any(o != t and o.startswith(t) for o in unique)]
+        return tokens, name_terms
+
+    def _prefix_condition(self, token):
+        # range on terms.term can use its unique B-tree index, LIKE only re-checks the prefix
+        return and_(IndexTerm.term >= token,
+                    IndexTerm.term < prefix_upper_bound(token),
+                    IndexTerm.term.startswith(token, autoescape=True))
+
+    def _collection_stats(self, session):
+        # N and avgdl only change with writes: one scan of files per index generation, not per search.
+        # _replace_postings drops the cached value for writes made without a generation bump.
+        generation = self.index_generation
+        cached = self.collection_stats
+        if cached is not None and cached[0] == generation:
+            return cached[1], cached[2]
+        n_docs, avg_length = session.query(func.count(FileRecord.id), func.avg(FileRecord.doc_length)).one()
+        stats = (n_docs or 0, float(avg_length or 1.0) or 1.0)
+        self.collection_stats = (generation,) + stats
+        return stats
+
+    def _content_score_subquery(self, session, tokens, candidate_ids=None):
+        # file_id -> content relevance, only for files containing every token
+        if self.content_ranking == "fulltext":
+            return self._fulltext_score_subquery(session, tokens, candidate_ids)
+        n_docs, avg_length = self._collection_stats(session)
+        tf = Posting.frequency
+        df = IndexTerm.doc_freq
+        if self.content_ranking == "tfidf":
+            idf = func.ln((n_docs + 1.0) / (df + 1.0)) + 1.0
+            term_score = idf * tf / func.coalesce(func.nullif(FileRecord.doc_length, 0), 1)
+        else:
+            k1, b = self.bm25_parameters["k1"], self.bm25_parameters["b"]
+            idf = func.ln(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+            term_score = idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * FileRecord.doc_length / avg_length))
+
+        conditions = [self._prefix_condition(token) for token in tokens]
+        q = (session.query(Posting.file_id.label("file_id"), func.sum(term_score).label("content_score"))
+             .join(IndexTerm, IndexTerm.id == Posting.term_id)
+             .join(FileRecord, FileRecord.id == Posting.file_id)
+             .filter(or_(*conditions))
+             .group_by(Posting.file_id))
+        if candidate_ids is not None:
+            q = q.filter(Posting.file_id.in_(candidate_ids))
+        if len(tokens) > 1:
+            # which query token a posting belongs to; a file must hit all of them
+            token_index = case(*[(cond, i) for i, cond in enumerate(conditions)])
+            q = q.having(func.count(distinct(token_index)) == len(tokens))
+        return q.subquery()
+
+    def _fulltext_score_subquery(self, session, tokens, candidate_ids=None):
+        # same semantics as the postings path: every token must match as a word prefix
+        if self.engine.dialect.name == "postgresql":
+            tsquery = func.to_tsquery("simple", " & ".join(f"'{token}':*" for token in tokens))
+            content_tsv = literal_column("contents.content_tsv")
+            q = (session.query(Content.file_id.label("file_id"),
+                               (func.ts_rank(content_tsv, tsquery) * TS_RANK_SCALE).label("content_score"))
+                 .filter(content_tsv.op("@@")(tsquery)))
+        else:
+            match = " AND ".join(f'"{token}"*' for token in tokens)
+            fts = literal_column("contents_fts")
+            # bm25() is lower for better matches
+            q = (session.query(Content.file_id.label("file_id"), (-func.bm25(fts)).label("content_score"))
+                 .join(contents_fts, contents_fts.c.rowid == Content.id)
+                 .filter(fts.op("MATCH")(match)))
+        if candidate_ids is not None:
+            q = q.filter(Content.file_id.in_(candidate_ids))
+        return q.subquery()
+
+    def _setup_fulltext(self):
+        # Creates the dialect's full-text index if missing; only the db_url decides which one
+        dialect = self.engine.dialect.name
+        if dialect not in ("postgresql", "sqlite"):
+            print(f"Full-text search is not supported on {dialect}, using bm25")
+            return False
+        try:
+            with self.engine.begin() as conn:
+                if dialect == "postgresql":
+                    for statement in POSTGRES_FULLTEXT_DDL:
+                        conn.execute(text(statement))
                 else:
-                    path_conditions = [FileRecord.file_path.ilike(f"%{term}%") for term in path_terms]
-                    q = q.filter(or_(*path_conditions))
+                    exists = conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'contents_fts'")).first()
+                    for statement in SQLITE_FULLTEXT_DDL:
+                        conn.execute(text(statement))
+                    if not exists:
+                        # texts stored before the table existed
+                        conn.execute(text("INSERT INTO contents_fts(rowid, file_name, content_text) "
+                                          "SELECT contents.id, files.file_name, decompress_text(contents.content_data) "
+                                          "FROM contents JOIN files ON files.id = contents.file_id"))
+            if dialect == "postgresql":
+                self.tsvector_column = True
+                self._fill_tsvectors()
+            return True
+        except Exception as e:
+            print(f"Error setting up full-text search, using bm25: {e}")
+            return False
 
-            # Filter by content terms
-            if content_terms:
-                for term in content_terms:
-                    like_term = f"%{term}%"
-                    q = q.filter(or_(
-                        Content.content_text.ilike(like_term),
-                        FileRecord.file_name.ilike(like_term),
-                        FileRecord.extension.ilike(like_term)
-                    ))
+    def _update_tsvectors(self, session, contents_by_file):
+        if self.tsvector_column and contents_by_file:
+            session.execute(POSTGRES_TSVECTOR_UPDATE,
+                            [{"file_id": file_id, "content": content[:FULLTEXT_MAX_CHARS] if content else content}
+                             for file_id, content in contents_by_file.items()])
 
-            # Order by path_score
-            q = q.order_by(FileRecord.path_score.desc())
-            return q.all()
+    def _fill_tsvectors(self, batch_size=200):
+        # texts stored before the column existed
+        session = self.Session()
+        try:
+            while True:
+                rows = (session.query(Content.file_id, Content.content_data)
+                        .filter(literal_column("contents.content_tsv").is_(None))
+                        .limit(batch_size)
+                        .all())
+                if not rows:
+                    break
+                self._update_tsvectors(session, dict(rows))
+                session.commit()
+        finally:
+            session.close()
+
+    def _setup_path_trigrams(self):
+        dialect = self.engine.dialect.name
+        if dialect not in ("postgresql", "sqlite"):
+            return False
+        try:
+            with self.engine.begin() as conn:
+                if dialect == "postgresql":
+                    for statement in POSTGRES_PATH_TRIGRAM_DDL:
+                        conn.execute(text(statement))
+                else:
+                    exists = conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'files_path_trgm'")).first()
+                    for statement in SQLITE_PATH_TRIGRAM_DDL:
+                        conn.execute(text(statement))
+                    if not exists:
+                        conn.execute(text("INSERT INTO files_path_trgm(files_path_trgm) VALUES ('rebuild')"))
+            return True
+        except Exception as e:
+            # e.g. no permission for CREATE EXTENSION, or SQLite older than 3.34; path: falls back to a scan
+            print(f"Error setting up the path trigram index: {e}")
+            return False
+
+    def _dialect_insert(self, table):
+        # insert() that supports on_conflict_* on the dialects we run on
+        dialect = self.engine.dialect.name
+        if dialect == "postgresql":
+            return postgresql.insert(table)
+        if dialect == "sqlite":
+            return sqlite.insert(table)
+        return insert(table)
+
+    def _term_match_subquery(self, token):
+        return (select(Posting.file_id)
+                .join(IndexTerm, IndexTerm.id == Posting.term_id)
+                .where(self._prefix_condition(token)))
+
+    def _get_term_ids(self, session, terms, chunk_size=500):
+        terms = list(terms)
+        term_ids = {}
+        for i in range(0, len(terms), chunk_size):
+            chunk = terms[i:i + chunk_size]
+            stmt = self._dialect_insert(IndexTerm.__table__).values([{"term": t} for t in chunk])
+            if hasattr(stmt, "on_conflict_do_nothing"):
+                stmt = stmt.on_conflict_do_nothing(index_elements=["term"])
+                session.execute(stmt)
+            else:
+                existing = {t for (t,) in session.query(IndexTerm.term).filter(IndexTerm.term.in_(chunk))}
+                missing = [{"term": t} for t in chunk if t not in existing]
+                if missing:
+                    session.execute(insert(IndexTerm.__table__), missing)
+            rows = session.query(IndexTerm.term, IndexTerm.id).filter(IndexTerm.term.in_(chunk))
+            term_ids.update(rows)
+        return term_ids
+
+    def _replace_postings(self, session, terms_by_file, offsets_by_file=None, chunk_size=500):
+        # callers keep files.doc_length in sync; drop the old postings of the files so updates never leave stale terms behind
+        self.collection_stats = None
+        file_ids = list(terms_by_file)
+        for i in range(0, len(file_ids), chunk_size):
+            chunk = file_ids[i:i + chunk_size]
+            removed = (select(func.count()).select_from(Posting)
+                       .where(Posting.term_id == IndexTerm.id, Posting.file_id.in_(chunk))
+                       .scalar_subquery())
+            (session.query(IndexTerm)
+             .filter(IndexTerm.id.in_(select(Posting.term_id).where(Posting.file_id.in_(chunk))))
+             .update({IndexTerm.doc_freq: IndexTerm.doc_freq - removed}, synchronize_session=False))
+            session.query(Posting).filter(Posting.file_id.in_(chunk)).delete(synchronize_session=False)
+
+        all_terms = set()
+        for terms in terms_by_file.values():
+            all_terms.update(terms or ())
+        if not all_terms:
+            return
+        term_ids = self._get_term_ids(session, all_terms)
+        offsets_by_file = offsets_by_file or {}
+        session.execute(insert(Posting.__table__), [
+            {"term_id": term_ids[term], "file_id": file_id, "frequency": frequency,
+             "offsets": ",".join(map(str, (offsets_by_file.get(file_id) or {}).get(term, []))) or None}
+            for file_id, terms in terms_by_file.items() if terms
+            for term, frequency in terms.items()
+        ])
+
+        # doc_freq += number of files in this batch containing the term, one UPDATE per distinct count
+        added = {}
+        for terms in terms_by_file.values():
+            for term in terms or ():
+                term_id = term_ids[term]
+                added[term_id] = added.get(term_id, 0) + 1
+        by_count = {}
+        for term_id, count in added.items():
+            by_count.setdefault(count, []).append(term_id)
+        for count, ids in by_count.items():
+            for i in range(0, len(ids), chunk_size):
+                (session.query(IndexTerm).filter(IndexTerm.id.in_(ids[i:i + chunk_size]))
+                 .update({IndexTerm.doc_freq: IndexTerm.doc_freq + count}, synchronize_session=False))
+
+    def refresh_index_statistics(self):
+        # recompute doc_freq / doc_length from the postings (used after schema upgrades)
+        session = self.Session()
+        try:
+            doc_freq = (select(func.count()).select_from(Posting)
+                        .where(Posting.term_id == IndexTerm.id).scalar_subquery())
+            doc_length = (select(func.coalesce(func.sum(Posting.frequency), 0))
+                          .where(Posting.file_id == FileRecord.id).scalar_subquery())
+            session.query(IndexTerm).update({IndexTerm.doc_freq: doc_freq}, synchronize_session=False)
+            session.query(FileRecord).update({FileRecord.doc_length: doc_length}, synchronize_session=False)
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            print(f"Error in refresh_index_statistics: {e}")
+        finally:
+            session.close()
+
+    def compress_legacy_content(self, batch_size=200):
+        # texts stored uncompressed in contents.content_text before content_data existed
+        if "content_text" not in {c["name"] for c in inspect(self.engine).get_columns("contents")}:
+            return
+        session = self.Session()
+        try:
+            while True:
+                rows = session.execute(text("SELECT id, content_text FROM contents WHERE content_text IS NOT NULL "
+                                            "LIMIT :limit"), {"limit": batch_size}).all()
+                if not rows:
+                    break
+                session.execute(text("UPDATE contents SET content_data = :data, content_size = :size, "
+                                     "snippet = :snippet, content_text = NULL WHERE id = :id"),
+                                [{"id": content_id, "data": compress_text(content), "size": text_size(content),
+                                  "snippet": make_snippet(content)} for content_id, content in rows])
+                session.commit()
+        except Exception as e:
+            session.rollback()
+            print(f"Error in compress_legacy_content: {e}")
+            return
+        finally:
+            session.close()
+        try:
+            with self.engine.begin() as conn:
+                conn.execute(text("ALTER TABLE contents DROP COLUMN content_text"))
+        except Exception as e:
+            # SQLite before 3.35; the column is empty and stays unused
+            print(f"Could not drop contents.content_text: {e}")
+
+    def get_storage_stats(self):
+        # (UTF-8 bytes of all stored texts, bytes they take compressed)
+        session = self.Session()
+        try:
+            raw, stored = session.query(
+                func.coalesce(func.sum(Content.content_size), 0),
+                func.coalesce(func.sum(func.length(type_coerce(Content.content_data, LargeBinary))), 0)).one()
+            return int(raw), int(stored)
+        finally:
+            session.close()
+
+    def _add_missing_columns(self):
+        # create_all() never alters existing tables, add columns introduced since they were created
+        inspector = inspect(self.engine)
+        added = []
+        with self.engine.begin() as conn:
+            for table in Base.metadata.sorted_tables:
+                if not inspector.has_table(table.name):
+                    continue
+                existing = {c["name"] for c in inspector.get_columns(table.name)}
+                for column in table.columns:
+                    if column.name in existing:
+                        continue
+                    col_type = column.type.compile(dialect=self.engine.dialect)
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {col_type}"))
+                    added.append(f"{table.name}.{column.name}")
+        return added
+
+    def _create_missing_indexes(self):
+        # create_all() skips the indexes of tables that already exist
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                try:
+                    # IF NOT EXISTS instead of checkfirst: SQLite cannot reflect expression
+                    # indexes such as lower(extension)
+                    with self.engine.begin() as conn:
+                        conn.execute(CreateIndex(index, if_not_exists=True))
+                except Exception as e:
+                    print(f"Error creating index {index.name}: {e}")
+
+    def backfill_postings(self, batch_size=200):
+        # files indexed before the inverted index existed have no postings yet
+        session = self.Session()
+        try:
+            if session.query(Posting.file_id).first() is not None:
+                return
+            last_id = 0
+            while True:
+                rows = (session.query(FileRecord.id, FileRecord.file_name, Content.content_data)
+                        .outerjoin(Content)
+                        .filter(FileRecord.id > last_id)
+                        .order_by(FileRecord.id)
+                        .limit(batch_size)
+                        .all())
+                if not rows:
+                    break
+                terms_by_file = {
+                    file_id: term_frequencies(file_name, content) for file_id, file_name, content in rows
+                }
+                offsets_by_file = {file_id: term_offsets(content) for file_id, _, content in rows}
+                self._replace_postings(session, terms_by_file, offsets_by_file)
+                for file_id, terms in terms_by_file.items():
+                    (session.query(FileRecord).filter(FileRecord.id == file_id)
+                     .update({FileRecord.doc_length: sum(terms.values())}, synchronize_session=False))
+                session.commit()
+                last_id = rows[-1].id
+        except Exception as e:
+            session.rollback()
+            print(f"Error in backfill_postings: {e}")
         finally:
             session.close()
 
@@ -192,6 +1109,61 @@ class DatabaseAdapter:
         finally:
             session.close()
 
+    def insert_logs(self, entries):
+        # entries: (timestamp, level, message) tuples, written in one transaction
+        session = self.Session()
+        try:
+            session.execute(insert(LogEntry.__table__),
+                            [{"timestamp": timestamp, "level": level, "message": message}
+                             for timestamp, level, message in entries])
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            print(f"Error in insert_logs: {e}")
+        finally:
+            session.close()
+
+    def get_export_state(self, name):
+        # (last_log_id, last_run) of a named export, (0, None) before its first run
+        session = self.Session()
+        try:
+            state = session.get(ExportState, name)
+            return (state.last_log_id or 0, state.last_run) if state else (0, None)
+        finally:
+            session.close()
+
+    def set_export_state(self, name, last_log_id=None, last_run=None):
+        session = self.Session()
+        try:
+            state = session.get(ExportState, name) or ExportState(name=name, last_log_id=0)
+            if last_log_id is not None:
+                state.last_log_id = last_log_id
+            if last_run is not None:
+                state.last_run = last_run
+            session.add(state)
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            print(f"Error in set_export_state: {e}")
+        finally:
+            session.close()
+
+    def prune_deleted_files(self):
+        # deletions every export has already seen; before any export nothing needs them
+        session = self.Session()
+        try:
+            oldest = session.query(func.min(ExportState.last_run)).scalar()
+            query = session.query(DeletedFile)
+            if oldest is not None:
+                query = query.filter(DeletedFile.deleted_at < oldest)
+            query.delete(synchronize_session=False)
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            print(f"Error in prune_deleted_files: {e}")
+        finally:
+            session.close()
+
     def get_file_last_modified(self, file_path):
         session = self.Session()
         try:
@@ -200,26 +1172,218 @@ class DatabaseAdapter:
         finally:
             session.close()
 
-    def insert_search_query(self, raw_query, result_count=None):
-        msg = f"QUERY: {raw_query}"
-        if result_count is not None:
-            msg += f" | results: {result_count}"
-        self.insert_log("SEARCH", msg)
+    def get_file_states(self, root, batch_size=5000):
+        # file_path -> (last_modified, file_size, ocr_pending, extraction_failed) for every file stored under
+        # root, streamed in one query. OCR pending images are extracted even if unchanged; failed files are
+        # only tried again once they change.
+        session = self.Session()
+        try:
+            q = (session.query(FileRecord.file_path, FileRecord.last_modified, FileRecord.file_size,
+                               FileRecord.ocr_pending, FileRecord.extraction_failed)
+                 .filter(self._under_directory(root))
+                 .execution_options(stream_results=True)
+                 .yield_per(batch_size))
+            return {file_path: (last_modified, file_size, bool(ocr_pending), bool(extraction_failed))
+                    for file_path, last_modified, file_size, ocr_pending, extraction_failed in q}
+        finally:
+            session.close()
+
+    def _under_directory(self, dir_path):
+        prefix = os.path.join(dir_path, "")
+        return and_(FileRecord.file_path >= prefix,
+                    FileRecord.file_path < prefix_upper_bound(prefix),
+                    FileRecord.file_path.startswith(prefix, autoescape=True))
+
+    def _delete_file_ids(self, session, file_ids, chunk_size=500):
+        for i in range(0, len(file_ids), chunk_size):
+            chunk = file_ids[i:i + chunk_size]
+            session.execute(insert(DeletedFile).from_select(
+                ["file_path", "deleted_at"],
+                select(FileRecord.file_path, literal(datetime.now(), DateTime)).where(FileRecord.id.in_(chunk))))
+            self._replace_postings(session, {file_id: None for file_id in chunk})
+            session.query(Content).filter(Content.file_id.in_(chunk)).delete(synchronize_session=False)
+            session.query(FileRecord).filter(FileRecord.id.in_(chunk)).delete(synchronize_session=False)
+
+    def delete_files(self, file_paths, chunk_size=500):
+        # remove files (and their content/postings) that no longer exist on disk
+        file_paths = list(file_paths)
+        session = self.Session()
+        try:
+            file_ids = []
+            for i in range(0, len(file_paths), chunk_size):
+                file_ids.extend(file_id for (file_id,) in session.query(FileRecord.id)
+                                .filter(FileRecord.file_path.in_(file_paths[i:i + chunk_size])))
+            self._delete_file_ids(session, file_ids)
+            session.commit()
+            return len(file_ids)
+        except Exception as e:
+            session.rollback()
+            print(f"Error in delete_files: {e}")
+            return 0
+        finally:
+            session.close()
+
+    def delete_directory(self, dir_path):
+        session = self.Session()
+        try:
+            file_ids = [file_id for (file_id,) in
+                        session.query(FileRecord.id).filter(self._under_directory(dir_path))]
+            self._delete_file_ids(session, file_ids)
+            session.commit()
+            return len(file_ids)
+        except Exception as e:
+            session.rollback()
+            print(f"Error in delete_directory: {e}")
+            return 0
+        finally:
+            session.close()
+
+    def rename_file(self, old_path, new_path):
+        # a moved file keeps its extracted text; only path, name and name tokens change.
+        # Returns False when old_path was never indexed.
+        session = self.Session()
+        try:
+            record = session.query(FileRecord).filter_by(file_path=old_path).first()
+            if record is None:
+                return False
+            replaced = [file_id for (file_id,) in
+                        session.query(FileRecord.id).filter(FileRecord.file_path == new_path)]
+            self._delete_file_ids(session, replaced)
+            session.add(DeletedFile(file_path=old_path, deleted_at=datetime.now()))
+            content = record.content.content_data if record.content else None
+            terms = term_frequencies(os.path.basename(new_path), content)
+            offsets = term_offsets(content)
+            record.file_path = new_path
+            record.file_name = os.path.basename(new_path)
+            record.extension = os.path.splitext(new_path)[1]
+            record.path_score = self.score_function(new_path)
+            record.doc_length = sum(terms.values())
+            record.updated_at = datetime.now()
+            self._replace_postings(session, {record.id: terms}, {record.id: offsets})
+            if record.content:
+                session.flush()
+                self._update_tsvectors(session, {record.id: content})
+            session.commit()
+            return True
+        except Exception as e:
+            session.rollback()
+            print(f"Error in rename_file: {e}")
+            return False
+        finally:
+            session.close()
+
+    def rename_directory(self, old_dir, new_dir):
+        # rewrite the path prefix of every file under old_dir; returns the number of files moved
+        session = self.Session()
+        try:
+            rows = session.query(FileRecord.id, FileRecord.file_path).filter(self._under_directory(old_dir)).all()
+            if not rows:
+                return 0
+            replaced = [file_id for (file_id,) in
+                        session.query(FileRecord.id).filter(self._under_directory(new_dir))]
+            self._delete_file_ids(session, replaced)
+            old_prefix, new_prefix = os.path.join(old_dir, ""), os.path.join(new_dir, "")
+            updates = []
+            now = datetime.now()
+            session.execute(insert(DeletedFile), [{"file_path": file_path, "deleted_at": now} for _, file_path in rows])
+            for file_id, file_path in rows:
+                new_path = new_prefix + file_path[len(old_prefix):]
+                updates.append({"id": file_id, "file_path": new_path,
+                                "path_score": self.score_function(new_path), "updated_at": datetime.now()})
+            session.execute(update(FileRecord), updates)
+            session.commit()
+            return len(rows)
+        except Exception as e:
+            session.rollback()
+            print(f"Error in rename_directory: {e}")
+            return 0
+        finally:
+            session.close()
+
+    def insert_search_query(self, raw_query, result_count=None, latency_ms=None):
+        session = self.Session()
+        try:
+            self._record_searches(session, [(raw_query, result_count, latency_ms, datetime.now())])
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            print(f"Error in insert_search_query: {e}")
+        finally:
+            session.close()
+
+    def _record_searches(self, session, searches):
+        # searches: (query_text, result_count, latency_ms, timestamp), oldest first
+        for query_text, result_count, latency_ms, timestamp in searches:
+            normalized = normalize_query(query_text)
+            session.add(SearchHistory(query_text=query_text, normalized=normalized, result_count=result_count,
+                                      latency_ms=latency_ms, timestamp=timestamp))
+            stmt = self._dialect_insert(SearchQueryStats.__table__).values(
+                normalized=normalized, query_text=query_text, search_count=1,
+                last_result_count=result_count, last_searched=timestamp)
+            if hasattr(stmt, "on_conflict_do_update"):
+                session.execute(stmt.on_conflict_do_update(
+                    index_elements=["normalized"],
+                    set_={"query_text": stmt.excluded.query_text,
+                          "search_count": SearchQueryStats.__table__.c.search_count + 1,
+                          "last_result_count": stmt.excluded.last_result_count,
+                          "last_searched": stmt.excluded.last_searched}))
+                continue
+            stats = session.get(SearchQueryStats, normalized)
+            if stats is None:
+                session.add(SearchQueryStats(normalized=normalized, query_text=query_text, search_count=1,
+                                             last_result_count=result_count, last_searched=timestamp))
+            else:
+                stats.query_text = query_text
+                stats.search_count += 1
+                stats.last_result_count = result_count
+                stats.last_searched = timestamp
+            session.flush()
 
     def fetch_recent_queries(self, limit=5):
+        # [(query_text, result_count)] of the latest distinct queries, newest first
+        session = self.Session()
+        try:
+            return [tuple(row) for row in
+                    session.query(SearchQueryStats.query_text, SearchQueryStats.last_result_count)
+                    .order_by(SearchQueryStats.last_searched.desc())
+                    .limit(limit)]
+        finally:
+            session.close()
 
+    def fetch_popular_queries(self, limit=5):
+        # [(query_text, search_count)] of the most frequent queries
         session = self.Session()
         try:
-            q = (session.query(LogEntry)
-                 .filter(LogEntry.level == "SEARCH")
-                 .order_by(LogEntry.timestamp.desc())
-                 .limit(limit))
-            results = q.all()
-            # Extract the actual query text
-            queries = []
-            for r in results:
-                if r.message.startswith("QUERY: "):
-                    queries.append(r.message.replace("QUERY: ", "").strip())
-            return queries
+            return [tuple(row) for row in
+                    session.query(SearchQueryStats.query_text, SearchQueryStats.search_count)
+                    .order_by(SearchQueryStats.search_count.desc(), SearchQueryStats.last_searched.desc())
+                    .limit(limit)]
         finally:
-            session.close()
\ No newline at end of file
+            session.close()
+
+    def backfill_search_history(self, batch_size=1000):
+        # searches logged as "QUERY: ... | results: N" lines before search_history existed
+        session = self.Session()
+        try:
+            if session.query(SearchQueryStats.normalized).first() is not None:
+                return
+            rows = (session.query(LogEntry.message, LogEntry.timestamp)
+                    .filter(LogEntry.level == "SEARCH")
+                    .order_by(LogEntry.id)
+                    .yield_per(batch_size))
+            searches = []
+            for message, timestamp in rows:
+                if not message.startswith("QUERY: "):
+                    continue
+                query_text, _, count = message[len("QUERY: "):].partition(" | results: ")
+                if query_text.strip():
+                    searches.append((query_text.strip(), int(count) if count.strip().isdigit() else None,
+                                     None, timestamp))
+            if searches:
+                self._record_searches(session, searches)
+                session.commit()
+        except Exception as e:
+            session.rollback()
+            print(f"Error in backfill_search_history: {e}")
+        finally:
+            session.close()
@@ -1,19 +1,49 @@
-from database import LogEntry, FileRecord
+import csv
+import itertools
+import json
+import os
+import threading
+from datetime import datetime
+
 import pandas as pd
 from fpdf import FPDF
-import os
-def export_logs_to_txt(db_adapter, filename="logs_export.txt"):
+from sqlalchemy import exists, literal, select
+
+from database import DeletedFile, LogEntry, FileRecord
+
+EXPORT_CHUNK_SIZE = 1000  # rows per database round trip and per write
+REPORT_COLUMNS = ["file_path", "file_name", "extension", "file_size", "path_score", "last_modified"]
+DELTA_COLUMNS = REPORT_COLUMNS + ["change"]  # "updated" (new or changed) or "deleted"
+
+def export_logs_to_txt(db_adapter, filename="logs_export.txt", delta=False, chunk_size=EXPORT_CHUNK_SIZE):
+    # Streams the logs table in chunks. With delta the file is only appended with the lines
+    # logged since the last export, which gives the same file as a full rewrite.
+    last_id, mode = 0, "w"
+    started = datetime.now()
+    if delta and os.path.exists(filename):
+        exported_id, last_run = db_adapter.get_export_state(filename)
+        if last_run is not None:
+            # a file we did not write ourselves is replaced
+            last_id, mode = exported_id, "a"
+    written = 0
     session = db_adapter.Session()
     try:
-        logs = session.query(LogEntry).order_by(LogEntry.timestamp).all()
-        with open(filename, "w", encoding="utf-8") as f:
-            for log in logs:
-                f.write(f"{log.timestamp} [{log.level}] {log.message}\n")
-        print(f"Logs exported to {filename}")
+        stmt = (select(LogEntry.id, LogEntry.timestamp, LogEntry.level, LogEntry.message)
+                .where(LogEntry.id > last_id)
+                .order_by(LogEntry.id)
+                .execution_options(yield_per=chunk_size))
+        with open(filename, mode, encoding="utf-8") as f:
+            for chunk in session.execute(stmt).partitions():
+                f.write("".join(f"{timestamp} [{level}] {message}\n" for _, timestamp, level, message in chunk))
+                last_id = chunk[-1].id
+                written += len(chunk)
     except Exception as e:
         print(f"Error exporting logs: {e}")
+        return
     finally:
         session.close()
+    db_adapter.set_export_state(filename, last_log_id=last_id, last_run=started)
+    print(f"Logs exported to {filename} ({written} new lines)")
 
 def truncate_middle_path(path, max_parts_start=2, max_parts_end=1):
     parts = path.strip(os.sep).split(os.sep)
@@ -23,37 +53,65 @@ def truncate_middle_path(path, max_parts_start=2, max_parts_end=1):
     end = parts[-max_parts_end:]
     return os.sep + os.sep.join(start) + os.sep + "..." + os.sep + os.sep.join(end)
 
-def export_index_report(db_adapter, config, filename="index_report"):
-    session = db_adapter.Session()
-    try:
-        records = session.query(FileRecord).order_by(FileRecord.file_path).all()
-        ext = config.get_report_format().lower()
-        out_file = f"{filename}.{ext}"
-
-        data = [{
-            "file_path": r.file_path,
-            "file_name": r.file_name,
-            "extension": r.extension,
-            "file_size": r.file_size,
-            "path_score": r.path_score,
-            "last_modified": r.last_modified
-        } for r in records]
+def _write_report(chunks, out_file, ext, columns=REPORT_COLUMNS):
+    # csv/txt/jsonl/json are written one chunk at a time, memory does not grow with the index
+    with open(out_file, "w", newline="", encoding="utf-8") as f:
+        if ext in ("csv", "txt"):
+            writer = csv.writer(f, delimiter="\t" if ext == "txt" else ",", lineterminator="\n")
+            writer.writerow(columns)
+            for chunk in chunks:
+                writer.writerows(chunk)
+        elif ext == "jsonl":
+            for chunk in chunks:
+                f.write("".join(json.dumps(dict(zip(columns, row))) + "\n" for row in chunk))
+        else:
+            f.write("[")
+            separator = "\n  "
+            for chunk in chunks:
+                for row in chunk:
+                    f.write(separator + json.dumps(dict(zip(columns, row))))
+                    separator = ",\n  "
+            f.write("\n]\n")
 
-        df = pd.DataFrame(data)
+def _deleted_chunks(session, last_run, chunk_size):
+    # paths removed since last_run that are not indexed again; only the path is left of them
+    stmt = (select(DeletedFile.file_path)
+            .where(DeletedFile.deleted_at >= last_run)
+            .where(~exists().where(FileRecord.file_path == DeletedFile.file_path))
+            .distinct()
+            .order_by(DeletedFile.file_path)
+            .execution_options(yield_per=chunk_size))
+    for chunk in session.execute(stmt).partitions():
+        yield [(path, os.path.basename(path), os.path.splitext(path)[1], None, None, None, "deleted")
+               for (path,) in chunk]
 
-        if ext == "csv":
-            df.to_csv(out_file, index=False)
+def export_index_report(db_adapter, config, filename="index_report", delta=False, chunk_size=EXPORT_CHUNK_SIZE):
+    # With delta only files changed or deleted since the last export are written, to <filename>_delta.<ext>
+    ext = config.get_report_format().lower()
+    started = datetime.now()
+    last_run = db_adapter.get_export_state(filename)[1] if delta else None
+    out_file = f"{filename}_delta.{ext}" if last_run is not None else f"{filename}.{ext}"
+    columns = DELTA_COLUMNS if last_run is not None else REPORT_COLUMNS
 
-        elif ext == "json":
-            df.to_json(out_file, orient="records", indent=2)
+    session = db_adapter.Session()
+    try:
+        stmt = select(*[getattr(FileRecord, name) for name in REPORT_COLUMNS]).order_by(FileRecord.file_path)
+        if last_run is not None:
+            stmt = stmt.add_columns(literal("updated")).where(FileRecord.updated_at >= last_run)
+        chunks = session.execute(stmt.execution_options(yield_per=chunk_size)).partitions()
+        if last_run is not None:
+            chunks = itertools.chain(chunks, _deleted_chunks(session, last_run, chunk_size))
 
-        elif ext == "txt":
-            df.to_csv(out_file, index=False, sep='\t')
+        if ext in ("csv", "txt", "json", "jsonl"):
+            _write_report(chunks, out_file, ext, columns)
 
         elif ext in ["xlsx", "xls"]:
+            # spreadsheet and pdf writers need the whole table at once
+            df = pd.DataFrame([row for chunk in chunks for row in chunk], columns=columns)
             df.to_excel(out_file, index=False, engine='openpyxl')
 
         elif ext == "pdf":
+            df = pd.DataFrame([row for chunk in chunks for row in chunk], columns=columns)
             class PDFReport(FPDF):
                 def __init__(self):
                     super().__init__()
@@ -78,7 +136,7 @@ def export_index_report(db_adapter, config, filename="index_report"):
                         self.ln()
 
             pdf = PDFReport()
-            col_widths = [55, 35, 20, 20, 20, 35]
+            col_widths = [55, 35, 20, 20, 20, 35] if columns is REPORT_COLUMNS else [45, 30, 20, 20, 20, 30, 15]
             pdf.header_row(df.columns, col_widths)
             pdf.data_rows(df, col_widths)
             pdf.output(out_file)
@@ -87,7 +145,20 @@ def export_index_report(db_adapter, config, filename="index_report"):
             print(f"Unsupported report format: {ext}")
             return
 
-        print(f"Report exported successfully to: {out_file}")
-
     finally:
-        session.close()
\ No newline at end of file
+        session.close()
+    db_adapter.set_export_state(filename, last_run=started)
+    db_adapter.prune_deleted_files()
+    print(f"Report exported successfully to: {out_file}")
+
+def export_all(db_adapter, config):
+    settings = config.get_export_settings()
+    export_logs_to_txt(db_adapter, delta=settings["logs"] == "delta", chunk_size=settings["chunk_size"])
+    export_index_report(db_adapter, config, filename="index_report", delta=settings["report"] == "delta",
+                        chunk_size=settings["chunk_size"])
+
+def start_export(db_adapter, config):
+    # exports run on their own thread so an indexing run does not wait for them
+    thread = threading.Thread(target=export_all, args=(db_adapter, config), name="Export")
+    thread.start()
+    return thread
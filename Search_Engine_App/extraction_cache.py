@@ -0,0 +1,84 @@
+import hashlib
+import os
+import sqlite3
+import time
+import zlib
+
+class ExtractionCache:
+    # Persistent text cache keyed by sha256 of the file bytes plus the extractor version,
+    # so copies, touched files and restored backups are never OCR'd/parsed twice.
+    # Stored in its own SQLite file so every extraction worker process can use it.
+    def __init__(self, path, max_bytes=512 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._conn = None
+        self._pid = None
+
+    def __getstate__(self):
+        # sqlite connections cannot cross process boundaries, workers open their own
+        state = self.__dict__.copy()
+        state["_conn"] = None
+        state["_pid"] = None
+        return state
+
+    def _connection(self):
+        if self._conn is None or self._pid != os.getpid():
+            self._conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS cache ("
+                               "key TEXT PRIMARY KEY, data BLOB NOT NULL, size INTEGER NOT NULL, "
+                               "last_used REAL NOT NULL)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS ix_cache_last_used ON cache (last_used)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (id INTEGER PRIMARY KEY CHECK (id = 1), "
+                               "total_bytes INTEGER NOT NULL)")
+            self._conn.execute("INSERT OR IGNORE INTO meta (id, total_bytes) VALUES (1, 0)")
+            self._pid = os.getpid()
+        return self._conn
+
+    @staticmethod
+    def key_for(file_path, version, chunk_size=1024 * 1024):
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                digest.update(chunk)
+        return f"{version}:{digest.hexdigest()}"
+
+    def get(self, key):
+        conn = self._connection()
+        row = conn.execute("SELECT data FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        conn.execute("UPDATE cache SET last_used = ? WHERE key = ?", (time.time(), key))
+        return zlib.decompress(row[0]).decode("utf-8")
+
+    def put(self, key, text):
+        data = zlib.compress(text.encode("utf-8"))
+        if len(data) > self.max_bytes:
+            return
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            old = conn.execute("SELECT size FROM cache WHERE key = ?", (key,)).fetchone()
+            conn.execute("INSERT OR REPLACE INTO cache (key, data, size, last_used) VALUES (?, ?, ?, ?)",
+                         (key, data, len(data), time.time()))
+            conn.execute("UPDATE meta SET total_bytes = total_bytes + ? WHERE id = 1",
+                         (len(data) - (old[0] if old else 0),))
+            self._evict(conn)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _evict(self, conn, batch=64):
+        # drop least recently used entries until the cache fits max_bytes again
+        (total,) = conn.execute("SELECT total_bytes FROM meta WHERE id = 1").fetchone()
+        while total > self.max_bytes:
+            rows = conn.execute("SELECT key, size FROM cache ORDER BY last_used LIMIT ?", (batch,)).fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                if total <= self.max_bytes:
+                    break
+                conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                total -= size
+        conn.execute("UPDATE meta SET total_bytes = ? WHERE id = 1", (max(total, 0),))
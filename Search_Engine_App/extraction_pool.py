@@ -0,0 +1,102 @@
+import multiprocessing
+import os
+import queue
+import time
+
+_extractor = None  # per worker process
+
+def _init_worker(text_extractor, nice=0):
+    global _extractor
+    _extractor = text_extractor
+    if nice and hasattr(os, "nice"):
+        # lower priority than the GUI and the indexing thread
+        os.nice(nice)
+
+def _extract(file_path):
+    # the time is measured in the worker, so it leaves out queueing and result transfer
+    start = time.perf_counter()
+    result = _extractor.extract_cached(file_path)
+    return result, time.perf_counter() - start
+
+class ExtractionPool:
+    # Runs TextExtractor.extract_cached in worker processes and hands (path, (text, cache_hit), error, seconds)
+    # back to the caller, which stays the only one writing to the database.
+    def __init__(self, text_extractor, workers, timeout=300, nice=0):
+        self.text_extractor = text_extractor
+        self.workers = workers
+        self.timeout = timeout
+        self.nice = nice
+        self.pool = None
+        self.results = queue.Queue()
+        self.generation = 0  # results of a terminated pool are ignored
+        self.in_flight = {}  # file_path -> deadline
+
+    def __enter__(self):
+        self._start_pool()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.pool.terminate()
+        self.pool.join()
+
+    def _start_pool(self):
+        self.generation += 1
+        self.pool = multiprocessing.Pool(self.workers, initializer=_init_worker,
+                                         initargs=(self.text_extractor, self.nice))
+
+    def _submit(self, file_path, in_flight):
+        generation = self.generation
+        self.pool.apply_async(
+            _extract, (file_path,),
+            callback=lambda content: self.results.put((generation, file_path, content, None)),
+            error_callback=lambda e: self.results.put((generation, file_path, None, e)))
+        in_flight[file_path] = time.monotonic() + self.timeout
+
+    def _restart(self, in_flight):
+        # A hung or crashed worker never reports back; the only way to reclaim it is a new pool
+        self.pool.terminate()
+        self.pool.join()
+        self._start_pool()
+        for file_path in list(in_flight):
+            self._submit(file_path, in_flight)
+
+    def extend_deadlines(self, seconds):
+        # time the caller spent paused does not count against the files in flight
+        if seconds:
+            for file_path in self.in_flight:
+                self.in_flight[file_path] += seconds
+
+    def extract(self, file_paths):
+        file_paths = iter(file_paths)
+        in_flight = self.in_flight = {}
+        exhausted = False
+        while True:
+            # keep at most one file per worker so a deadline measures the extraction itself
+            while not exhausted and len(in_flight) < self.workers:
+                file_path = next(file_paths, None)
+                if file_path is None:
+                    exhausted = True
+                elif file_path not in in_flight:
+                    self._submit(file_path, in_flight)
+            if not in_flight:
+                return
+
+            wait = max(0.0, min(in_flight.values()) - time.monotonic())
+            try:
+                generation, file_path, content, error = self.results.get(timeout=wait)
+            except queue.Empty:
+                now = time.monotonic()
+                expired = [path for path, deadline in in_flight.items() if deadline <= now]
+                for file_path in expired:
+                    del in_flight[file_path]
+                    yield file_path, None, TimeoutError(f"extraction did not finish within {self.timeout}s (worker hung or crashed)"), None
+                self._restart(in_flight)
+                continue
+
+            if generation != self.generation or file_path not in in_flight:
+                continue
+            del in_flight[file_path]
+            if error is not None:
+                yield file_path, None, error, None
+            else:
+                yield file_path, content[0], None, content[1]
@@ -1,4 +1,10 @@
-import os,fnmatch
+import os, re, fnmatch, time
+from collections import namedtuple
+
+from metrics import CRAWL_SECONDS, CRAWLED_FILES, STAT_CALLS
+
+# One crawled file with the stat data the Indexer needs, so it never stats twice
+CrawlEntry = namedtuple("CrawlEntry", ["path", "name", "extension", "size", "last_modified"])
 
 class FileCrawler:
     def __init__(self, ignore_patterns=None,allowed_extensions = None):
@@ -12,22 +18,59 @@ class FileCrawler:
             self.ignore_patterns = []
         self.allowed_extensions = allowed_extensions if allowed_extensions else [".txt"]
 
-    def crawl(self, start_dir):
-        file_paths = []
-        for root, dirs, files in os.walk(start_dir):
-            # Skip ignored dir
-            dirs[:] = [
-                d for d in dirs if not any(fnmatch.fnmatch(d, pattern) for pattern in self.ignore_patterns)
-            ]
+        # All patterns compiled once into one regex, extensions looked up in a set
+        if self.ignore_patterns:
+            self.ignore_regex = re.compile("|".join(fnmatch.translate(os.path.normcase(p)) for p in self.ignore_patterns))
+        else:
+            self.ignore_regex = None
+        self.extension_set = {ext.lower() for ext in self.allowed_extensions}
 
-            for file in files:
-                if not any(file.lower().endswith(ext) for ext in self.allowed_extensions):
-                    continue
+    def is_ignored(self, name):
+        return self.ignore_regex is not None and self.ignore_regex.match(os.path.normcase(name)) is not None
 
-                # Skip file if it matches an ignore pattern
-                if any(fnmatch.fnmatch(file, pattern) for pattern in self.ignore_patterns):
-                    continue
+    def is_allowed(self, name):
+        return os.path.splitext(name)[1].lower() in self.extension_set
 
-                file_paths.append(os.path.join(root, file))
+    def crawl(self, start_dir):
+        # Generator: indexing can start on the first file while the rest of the tree is walked
+        pending_dirs = [start_dir]
+        while pending_dirs:
+            current = pending_dirs.pop()
+            # time spent in scandir/stat, not in whatever the caller does between files
+            start = time.perf_counter()
+            try:
+                with os.scandir(current) as it:
+                    entries = list(it)
+            except OSError:
+                continue
+
+            sub_dirs = []
+            stat_calls = files = 0
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        # Skip ignored dir
+                        if not self.is_ignored(entry.name):
+                            sub_dirs.append(entry.path)
+                        continue
+                    if not entry.is_file() or not self.is_allowed(entry.name):
+                        continue
+                    # Skip file if it matches an ignore pattern
+                    if self.is_ignored(entry.name):
+                        continue
+                    stat_calls += 1
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                files += 1
+                crawl_entry = CrawlEntry(entry.path, entry.name, os.path.splitext(entry.name)[1],
+                                         stat.st_size, stat.st_mtime)
+                elapsed = time.perf_counter() - start
+                yield crawl_entry
+                start = time.perf_counter() - elapsed
+            CRAWL_SECONDS.inc(time.perf_counter() - start)
+            CRAWLED_FILES.inc(files)
+            STAT_CALLS.inc(stat_calls)
 
-        return file_paths
\ No newline at end of file
+            # walk sub directories in listing order, like os.walk
+            pending_dirs.extend(reversed(sub_dirs))
@@ -1,13 +1,21 @@
-from PyQt6.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QLineEdit,QPushButton, QListWidget, QFileDialog, QLabel, QHBoxLayout, QStatusBar, QComboBox)
+from PyQt6.QtCore import Qt, QThreadPool, QTimer
+from PyQt6.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QLineEdit,QPushButton, QListWidget, QFileDialog, QLabel, QHBoxLayout, QStatusBar, QComboBox,
+                             QListWidgetItem, QDialog, QTextEdit)
 from filecrawler import FileCrawler
-from textextractor import TextExtractor
+from textextractor import create_text_extractor
 from indexer import Indexer
+from indexing_job import IndexingJob
 from database import DatabaseAdapter
 from config import Config
 from query_parser import parse_query
-from export_logs import export_index_report
-from search_observer import (SearchObservable,QueryLoggerObserver,SuggestionUpdaterObserver)
-import time
+from search_observer import (SearchObservable,QueryLoggerObserver,SuggestionUpdaterObserver,MetricsObserver,
+                             fill_suggestions)
+from metrics import REGISTRY
+from watcher import FileWatcher
+from snippets import format_snippet
+from tokenizer import PAGE_BREAK
+from search_worker import SearchTask
+import html
 
 class MainWindow(QMainWindow):
     def __init__(self):
@@ -19,9 +27,28 @@ class MainWindow(QMainWindow):
 
         db_url = self.config.get_db_url()
         self.db = DatabaseAdapter(db_url, self.config)
-        self.indexer = Indexer(self.db, TextExtractor(),self.config)
+        self.indexer = Indexer(self.db, create_text_extractor(self.config), self.config)
         self.search_observable = SearchObservable()
+        self.metrics_settings = self.config.get_metrics_settings()
+        self.metrics_server = None
+        if self.metrics_settings["port"]:
+            try:
+                self.metrics_server = REGISTRY.serve(self.metrics_settings["port"])
+            except OSError as e:
+                print(f"Could not serve metrics on port {self.metrics_settings['port']}: {e}")
         self.log_query = True
+        self.watcher = None
+        self.indexing_job = None
+        self.page_terms = None    # parsed query of the result list being paged
+        self.page_cursor = None   # keyset cursor of the next page, None when exhausted
+        self.shown_results = 0
+        # live search runs on its own pool; query_id identifies the newest search
+        self.search_pool = QThreadPool()
+        self.search_pool.setMaxThreadCount(2)
+        self.search_task = None
+        self.query_id = 0
+        self.search_request = None  # (query, notify_observers, update_suggestions) of the newest search
+        self.first_page = []
         self.init_ui()
 
     def init_ui(self):
@@ -45,20 +72,33 @@ class MainWindow(QMainWindow):
 
         self.search_observable.register_observer(QueryLoggerObserver(self.db))
         self.search_observable.register_observer(SuggestionUpdaterObserver(self.suggestions_combo, self.db))
+        self.search_observable.register_observer(MetricsObserver())
         # Search layout with filters
         search_layout = QHBoxLayout()
         self.search_bar = QLineEdit()
         self.search_bar.setPlaceholderText("Search...")
         self.search_bar.textChanged.connect(self.perform_live_search)
+        # live search waits until typing pauses
+        self.live_search_timer = QTimer(self)
+        self.live_search_timer.setSingleShot(True)
+        self.live_search_timer.setInterval(self.config.get_live_search_debounce())
+        self.live_search_timer.timeout.connect(self.start_live_search)
         self.search_bar.returnPressed.connect(self.search)
         search_layout.addWidget(self.search_bar)
 
+        # the combos add ext:/size: filters to the query, the database applies them
         self.file_type_combo = QComboBox()
-        self.file_type_combo.addItems(["All", ".txt", ".csv", ".json", ".xml"])
+        self.file_type_combo.addItem("All", userData="")
+        for extension in self.config.get_allowed_extensions():
+            self.file_type_combo.addItem(extension, userData=f"ext:{extension.lstrip('.')}")
+        self.file_type_combo.currentIndexChanged.connect(self.perform_live_search)
         search_layout.addWidget(self.file_type_combo)
 
         self.size_range_combo = QComboBox()
-        self.size_range_combo.addItems(["Any size", "< 1MB", "1MB - 10MB", "> 10MB"])
+        for label, size_filter in [("Any size", ""), ("< 1MB", "size:<1MB"),
+                                   ("1MB - 10MB", "size:1MB..10MB"), ("> 10MB", "size:>10MB")]:
+            self.size_range_combo.addItem(label, userData=size_filter)
+        self.size_range_combo.currentIndexChanged.connect(self.perform_live_search)
         search_layout.addWidget(self.size_range_combo)
 
         self.ignore_patterns_input = QLineEdit()
@@ -68,6 +108,8 @@ class MainWindow(QMainWindow):
         self.layout.addLayout(search_layout)
 
         self.results_list = QListWidget()
+        self.results_list.verticalScrollBar().valueChanged.connect(self.on_results_scrolled)
+        self.results_list.itemDoubleClicked.connect(self.show_full_text)
         self.layout.addWidget(self.results_list)
 
         action_buttons = QHBoxLayout()
@@ -80,6 +122,20 @@ class MainWindow(QMainWindow):
         self.refresh_button.clicked.connect(self.start_indexing)
         action_buttons.addWidget(self.refresh_button)
 
+        self.watch_button = QPushButton("Watch Folder")
+        self.watch_button.clicked.connect(self.toggle_watch)
+        action_buttons.addWidget(self.watch_button)
+
+        self.pause_button = QPushButton("Pause Indexing")
+        self.pause_button.clicked.connect(self.toggle_pause_indexing)
+        self.pause_button.setEnabled(False)
+        action_buttons.addWidget(self.pause_button)
+
+        self.cancel_button = QPushButton("Cancel Indexing")
+        self.cancel_button.clicked.connect(self.cancel_indexing)
+        self.cancel_button.setEnabled(False)
+        action_buttons.addWidget(self.cancel_button)
+
         self.layout.addLayout(action_buttons)
 
         self.status_bar = QStatusBar()
@@ -91,18 +147,7 @@ class MainWindow(QMainWindow):
         self.update_suggestions()
 
     def update_suggestions(self):
-        self.suggestions_combo.clear()
-        recent_queries = self.db.fetch_recent_queries(limit=5)
-        if not recent_queries:
-            self.suggestions_combo.addItem("No recent searches.")
-        else:
-            for q in recent_queries:
-                if " | results: " in q:
-                    query_text = q.split(" | results: ")[0].strip()
-                    results_count = q.split(" | results: ")[1].strip()
-                    self.suggestions_combo.addItem(f"{query_text} ({results_count})", userData=query_text)
-                else:
-                    self.suggestions_combo.addItem(q, userData=q)
+        fill_suggestions(self.suggestions_combo, self.db)
 
     def on_suggestion_selected(self, index):
         query_text = self.suggestions_combo.currentData()
@@ -120,72 +165,258 @@ class MainWindow(QMainWindow):
             self.crawler = FileCrawler()
 
 
+    def build_crawler(self):
+        user_ignore_patterns = [
+            pattern.strip()
+            for pattern in self.ignore_patterns_input.text().split(',')
+            if pattern.strip()
+        ]
+        combined_patterns = self.stored_ignore_patterns + user_ignore_patterns
+        allowed_extensions = self.config.get_allowed_extensions()
+        return FileCrawler(combined_patterns, allowed_extensions)
+
+    def toggle_watch(self):
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watcher.indexer.close()
+            self.watcher = None
+            self.watch_button.setText("Watch Folder")
+            self.status_bar.showMessage("Stopped watching for changes.")
+            return
+        if not hasattr(self, 'selected_folder'):
+            self.results_list.addItem("Please select a folder first.")
+            return
+        # own Indexer: the watcher thread must not share batching state with start_indexing
+        watch_indexer = Indexer(self.db, create_text_extractor(self.config), self.config)
+        self.watcher = FileWatcher(watch_indexer, self.build_crawler(), [self.selected_folder],
+                                   **self.config.get_watch_settings())
+        self.watcher.start()
+        self.watch_button.setText("Stop Watching")
+        self.status_bar.showMessage(f"Watching {self.selected_folder} for changes.")
+
+    def closeEvent(self, event):
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watcher.indexer.close()
+        if self.indexing_job is not None:
+            # stops at the next file, the batch in progress is still committed
+            self.indexing_job.cancel()
+            self.indexing_job.wait()
+        self.indexer.close()
+        self.cancel_search()
+        self.search_pool.waitForDone()
+        self.write_metrics()
+        if self.metrics_server is not None:
+            self.metrics_server.shutdown()
+        super().closeEvent(event)
+
+    def write_metrics(self):
+        if self.metrics_settings["file"]:
+            try:
+                REGISTRY.write(self.metrics_settings["file"])
+            except OSError as e:
+                print(f"Could not write metrics to {self.metrics_settings['file']}: {e}")
+
     def start_indexing(self):
+        if self.indexing_job is not None:
+            return
         if hasattr(self, 'selected_folder'):
-            user_ignore_patterns = [
-                pattern.strip()
-                for pattern in self.ignore_patterns_input.text().split(',')
-                if pattern.strip()
-            ]
-            combined_patterns = self.stored_ignore_patterns + user_ignore_patterns
-            allowed_extensions = self.config.get_allowed_extensions()
-            self.crawler = FileCrawler(combined_patterns, allowed_extensions)
-
-            files = self.crawler.crawl(self.selected_folder)
-            if files:
-                start_time = time.time()
-                self.indexer.process_files(files)
-                self.indexer.generate_report()
-                duration = time.time() - start_time
-                msg = f"Indexing completed and logged in {duration:.2f} seconds. {len(files)} file(s) found."
-                self.status_bar.showMessage(msg)
-                print(msg)
-            else:
-                self.status_bar.showMessage("No files found for indexing.")
+            self.crawler = self.build_crawler()
+
+            # crawl and indexing run in the background, the window stays responsive
+            self.indexing_job = IndexingJob(self.indexer, self.crawler, self.selected_folder,
+                                            self.metrics_settings["profile"])
+            self.indexing_job.progress.connect(self.on_indexing_progress)
+            self.indexing_job.completed.connect(self.on_indexing_completed)
+            self.index_button.setEnabled(False)
+            self.refresh_button.setEnabled(False)
+            self.pause_button.setEnabled(True)
+            self.pause_button.setText("Pause Indexing")
+            self.cancel_button.setEnabled(True)
+            self.status_bar.showMessage(f"Indexing {self.selected_folder}...")
+            self.indexing_job.start()
         else:
             self.results_list.addItem("Please select a folder first.")
 
+    def toggle_pause_indexing(self):
+        if self.indexing_job is None:
+            return
+        if self.indexer.is_paused():
+            self.indexing_job.resume()
+            self.pause_button.setText("Pause Indexing")
+        else:
+            self.indexing_job.pause()
+            self.pause_button.setText("Resume Indexing")
+
+    def cancel_indexing(self):
+        if self.indexing_job is not None:
+            self.indexing_job.cancel()
+            self.cancel_button.setEnabled(False)
+            self.pause_button.setEnabled(False)
+            self.status_bar.showMessage("Cancelling after the current file...")
+
+    def on_indexing_progress(self, progress):
+        if self.indexing_job is None or not self.cancel_button.isEnabled():
+            return
+        total = f"/{progress['total']}" if progress["total"] is not None else ""
+        eta = f", ETA {self.format_duration(progress['eta'])}" if progress["eta"] is not None else ""
+        state = "Paused" if progress["paused"] else "Indexing"
+        current = progress["current_file"] or ""
+        ocr = f" OCR queue: {progress['ocr_queued']}." if progress["ocr_queued"] else ""
+        self.status_bar.showMessage(
+            f"{state}: {progress['files']}{total} files, {progress['files_per_sec']:.1f} files/s, "
+            f"{progress['bytes_per_sec'] / (1024 * 1024):.1f} MB/s{eta}.{ocr} {current}")
+
+    def format_duration(self, seconds):
+        minutes, seconds = divmod(int(seconds), 60)
+        hours, minutes = divmod(minutes, 60)
+        return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+
+    def on_indexing_completed(self, cancelled):
+        self.indexing_job = None
+        self.index_button.setEnabled(True)
+        self.refresh_button.setEnabled(True)
+        self.pause_button.setEnabled(False)
+        self.pause_button.setText("Pause Indexing")
+        self.cancel_button.setEnabled(False)
+        progress = self.indexer.progress()
+        counts = self.indexer.change_counts
+        found = self.indexer.files_seen
+        if cancelled:
+            msg = (f"Indexing cancelled after {progress['elapsed']:.2f} seconds. {found} file(s) checked, "
+                   f"new: {counts['new']}, changed: {counts['changed']}. Already indexed files were kept.")
+        elif found:
+            msg = (f"Indexing completed and logged in {progress['elapsed']:.2f} seconds. {found} file(s) found. "
+                   f"New: {counts['new']}, changed: {counts['changed']}, "
+                   f"unchanged: {counts['unchanged']}, failed: {counts['failed']}, deleted: {counts['deleted']}. "
+                   f"Extraction cache hit rate: {self.indexer.cache_hit_rate():.0%}. "
+                   f"{self.indexer.storage_summary()} {self.indexer.stage_summary()}")
+        else:
+            msg = "No files found for indexing."
+        self.status_bar.showMessage(msg)
+        self.write_metrics()
+        print(msg)
+
     def run_search(self, query, log_query=False, update_suggestions=False, notify_observers=True):
+        self.live_search_timer.stop()
+        self.cancel_search()
         self.results_list.clear()
-        file_type = self.file_type_combo.currentText()
-        size_range = self.size_range_combo.currentText()
+        self.page_terms = None
+        self.page_cursor = None
+        self.shown_results = 0
 
         if not query:
             self.results_list.addItem("Enter a search query.")
             return
 
-        path_terms, content_terms = parse_query(query)
-        results = self.db.search_files(path_terms=path_terms, content_terms=content_terms)
-
-        if notify_observers:
-            self.search_observable.notify_observers(query, results)
-
-        if update_suggestions:
-            self.update_suggestions()
-
-        if not results:
-            self.results_list.addItem("No matching files.")
+        # results are fetched one page at a time in the background, more pages load while scrolling
+        combo_filters = " ".join(f for f in (self.file_type_combo.currentData(), self.size_range_combo.currentData()) if f)
+        self.page_terms = parse_query(f"{query} {combo_filters}", with_filters=True)
+        self.search_request = (query, notify_observers, update_suggestions)
+        self.first_page = []
+        self.fetch_page()
+
+    def cancel_search(self):
+        # the newest query supersedes everything in flight: queued tasks never start,
+        # running ones stop early and whatever they still emit is ignored
+        self.query_id += 1
+        if self.search_task is not None:
+            self.search_task.cancel()
+            self.search_pool.tryTake(self.search_task)
+            self.search_task = None
+
+    def fetch_page(self):
+        path_terms, content_terms, filters = self.page_terms
+        # the full match count is only needed when the observers are notified
+        count_matches = self.search_request is not None and self.search_request[1]
+        task = SearchTask(self.db, self.query_id, path_terms, content_terms,
+                          self.config.get_page_size(), self.page_cursor, filters, count_matches)
+        task.signals.rows_ready.connect(self.on_search_rows)
+        task.signals.finished.connect(self.on_search_finished)
+        task.signals.failed.connect(self.on_search_failed)
+        self.search_task = task
+        self.search_pool.start(task)
+
+    def on_search_rows(self, query_id, rows, snippets, pages):
+        if query_id != self.query_id:
             return
+        if self.search_request is not None:
+            self.first_page.extend(rows)
+        self.show_results(rows, snippets, pages)
 
-        self.status_bar.showMessage(f"{len(results)} files found.")
+    def on_search_finished(self, query_id, next_cursor, elapsed, match_count):
+        if query_id != self.query_id:
+            return
+        self.search_task = None
+        self.page_cursor = next_cursor
+        if self.search_request is not None:
+            query, notify_observers, update_suggestions = self.search_request
+            self.search_request = None
+            if notify_observers:
+                self.search_observable.notify_observers(query, self.first_page, elapsed * 1000, match_count)
+            if update_suggestions:
+                self.update_suggestions()
+            if not self.first_page:
+                self.results_list.addItem("No matching files.")
+        more = " Scroll down for more." if self.page_cursor is not None else ""
+        self.status_bar.showMessage(f"{self.shown_results} files found in {elapsed * 1000:.0f} ms.{more}")
+
+    def on_search_failed(self, query_id, error):
+        if query_id != self.query_id:
+            return
+        self.search_task = None
+        self.search_request = None
+        self.status_bar.showMessage(f"Search failed: {error}")
 
+    def show_results(self, results, snippets, pages=None):
         for record in results:
-            file_id, file_path, file_name, file_size, extension, last_modified, path_score, content_text = record
-            if file_type != "All" and extension != file_type:
-                continue
-            if not self.size_in_range(file_size, size_range):
-                continue
-            snippet = "\n".join(content_text.splitlines()[:7]) if content_text else ""
+            file_id, file_path, file_name, file_size, extension, last_modified, path_score, snippet, score = record
+            # query terms are highlighted in the preview
+            preview = format_snippet(snippets.get(file_id, []), "<b style='background:#fff3a0'>", "</b>",
+                                     escape=html.escape)
+            page = (pages or {}).get(file_id)
+            page_label = f" (page {page})" if page else ""
             display_text = (
-                    f"Name: {file_name}\n"
-                    f"Path: {file_path}\n"
-                    f"Size: {file_size} bytes\n"
-                    f"Extension: {extension}\n"
-                    f"Score: {path_score}\n"
-                    f"Preview:\n{snippet}\n"
+                    f"Name: {html.escape(file_name)}<br>"
+                    f"Path: {html.escape(file_path)}<br>"
+                    f"Size: {file_size} bytes<br>"
+                    f"Extension: {html.escape(extension or '')}<br>"
+                    f"Score: {score:.2f}<br>"
+                    f"Preview{page_label}:<br>{preview.replace(chr(10), '<br>')}<br>"
                     + "-" * 40
             )
-            self.results_list.addItem(display_text)
+            label = QLabel(display_text)
+            label.setTextFormat(Qt.TextFormat.RichText)
+            label.setWordWrap(True)
+            item = QListWidgetItem()
+            item.setData(Qt.ItemDataRole.UserRole, file_id)
+            item.setToolTip(file_path)
+            item.setSizeHint(label.sizeHint())
+            self.results_list.addItem(item)
+            self.results_list.setItemWidget(item, label)
+
+        self.shown_results += len(results)
+
+    def on_results_scrolled(self, value):
+        if self.page_cursor is None or self.page_terms is None or self.search_task is not None:
+            return
+        if value >= self.results_list.verticalScrollBar().maximum():
+            self.fetch_page()
+
+    def show_full_text(self, item):
+        # the full text is only read from the database when a result is opened
+        file_id = item.data(Qt.ItemDataRole.UserRole)
+        if file_id is None:
+            return
+        dialog = QDialog(self)
+        dialog.setWindowTitle(item.toolTip())
+        dialog.resize(700, 500)
+        layout = QVBoxLayout(dialog)
+        text_view = QTextEdit()
+        text_view.setReadOnly(True)
+        text_view.setPlainText((self.db.get_file_content(file_id) or "").replace(PAGE_BREAK, "\n"))
+        layout.addWidget(text_view)
+        dialog.show()
 
     def search(self):
         query = self.search_bar.text().strip()
@@ -193,23 +424,23 @@ class MainWindow(QMainWindow):
         self.log_query = True
 
     def perform_live_search(self):
-        query = self.search_bar.text().strip()
-        if not query:
+        if not self.search_bar.text().strip():
+            self.live_search_timer.stop()
+            self.cancel_search()
             self.results_list.clear()
             return
-        self.run_search(query, log_query=False, update_suggestions=False, notify_observers=False)
-
-    def size_in_range(self, size, range_text):
-        if range_text == "Any size":
-            return True
-        if range_text == "< 1MB":
-            return size < 1 * 1024 * 1024
-        if range_text == "1MB - 10MB":
-            return 1 * 1024 * 1024 <= size <= 10 * 1024 * 1024
-        if range_text == "> 10MB":
-            return size > 10 * 1024 * 1024
+        # restart the debounce interval on every keystroke
+        self.live_search_timer.start()
+
+    def start_live_search(self):
+        query = self.search_bar.text().strip()
+        if query:
+            self.run_search(query, log_query=False, update_suggestions=False, notify_observers=False)
 
     def clear_results(self):
+        self.cancel_search()
         self.results_list.clear()
+        self.page_terms = None
+        self.page_cursor = None
         self.last_logged_query = None
         self.last_logged_result_count = None
\ No newline at end of file
@@ -1,62 +1,445 @@
 import os
+import threading
+import time
 from datetime import datetime
 from zipimport import cp437_table
 
-from export_logs import export_logs_to_txt,export_index_report
+from export_logs import start_export
+from extraction_pool import ExtractionPool
+from filecrawler import CrawlEntry
+from log_sink import LogSink
+from metrics import (CRAWL_SECONDS, DB_WRITE_SECONDS, DB_WRITTEN_FILES, EXTRACT_SECONDS, EXTRACTION_CACHE,
+                     INDEX_ERRORS, STAT_CALLS)
+from textextractor import TextExtractor
+from tokenizer import term_frequencies, term_offsets
+
+MAX_PENDING_CHARS = 64 * 1024 * 1024  # flush early when a batch holds a lot of extracted text
+PROGRESS_INTERVAL = 0.25  # seconds between progress callbacks
+OCR_TIMEOUT_MARGIN = 30   # the OCR pool only gives up on workers that hang beyond Tesseract's own timeout
+
+def format_size(size):
+    if size < 1024 * 1024:
+        return f"{size / 1024:.1f} KB"
+    return f"{size / (1024 * 1024):.1f} MB"
 
 class Indexer:
     def __init__(self, db_adapter, text_extractor,config):
         self.db_adapter = db_adapter
         self.text_extractor = text_extractor
         self.config = config
+        # statistics of the last process_files run; per-file log lines go straight to the sink
         self.processed_files = 0  # Counter for processed files
         self.errors = 0           # Counter for errors
-        self.report_lines = []    # Store logs for the report
+        self.log_sink = LogSink(db_adapter, config.get_log_batch_size())
+        self.export_thread = None
+        self.batch_size = config.get_write_batch_size()
+        self.max_indexed_chars = config.get_max_indexed_chars()
+        self.pending = []         # Extracted documents waiting for the next bulk write
+        self.pending_chars = 0
+        self.known_files = None   # file_path -> get_file_states() tuple of the current crawl root
+        self.seen_files = set()
+        self.ocr_settings = config.get_ocr_settings()
+        self.ocr_jobs = {}        # file_path -> job of the images waiting for the OCR lane
+        self.change_counts = {"new": 0, "changed": 0, "unchanged": 0, "failed": 0, "deleted": 0}
+        self.files_seen = 0       # crawled files looked at by the last process_files run
+        self.cache_counts = {"hits": 0, "misses": 0}  # extraction cache lookups of the last run
+        # seconds per stage of the last run; extraction is summed over the worker processes
+        self.stage_seconds = {"crawl": 0.0, "extract": 0.0, "database": 0.0}
+        self.extract_seconds = {}  # extension -> seconds
+        self.bytes_seen = 0
+        self.current_file = None
+        # progress_callback(dict) is called from the indexing thread while process_files runs
+        self.progress_callback = None
+        self.total_files = None   # expected number of files of the run, enables the ETA
+        self.start_time = None
+        self.paused_seconds = 0.0
+        self.last_progress = 0.0
+        # pause/resume/cancel may be called from any thread; they act between files
+        self.resume_event = threading.Event()
+        self.resume_event.set()
+        self.cancel_event = threading.Event()
+        self.cancelled = False    # whether the last process_files run was cancelled
 
     def process_file(self, file_path):
+        # a single file outside process_files; an image deferred to the OCR lane is OCRed right away
+        self._process_file(file_path)
+        if self.ocr_jobs and not self.cancel_event.is_set():
+            self._run_ocr_lane()
+        self.flush()
+
+    def _process_file(self, entry):
+        file_path = entry.path if isinstance(entry, CrawlEntry) else entry
+        job = None
         try:
-            last_modified = os.path.getmtime(file_path)
-            existing = self.db_adapter.get_file_last_modified(file_path)
-            file_name = os.path.basename(file_path)
-            file_size = os.path.getsize(file_path)
-            _, extension = os.path.splitext(file_path)
-            #Add to db if it does not exist
-            if existing is None or last_modified > existing:
-                content = self.text_extractor.extract(file_path)
-                self.db_adapter.insert_or_update_file(
-                    file_path, file_name, file_size, extension, content, last_modified
-                )
-                if existing is None:
-                    log_msg = f"Indexed new file: {file_path}"
-                else:
-                    log_msg = f"Updated file: {file_path}"
-                self.report_lines.append(log_msg)
-                self.processed_files += 1
-            else:
-                # Skip file if it's unchanged
-                self.report_lines.append(f"Skipped unchanged file: {file_path}")
+            job = self._prepare(entry)
+            if job is not None and not self._defer_ocr(job):
+                start = time.perf_counter()
+                content, cache_hit = self.text_extractor.extract_cached(file_path)
+                self._record_extract(job, time.perf_counter() - start)
+                self._count_cache(cache_hit)
+                self._store(job, content)
         except Exception as e:
             # Log error if something goes wrong
-            self.report_lines.append(f"Error processing {file_path}: {e}")
-            self.errors += 1
+            self._record_error(file_path, e)
+            if job is not None:
+                self._store_failed(job)
+
+    def _prepare(self, entry):
+        # decide whether the file needs (re)extraction; crawl entries already carry their stat data
+        self.files_seen += 1
+        if isinstance(entry, CrawlEntry):
+            file_path, last_modified, file_size = entry.path, entry.last_modified, entry.size
+        else:
+            file_path = entry
+            STAT_CALLS.inc()
+            stat = os.stat(file_path)
+            last_modified, file_size = stat.st_mtime, stat.st_size
+        self.bytes_seen += file_size
+        self.current_file = file_path
+        self._report_progress()
+        if self.known_files is not None:
+            # state loaded once for the whole crawl root
+            self.seen_files.add(file_path)
+            known = self.known_files.get(file_path)
+            existing = known[0] if known else None
+            changed = known is None or last_modified != known[0] or file_size != known[1] or known[2]
+        else:
+            existing = self.db_adapter.get_file_last_modified(file_path)
+            changed = existing is None or last_modified != existing
+        if not changed:
+            # Skip file if it's unchanged; only counted, not logged per file.
+            # A file whose extraction failed is not tried again until it changes.
+            self.change_counts["failed" if known and known[3] else "unchanged"] += 1
+            return None
+        self.change_counts["new" if existing is None else "changed"] += 1
+        _, extension = os.path.splitext(file_path)
+        return {
+            "file_path": file_path,
+            "file_name": os.path.basename(file_path),
+            "file_size": file_size,
+            "extension": extension,
+            "last_modified": last_modified,
+            "is_new": existing is None,
+        }
+
+    def _defer_ocr(self, job):
+        # Images are stored right away with an empty text, so they are found by name and
+        # path; OCR runs in its own lane once every other file is indexed.
+        if not TextExtractor.needs_ocr(job["file_path"]):
+            return False
+        self._store(dict(job, ocr_pending=True), "")
+        self.ocr_jobs[job["file_path"]] = job
+        return True
+
+    def _store_failed(self, job):
+        # stored by name with an empty text and marked; counted as failed instead of new/changed
+        self.change_counts["new" if job["is_new"] else "changed"] -= 1
+        self.change_counts["failed"] += 1
+        self._store(dict(job, extraction_failed=True), "")
+
+    def _store(self, job, content):
+        # Tokenize once here; the inverted index is built from these counts
+        if content and len(content) > self.max_indexed_chars:
+            # the extractor stopped reading one character past the limit
+            content = content[:self.max_indexed_chars]
+            self.log_sink.log("INFO", f"Indexed only the first {self.max_indexed_chars} characters of "
+                                      f"{job['file_path']}")
+        job["content"] = content
+        job["terms"] = term_frequencies(job["file_name"], content)
+        job["offsets"] = term_offsets(content)
+        self.pending.append(job)
+        self.pending_chars += len(content or "")
+        if len(self.pending) >= self.batch_size or self.pending_chars >= MAX_PENDING_CHARS:
+            self.flush()
+
+    def flush(self):
+        # write the buffered documents in one bulk upsert transaction
+        if not self.pending:
+            return
+        batch, self.pending, self.pending_chars = self.pending, [], 0
+        start = time.perf_counter()
+        try:
+            self.db_adapter.bulk_upsert_files(batch)
+        except Exception as e:
+            for job in batch:
+                self._record_error(job["file_path"], e)
+            return
+        finally:
+            elapsed = time.perf_counter() - start
+            self.stage_seconds["database"] += elapsed
+            DB_WRITE_SECONDS.observe(elapsed)
+        DB_WRITTEN_FILES.inc(len(batch))
+        self.db_adapter.bump_index_generation()
+        for job in batch:
+            if job.get("ocr_pending") or job.get("extraction_failed"):
+                # logged and counted once its text is stored; failures were logged as errors
+                continue
+            if job["is_new"]:
+                log_msg = f"Indexed new file: {job['file_path']}"
+            else:
+                log_msg = f"Updated file: {job['file_path']}"
+            self.log_sink.log("INFO", log_msg)
+            self.processed_files += 1
+
+    # Removals and moves (used by the watcher); each committed change bumps the index generation
+    def remove_files(self, file_paths):
+        removed = self.db_adapter.delete_files(file_paths)
+        self.db_adapter.bump_index_generation()
+        return removed
+
+    def remove_directory(self, dir_path):
+        removed = self.db_adapter.delete_directory(dir_path)
+        self.db_adapter.bump_index_generation()
+        return removed
+
+    def move_file(self, old_path, new_path):
+        moved = self.db_adapter.rename_file(old_path, new_path)
+        self.db_adapter.bump_index_generation()
+        return moved
+
+    def move_directory(self, old_dir, new_dir):
+        moved = self.db_adapter.rename_directory(old_dir, new_dir)
+        self.db_adapter.bump_index_generation()
+        return moved
+
+    def pause(self):
+        self.resume_event.clear()
+
+    def resume(self):
+        self.resume_event.set()
+
+    def cancel(self):
+        self.cancel_event.set()
+        self.resume_event.set()
+
+    def is_paused(self):
+        return not self.resume_event.is_set()
 
-    def process_files(self, file_paths):
-        for file_path in file_paths:
-            self.process_file(file_path)
+    def _wait_if_paused(self):
+        # Pausing happens between files: the pending batch is committed first, so the
+        # database is consistent for as long as the pause lasts. Returns the seconds paused.
+        if self.resume_event.is_set():
+            return 0.0
+        self.flush()
+        paused_at = time.monotonic()
+        self._report_progress(force=True)
+        self.resume_event.wait()
+        paused = time.monotonic() - paused_at
+        self.paused_seconds += paused
+        return paused
+
+    def progress(self):
+        # rates are measured over the time spent working, pauses excluded
+        elapsed = time.monotonic() - self.start_time - self.paused_seconds if self.start_time else 0.0
+        files_per_sec = self.files_seen / elapsed if elapsed else 0.0
+        eta = None
+        if self.total_files is not None and files_per_sec:
+            eta = max(0, self.total_files - self.files_seen) / files_per_sec
+        return {
+            "files": self.files_seen,
+            "total": self.total_files,
+            "processed": self.processed_files,
+            "errors": self.errors,
+            "bytes": self.bytes_seen,
+            "elapsed": elapsed,
+            "files_per_sec": files_per_sec,
+            "bytes_per_sec": self.bytes_seen / elapsed if elapsed else 0.0,
+            "eta": eta,
+            "current_file": self.current_file,
+            "ocr_queued": len(self.ocr_jobs),
+            "paused": self.is_paused(),
+        }
+
+    def _report_progress(self, force=False):
+        if self.progress_callback is None:
+            return
+        now = time.monotonic()
+        if force or now - self.last_progress >= PROGRESS_INTERVAL:
+            self.last_progress = now
+            self.progress_callback(self.progress())
+
+    def _count_cache(self, cache_hit):
+        self.cache_counts["hits" if cache_hit else "misses"] += 1
+        EXTRACTION_CACHE.inc(result="hit" if cache_hit else "miss")
+
+    def _record_extract(self, job, seconds):
+        extension = job["extension"].lower()
+        self.stage_seconds["extract"] += seconds
+        self.extract_seconds[extension] = self.extract_seconds.get(extension, 0.0) + seconds
+        EXTRACT_SECONDS.observe(seconds, extension=extension)
+
+    def stage_summary(self):
+        # where the time of the last run went
+        by_extension = ", ".join(f"{extension or 'no extension'} {seconds:.1f}s" for extension, seconds in
+                                 sorted(self.extract_seconds.items(), key=lambda item: -item[1]))
+        by_extension = f" ({by_extension})" if by_extension else ""
+        return (f"Time: crawl {self.stage_seconds['crawl']:.1f}s, "
+                f"extract {self.stage_seconds['extract']:.1f}s{by_extension}, "
+                f"database writes {self.stage_seconds['database']:.1f}s.")
+
+    def cache_hit_rate(self):
+        lookups = self.cache_counts["hits"] + self.cache_counts["misses"]
+        return self.cache_counts["hits"] / lookups if lookups else 0.0
+
+    def storage_summary(self):
+        raw, stored = self.db_adapter.get_storage_stats()
+        saved = 1 - stored / raw if raw else 0.0
+        return f"Stored text: {format_size(raw)} extracted, {format_size(stored)} compressed ({saved:.0%} saved)."
+
+    def _record_error(self, file_path, error):
+        self.log_sink.log("ERROR", f"Error processing {file_path}: {error}")
+        self.errors += 1
+        INDEX_ERRORS.inc()
+
+    def process_files(self, file_paths, root=None, total=None):
+        # file_paths: paths or CrawlEntry items, any iterable (FileCrawler.crawl streams them)
+        # With the crawl root known, the stored (last_modified, size) of everything under it
+        # is read in one streamed query and diffed in memory instead of one SELECT per file.
+        # total: expected number of files, only used for the progress ETA.
+        self.change_counts = {"new": 0, "changed": 0, "unchanged": 0, "failed": 0, "deleted": 0}
+        self.cache_counts = {"hits": 0, "misses": 0}
+        self.stage_seconds = {"crawl": 0.0, "extract": 0.0, "database": 0.0}
+        self.extract_seconds = {}
+        crawl_seconds = CRAWL_SECONDS.get()
+        self.processed_files = 0
+        self.errors = 0
+        self.files_seen = 0
+        self.bytes_seen = 0
+        self.total_files = total
+        self.start_time = time.monotonic()
+        self.paused_seconds = 0.0
+        self.cancelled = False
+        self.ocr_jobs = {}
+        if root is not None:
+            self.known_files = self.db_adapter.get_file_states(root)
+            self.seen_files = set()
+        try:
+            self._process_files(file_paths)
+            if self.ocr_jobs and not self.cancel_event.is_set():
+                self._run_ocr_lane()
+            self.cancelled = self.cancel_event.is_set()
+            # a cancelled crawl saw only part of root, nothing may be treated as deleted
+            if root is not None and not self.cancelled:
+                # stored under root but not crawled: either gone from disk or skipped by this
+                # crawl's ignore patterns/extensions, and only the first is a deletion
+                deleted = [file_path for file_path in self.known_files.keys() - self.seen_files
+                           if not os.path.exists(file_path)]
+                self.change_counts["deleted"] = self.remove_files(deleted) if deleted else 0
+                for file_path in deleted:
+                    self.log_sink.log("INFO", f"Removed deleted file: {file_path}")
+        finally:
+            # also on Ctrl+C or an error: what was extracted so far is committed
+            self.flush()
+            self.stage_seconds["crawl"] = CRAWL_SECONDS.get() - crawl_seconds
+            self.known_files = None
+            self.seen_files = set()
+            self.current_file = None
+            # images left in the lane keep ocr_pending and are picked up by the next run
+            self.ocr_jobs = {}
+            self.cancel_event.clear()
+            self.resume_event.set()
+            self.log_sink.flush()
+            self._report_progress(force=True)
+
+    def _process_files(self, file_paths):
+        workers = self.config.get_index_workers()
+        if workers <= 1:
+            for file_path in file_paths:
+                self._wait_if_paused()
+                if self.cancel_event.is_set():
+                    break
+                self._process_file(file_path)
+            # whatever was extracted before a cancel is still committed as a whole batch
+            self.flush()
+            return
+
+        # Extraction runs in worker processes, this thread is the single DB writer
+        jobs = {}
+
+        def paths_to_extract():
+            for entry in file_paths:
+                # files already handed to workers keep running; their deadlines skip the pause
+                pool.extend_deadlines(self._wait_if_paused())
+                if self.cancel_event.is_set():
+                    return
+                file_path = entry.path if isinstance(entry, CrawlEntry) else entry
+                try:
+                    job = self._prepare(entry)
+                except Exception as e:
+                    self._record_error(file_path, e)
+                    continue
+                if job is not None and not self._defer_ocr(job):
+                    jobs[file_path] = job
+                    yield file_path
+
+        with ExtractionPool(self.text_extractor, workers, self.config.get_extraction_timeout()) as pool:
+            self._collect(pool, paths_to_extract(), jobs)
+        self.flush()
+
+    def _run_ocr_lane(self):
+        # Low-priority worker processes, at most ocr.workers at a time, each image bounded by
+        # ocr.timeout; the text replaces the empty one stored by _defer_ocr.
+        self.flush()
+        settings = self.ocr_settings
+        jobs = self.ocr_jobs
+
+        def paths_to_ocr():
+            for file_path in list(jobs):
+                pool.extend_deadlines(self._wait_if_paused())
+                if self.cancel_event.is_set():
+                    return
+                yield file_path
+
+        with ExtractionPool(self.text_extractor, max(1, settings["workers"]),
+                            settings["timeout"] + OCR_TIMEOUT_MARGIN, settings["nice"]) as pool:
+            self._collect(pool, paths_to_ocr(), jobs)
+        self.flush()
+
+    def _collect(self, pool, file_paths, jobs):
+        # stores what the worker processes extracted; this thread stays the only DB writer
+        for file_path, result, error, seconds in pool.extract(file_paths):
+            job = jobs.pop(file_path)
+            self.current_file = file_path
+            if error is not None:
+                self._record_error(file_path, error)
+                self._store_failed(job)
+                continue
+            self._record_extract(job, seconds)
+            content, cache_hit = result
+            self._count_cache(cache_hit)
+            try:
+                self._store(job, content)
+            except Exception as e:
+                self._record_error(file_path, e)
+            self._report_progress()
+            if self.cancel_event.is_set():
+                # leaving the pool terminates the extractions still in flight
+                break
+
+    def close(self):
+        self.log_sink.close()
+        self.wait_for_export()
+
+    def wait_for_export(self):
+        if self.export_thread is not None:
+            self.export_thread.join()
+            self.export_thread = None
 
     def generate_report(self):
-        # Insert each log into the logs table
-        for line in self.report_lines:
-            self.db_adapter.insert_log("INFO", line)
-            # Insert a summary of the indexing process
+        # per-file lines were logged during the run; make sure they are written, then add the summary
+        self.log_sink.flush()
         summary = (f"Indexing Summary - Timestamp: {datetime.now()}. "
-                   f"Total files processed: {self.processed_files}. Errors: {self.errors}.\n")
+                   f"Total files processed: {self.processed_files}. Errors: {self.errors}. "
+                   f"New: {self.change_counts['new']}, changed: {self.change_counts['changed']}, "
+                   f"unchanged: {self.change_counts['unchanged']}, failed: {self.change_counts['failed']}, "
+                   f"deleted: {self.change_counts['deleted']}. "
+                   f"Extraction cache hit rate: {self.cache_hit_rate():.0%} "
+                   f"({self.cache_counts['hits']}/{self.cache_counts['hits'] + self.cache_counts['misses']}). "
+                   f"{self.storage_summary()} {self.stage_summary()}\n")
         self.db_adapter.insert_log("SUMMARY", summary)
         print("\n")
         print("Indexing report has been logged into the database.")
 
-        # Automatically export logs to a file after indexing
-        export_logs_to_txt(self.db_adapter)
-        print("Logs have been automatically exported.")
-
-        export_index_report(self.db_adapter, self.config, filename="index_report")
\ No newline at end of file
+        # logs and index report are exported in the background
+        self.wait_for_export()
+        self.export_thread = start_export(self.db_adapter, self.config)
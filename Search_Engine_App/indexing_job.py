@@ -0,0 +1,63 @@
+import threading
+
+from PyQt6.QtCore import QThread, pyqtSignal
+
+from metrics import profiled
+
+class IndexingJob(QThread):
+    # Crawls and indexes one folder on a background thread. Progress dicts from
+    # Indexer.progress() are forwarded to the GUI thread through the progress signal.
+    progress = pyqtSignal(dict)
+    completed = pyqtSignal(bool)  # True when the run was cancelled
+
+    def __init__(self, indexer, crawler, root, profile_path=""):
+        super().__init__()
+        self.indexer = indexer
+        self.crawler = crawler
+        self.root = root
+        self.profile_path = profile_path  # cProfile output of the run, empty to skip profiling
+        self.counted = None  # files under root, once the counting crawl is done
+        self.stop_counting = threading.Event()
+
+    def run(self):
+        # indexing starts right away; a second crawl counts the files alongside it and
+        # the ETA stays unknown until that count is in
+        self.indexer.progress_callback = self.report_progress
+        counter = threading.Thread(target=self.count_files, name="IndexingCount", daemon=True)
+        counter.start()
+        try:
+            with profiled(self.profile_path):
+                self.indexer.process_files(self.crawler.crawl(self.root), root=self.root)
+            if not self.indexer.cancelled and self.indexer.files_seen:
+                self.indexer.generate_report()
+        except Exception as e:
+            print(f"Indexing failed: {e}")
+            self.indexer.db_adapter.insert_log("ERROR", f"Indexing of {self.root} failed: {e}")
+        finally:
+            self.stop_counting.set()
+            self.indexer.progress_callback = None
+        self.completed.emit(self.indexer.cancelled)
+
+    def count_files(self):
+        total = 0
+        for _ in self.crawler.crawl(self.root):
+            total += 1
+            if self.stop_counting.is_set() or self.indexer.cancel_event.is_set():
+                return
+        self.counted = total
+
+    def report_progress(self, progress):
+        # called on the indexing thread, which owns indexer.total_files
+        if self.counted is not None and self.indexer.total_files is None:
+            self.indexer.total_files = self.counted
+            progress = self.indexer.progress()
+        self.progress.emit(progress)
+
+    def pause(self):
+        self.indexer.pause()
+
+    def resume(self):
+        self.indexer.resume()
+
+    def cancel(self):
+        self.indexer.cancel()
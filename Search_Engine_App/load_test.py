@@ -0,0 +1,70 @@
+import argparse
+import asyncio
+import itertools
+import json
+import time
+from urllib.parse import urlencode
+
+from benchmark_suite import percentiles
+
+async def fetch(reader, writer, host, path):
+    # one GET on a keep-alive connection; returns (status, body)
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode("latin-1"))
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(value)
+    return status, await reader.readexactly(length)
+
+async def run_load(host, port, queries, concurrency=32, requests=1000, limit=20):
+    # `concurrency` connections send `requests` searches in total, cycling through the queries;
+    # returns throughput, error count and latency percentiles
+    paths = itertools.cycle([f"/search?{urlencode({'q': query, 'limit': limit})}" for query in queries])
+    remaining = [requests]
+    timings = []
+    errors = []
+
+    async def client():
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            while remaining[0] > 0:
+                remaining[0] -= 1
+                start = time.perf_counter()
+                status, body = await fetch(reader, writer, host, next(paths))
+                timings.append((time.perf_counter() - start) * 1000)
+                if status != 200:
+                    errors.append(f"{status}: {body[:200].decode('utf-8', errors='replace')}")
+        finally:
+            writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    seconds = time.perf_counter() - start
+    results = {"requests": len(timings), "concurrency": concurrency, "errors": len(errors),
+               "seconds": round(seconds, 3), "requests_per_sec": round(len(timings) / seconds, 1)}
+    if timings:
+        results.update(percentiles(timings))
+    if errors:
+        results["first_error"] = errors[0]
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent search load against a running search service")
+    parser.add_argument("queries", nargs="+", help="queries sent in turn")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--concurrency", type=int, default=32, help="open connections")
+    parser.add_argument("--requests", type=int, default=1000, help="searches in total")
+    parser.add_argument("--limit", type=int, default=20, help="results per search")
+    args = parser.parse_args()
+    results = asyncio.run(run_load(args.host, args.port, args.queries, args.concurrency, args.requests, args.limit))
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
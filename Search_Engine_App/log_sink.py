@@ -0,0 +1,61 @@
+import queue
+import threading
+import time
+from datetime import datetime
+
+FLUSH = object()  # queue marker: write what was collected without waiting for flush_interval
+CLOSE = object()
+
+class LogSink:
+    # Log lines are queued by the caller and written by a background thread, many rows per
+    # transaction. The queue is bounded: a slow database slows the producer down instead of
+    # letting memory grow.
+    def __init__(self, db_adapter, batch_size=500, flush_interval=0.5, max_pending=10000):
+        self.db_adapter = db_adapter
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(max_pending)
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def log(self, level, message):
+        self._ensure_started()
+        self.queue.put((datetime.now(), level, message))
+
+    def flush(self):
+        # blocks until everything logged so far is in the database
+        if self.thread is not None:
+            self.queue.put(FLUSH)
+            self.queue.join()
+
+    def close(self):
+        with self.lock:
+            if self.thread is None:
+                return
+            self.queue.put(CLOSE)
+            self.thread.join()
+            self.thread = None
+
+    def _ensure_started(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="LogSink", daemon=True)
+                self.thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            # collect more lines until the batch is full or flush_interval has passed
+            deadline = time.monotonic() + self.flush_interval
+            while batch[-1] not in (FLUSH, CLOSE) and len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            entries = [entry for entry in batch if entry not in (FLUSH, CLOSE)]
+            if entries:
+                self.db_adapter.insert_logs(entries)
+            for _ in batch:
+                self.queue.task_done()
+            if batch[-1] is CLOSE:
+                return
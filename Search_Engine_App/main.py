@@ -1,12 +1,16 @@
 import sys
-from PyQt6.QtWidgets import QApplication
-from gui import MainWindow
 
 def main():
+    # any arguments run the headless CLI (index, watch, search, serve), none start the GUI
+    if len(sys.argv) > 1:
+        from cli import main as cli_main
+        sys.exit(cli_main())
+    from PyQt6.QtWidgets import QApplication
+    from gui import MainWindow
     app = QApplication(sys.argv)
     window = MainWindow()
     window.show()
     sys.exit(app.exec())
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,166 @@
+import cProfile
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# In-process counters and histograms for the indexing and search hot paths, rendered
+# in the Prometheus text format. Every update takes one lock, the cost is a few dict
+# operations per file or query.
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+RESULT_BUCKETS = (0, 1, 5, 10, 25, 50, 100, 200, 500)
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _labels(labels, extra=None):
+    items = sorted(labels) + ([extra] if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in items) + "}"
+
+class Counter:
+    def __init__(self, name, help_text, lock):
+        self.name = name
+        self.help_text = help_text
+        self.lock = lock
+        self.values = {}  # sorted label items -> value
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels):
+        return self.values.get(tuple(sorted(labels.items())), 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{_labels(key)} {value}")
+        return lines
+
+class Histogram:
+    def __init__(self, name, help_text, lock, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.lock = lock
+        self.buckets = tuple(buckets)
+        self.values = {}  # sorted label items -> [count per bucket..., sum, count]
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def total(self, **labels):
+        # (sum, count) of one label set
+        state = self.values.get(tuple(sorted(labels.items())))
+        return (state[-2], state[-1]) if state else (0.0, 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for key, state in sorted(self.values.items()):
+            for bound, count in zip(self.buckets, state):
+                lines.append(f"{self.name}_bucket{_labels(key, ('le', bound))} {count}")
+            lines.append(f"{self.name}_bucket{_labels(key, ('le', '+Inf'))} {state[-1]}")
+            lines.append(f"{self.name}_sum{_labels(key)} {state[-2]}")
+            lines.append(f"{self.name}_count{_labels(key)} {state[-1]}")
+        return lines
+
+class MetricsRegistry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}
+
+    def counter(self, name, help_text):
+        return self.metrics.setdefault(name, Counter(name, help_text, self.lock))
+
+    def histogram(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        return self.metrics.setdefault(name, Histogram(name, help_text, self.lock, buckets))
+
+    def render(self):
+        with self.lock:
+            lines = []
+            for metric in self.metrics.values():
+                lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        # written next to the target and renamed, a scraper never reads half a file
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(temp_path, path)
+
+    def serve(self, port, host="127.0.0.1"):
+        # GET /metrics on a local port from a daemon thread; returns the server for shutdown()
+        registry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=server.serve_forever, name="MetricsServer", daemon=True).start()
+        return server
+
+REGISTRY = MetricsRegistry()
+
+CRAWL_SECONDS = REGISTRY.counter("search_engine_crawl_seconds_total",
+                                 "Time spent walking directories and reading file stats")
+CRAWLED_FILES = REGISTRY.counter("search_engine_crawled_files_total", "Files returned by the crawler")
+STAT_CALLS = REGISTRY.counter("search_engine_stat_calls_total", "os.stat calls made while crawling and indexing")
+EXTRACT_SECONDS = REGISTRY.histogram("search_engine_extract_seconds", "Text extraction time per file by extension")
+EXTRACTION_CACHE = REGISTRY.counter("search_engine_extraction_cache_total", "Extraction cache lookups by result")
+DB_WRITE_SECONDS = REGISTRY.histogram("search_engine_db_write_seconds", "Time per bulk write of extracted files")
+DB_WRITTEN_FILES = REGISTRY.counter("search_engine_db_written_files_total", "Files written to the database")
+INDEX_ERRORS = REGISTRY.counter("search_engine_index_errors_total", "Files that failed to index")
+SEARCH_SECONDS = REGISTRY.histogram("search_engine_search_seconds",
+                                    "Database search time by kind (page/full) and result cache use")
+QUERIES = REGISTRY.counter("search_engine_queries_total", "Searches run from the GUI")
+QUERY_LATENCY = REGISTRY.histogram("search_engine_query_latency_seconds",
+                                   "End-to-end latency of GUI searches, first page included")
+QUERY_RESULTS = REGISTRY.histogram("search_engine_query_results", "Results shown per GUI search", RESULT_BUCKETS)
+
+@contextmanager
+def profiled(path):
+    # cProfile of the calling thread, written to path for pstats/snakeviz; no-op when path is empty
+    if not path:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+        print(f"Profile written to {path}")
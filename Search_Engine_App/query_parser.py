@@ -1,8 +1,72 @@
+import re
 import shlex
+from datetime import datetime, timedelta
 
-def parse_query(raw_query):
+FILTER_PREFIXES = ("ext:", "size:", "modified:")
+SIZE_UNITS = {"": 1, "b": 1, "kb": 1024, "mb": 1024 ** 2, "gb": 1024 ** 3}
+SIZE_PATTERN = re.compile(r"^(\d+(?:\.\d+)?)\s*([kmg]?b?)$", re.IGNORECASE)
+COMPARISON_PATTERN = re.compile(r"^(<=|>=|<|>|=)?(.+)$")
+DATE_FORMATS = ("%Y-%m-%d", "%Y-%m-%dT%H:%M", "%Y-%m-%dT%H:%M:%S")
+
+def parse_size(text):
+    match = SIZE_PATTERN.match(text.strip())
+    if not match:
+        raise ValueError(f"invalid size: {text}")
+    number, unit = match.groups()
+    unit = unit.lower()
+    if unit and not unit.endswith("b"):
+        unit += "b"
+    return int(float(number) * SIZE_UNITS[unit])
+
+def parse_date(text):
+    # (start, end) timestamps of the period a date names: a whole day or a single moment
+    for date_format in DATE_FORMATS:
+        try:
+            start = datetime.strptime(text, date_format)
+        except ValueError:
+            continue
+        end = start + timedelta(days=1) if date_format == "%Y-%m-%d" else start
+        return start.timestamp(), end.timestamp()
+    raise ValueError(f"invalid date: {text}")
+
+def parse_filter(token):
+    # ext:pdf[,txt]  size:>1MB  size:1MB..10MB  modified:<2026-01-01 -> list of (column, op, value)
+    key, _, value = token.partition(":")
+    if key == "ext":
+        extensions = tuple(sorted({"." + ext.strip().lstrip(".").lower() for ext in value.split(",") if ext.strip()}))
+        if not extensions:
+            raise ValueError(f"invalid filter: {token}")
+        return [("extension", "in", extensions)]
+
+    if ".." in value:
+        low, high = value.split("..", 1)
+        return parse_filter(f"{key}:>={low}") + parse_filter(f"{key}:<={high}")
+    match = COMPARISON_PATTERN.match(value)
+    if not match:
+        raise ValueError(f"invalid filter: {token}")
+    op, operand = match.groups()
+    op = op or "="
+    if key == "size":
+        return [("file_size", op, parse_size(operand))]
+
+    # a date-only value covers the whole day: "<=" and ">" compare against its end
+    start, end = parse_date(operand)
+    if op == "=":
+        return [("last_modified", ">=", start), ("last_modified", "<" if end > start else "<=", end)]
+    if start == end:
+        return [("last_modified", op, start)]
+    return [{"<": ("last_modified", "<", start), "<=": ("last_modified", "<", end),
+             ">": ("last_modified", ">=", end), ">=": ("last_modified", ">=", start)}[op]]
+
+def normalize_query(raw_query):
+    # one form per query for search history counts: case and spacing do not matter
+    return " ".join(raw_query.lower().split())
+
+def parse_query(raw_query, with_filters=False):
+    # with_filters: also return the ext:/size:/modified: filters as a tuple of (column, op, value)
     path_terms = []
     content_terms = []
+    filters = []
 
     try:
         tokens = shlex.split(raw_query)
@@ -30,6 +94,18 @@ def parse_query(raw_query):
             buffer = token[len("content:"):]
             current_type = "content"
 
+        elif token.startswith(FILTER_PREFIXES):
+            if current_type == "path" and buffer:
+                path_terms.append(buffer.strip())
+            elif current_type == "content" and buffer:
+                content_terms.append(buffer.strip())
+            buffer = ""
+            current_type = None
+            try:
+                filters.extend(parse_filter(token))
+            except ValueError as e:
+                print(f"[QueryParser Error] {e}")
+
         else:
             if current_type:
                 buffer += " " + token
@@ -45,4 +121,6 @@ def parse_query(raw_query):
     for content in content_terms:
         final_content_terms.extend(content.split())
 
-    return path_terms, final_content_terms
\ No newline at end of file
+    if with_filters:
+        return path_terms, final_content_terms, tuple(filters)
+    return path_terms, final_content_terms
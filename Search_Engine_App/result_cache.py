@@ -0,0 +1,63 @@
+import sys
+import threading
+from collections import OrderedDict
+
+ROW_OVERHEAD = 200  # rough per-row bytes of the Row object and its numbers
+
+def estimate_size(rows):
+    size = sys.getsizeof(rows)
+    for row in rows:
+        size += ROW_OVERHEAD + sum(len(value) for value in row if isinstance(value, str))
+    return size
+
+class SearchResultCache:
+    # In-process LRU of search results bounded by an estimate of their memory.
+    # Entries remember the index generation they were computed at; once the Indexer
+    # commits changes the generation moves on and older entries are never returned.
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> (generation, query, result, complete, size)
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key, generation):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] != generation:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def put(self, key, generation, query, result, complete, rows):
+        # query: the normalised query, complete: result holds every match (not cut by a limit)
+        size = estimate_size(rows)
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.total_bytes -= old[4]
+            self.entries[key] = (generation, query, result, complete, size)
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.total_bytes -= evicted[4]
+
+    def find_superset(self, generation, kind, implies):
+        # (query, result) of the most recent complete result of the same kind implied by the new query
+        with self.lock:
+            for key in reversed(self.entries):
+                entry_generation, query, result, complete, _ = self.entries[key]
+                if entry_generation == generation and complete and key[0] == kind and implies(query):
+                    self.entries.move_to_end(key)
+                    return query, result
+        return None
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.total_bytes = 0
@@ -1,6 +1,9 @@
 # search_observer.py
+from metrics import QUERIES, QUERY_LATENCY, QUERY_RESULTS
+
 class SearchObserver:
-    def update(self, query: str, results: list):
+    # results: the rows shown first; result_count: every match of the query, when it was counted
+    def update(self, query: str, results: list, latency_ms: float = None, result_count: int = None):
         raise NotImplementedError()
 
 class SearchObservable:
@@ -10,9 +13,11 @@ class SearchObservable:
     def register_observer(self, observer: SearchObserver):
         self._observers.append(observer)
 
-    def notify_observers(self, query: str, results: list):
+    def notify_observers(self, query: str, results: list, latency_ms: float = None, result_count: int = None):
+        if result_count is None:
+            result_count = len(results)
         for obs in self._observers:
-            obs.update(query, results)
+            obs.update(query, results, latency_ms, result_count)
 
 class QueryLoggerObserver(SearchObserver):
     def __init__(self, db_adapter):
@@ -20,30 +25,44 @@ class QueryLoggerObserver(SearchObserver):
         self.last_logged_query = None
         self.last_logged_result_count = None
 
-    def update(self, query: str, results: list):
-        if query != self.last_logged_query or len(results) != self.last_logged_result_count:
-            print(f"[LoggerObserver] Logging query: {query} with {len(results)} results")
-            self.db.insert_search_query(query, result_count=len(results))
+    def update(self, query: str, results: list, latency_ms: float = None, result_count: int = None):
+        if result_count is None:
+            result_count = len(results)
+        if query != self.last_logged_query or result_count != self.last_logged_result_count:
+            print(f"[LoggerObserver] Logging query: {query} with {result_count} results")
+            self.db.insert_search_query(query, result_count=result_count, latency_ms=latency_ms)
             self.last_logged_query = query
-            self.last_logged_result_count = len(results)
+            self.last_logged_result_count = result_count
         else:
             print(f"[LoggerObserver] Skipped duplicate query: {query}")
 
+def fill_suggestions(combo_box, db_adapter, limit=5):
+    # recent queries first, then popular ones not already listed
+    combo_box.clear()
+    recent_queries = db_adapter.fetch_recent_queries(limit=limit)
+    if not recent_queries:
+        combo_box.addItem("No recent searches.")
+        return
+    for query_text, results_count in recent_queries:
+        label = f"{query_text} ({results_count})" if results_count is not None else query_text
+        combo_box.addItem(label, userData=query_text)
+    shown = {query_text for query_text, _ in recent_queries}
+    for query_text, search_count in db_adapter.fetch_popular_queries(limit=limit):
+        if query_text not in shown and search_count > 1:
+            combo_box.addItem(f"{query_text} (searched {search_count}x)", userData=query_text)
+
+class MetricsObserver(SearchObserver):
+    # per-query latency and result count histograms, see metrics.py
+    def update(self, query: str, results: list, latency_ms: float = None, result_count: int = None):
+        QUERIES.inc()
+        QUERY_RESULTS.observe(len(results) if result_count is None else result_count)
+        if latency_ms is not None:
+            QUERY_LATENCY.observe(latency_ms / 1000)
+
 class SuggestionUpdaterObserver(SearchObserver):
     def __init__(self, combo_box, db_adapter):
         self.combo_box = combo_box
         self.db = db_adapter
 
-    def update(self, query: str, results: list):
-        self.combo_box.clear()
-        recent_queries = self.db.fetch_recent_queries(limit=5)
-        if not recent_queries:
-            self.combo_box.addItem("No recent searches.")
-        else:
-            for q in recent_queries:
-                if " | results: " in q:
-                    query_text = q.split(" | results: ")[0].strip()
-                    results_count = q.split(" | results: ")[1].strip()
-                    self.combo_box.addItem(f"{query_text} ({results_count})", userData=query_text)
-                else:
-                    self.combo_box.addItem(q, userData=q)
\ No newline at end of file
+    def update(self, query: str, results: list, latency_ms: float = None, result_count: int = None):
+        fill_suggestions(self.combo_box, self.db)
@@ -0,0 +1,276 @@
+import asyncio
+import json
+import os
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+from metrics import REGISTRY
+from query_parser import parse_query
+from search_observer import MetricsObserver, QueryLoggerObserver, SearchObservable
+from snippets import format_snippet
+
+MAX_HEADER_BYTES = 16 * 1024  # longest request or header line accepted
+MAX_BODY_BYTES = 64 * 1024
+IDLE_TIMEOUT = 30   # seconds a keep-alive connection may stay silent before it is closed
+MAX_LIMIT = 1000    # results per request
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+def format_cursor(cursor):
+    # (score, id) keyset cursor of search_files_page as an opaque query parameter
+    return None if cursor is None else f"{cursor[0]!r},{cursor[1]}"
+
+def parse_cursor(text):
+    try:
+        score, file_id = text.rsplit(",", 1)
+        return float(score), int(file_id)
+    except ValueError:
+        raise HttpError(HTTPStatus.BAD_REQUEST, f"invalid cursor: {text}")
+
+def result_to_dict(row, snippets, pages):
+    return {"id": row.id, "path": row.file_path, "name": row.file_name, "size": row.file_size,
+            "extension": row.extension, "last_modified": row.last_modified, "score": row.score,
+            "snippet": format_snippet(snippets.get(row.id, [])), "page": pages.get(row.id)}
+
+def search_page(db, query, limit, cursor=None):
+    # one page of results with snippets, as sent by the service and printed by the CLI
+    path_terms, content_terms, filters = parse_query(query, with_filters=True)
+    rows, next_cursor = db.search_files_page(path_terms, content_terms, limit, cursor, filters)
+    snippets, pages = db.get_snippets([row.id for row in rows], content_terms, with_pages=True)
+    return rows, [result_to_dict(row, snippets, pages) for row in rows], next_cursor
+
+class SearchService:
+    # Local HTTP/JSON API over a DatabaseAdapter and Indexer, served from one asyncio loop.
+    # Database calls block, so they run on `workers` threads, each using at most one pooled
+    # connection at a time; requests beyond workers + max_queued are refused with 503
+    # instead of queueing without bound.
+    def __init__(self, db, indexer=None, crawler=None, workers=8, max_queued=256, page_size=50, log_queries=False):
+        self.db = db
+        self.indexer = indexer
+        self.crawler = crawler
+        self.workers = workers
+        self.max_queued = max_queued
+        self.page_size = page_size
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="SearchWorker")
+        self.in_flight = 0
+        self.search_observable = SearchObservable()
+        self.search_observable.register_observer(MetricsObserver())
+        if log_queries:
+            self.search_observable.register_observer(QueryLoggerObserver(db))
+        self.indexing_thread = None
+        self.indexing_root = None
+        self.server = None
+        self.connections = set()  # handler tasks of open connections
+        self.routes = {
+            ("GET", "/health"): self.health,
+            ("GET", "/search"): self.search,
+            ("GET", "/index"): self.index_status,
+            ("POST", "/index"): self.start_indexing,
+            ("GET", "/metrics"): self.metrics,
+        }
+
+    async def start(self, host="127.0.0.1", port=8765):
+        # returns the bound port, useful with port 0
+        self.server = await asyncio.start_server(self.handle_connection, host, port, limit=MAX_HEADER_BYTES)
+        return self.server.sockets[0].getsockname()[1]
+
+    def run(self, host="127.0.0.1", port=8765):
+        # serves until Ctrl+C or SIGTERM
+        async def serve():
+            bound_port = await self.start(host, port)
+            print(f"Search service listening on http://{host}:{bound_port}")
+            stopped = asyncio.Event()
+            for signal_number in (signal.SIGINT, signal.SIGTERM):
+                try:
+                    asyncio.get_running_loop().add_signal_handler(signal_number, stopped.set)
+                except (NotImplementedError, RuntimeError):
+                    pass  # Windows: Ctrl+C still ends asyncio.run with KeyboardInterrupt
+            await stopped.wait()
+            await self.stop()
+            print("Search service stopped.")
+        try:
+            asyncio.run(serve())
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.close()
+
+    async def stop(self):
+        # stop accepting, then end the open keep-alive connections
+        self.server.close()
+        for task in list(self.connections):
+            task.cancel()
+        await asyncio.gather(*self.connections, return_exceptions=True)
+        await self.server.wait_closed()
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        thread = self.indexing_thread
+        if thread is not None:
+            self.indexer.cancel()
+            thread.join()
+
+    async def run_blocking(self, function, *args):
+        if self.in_flight >= self.workers + self.max_queued:
+            raise HttpError(HTTPStatus.SERVICE_UNAVAILABLE, "too many requests queued")
+        self.in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+        finally:
+            self.in_flight -= 1
+
+    async def handle_connection(self, reader, writer):
+        task = asyncio.current_task()
+        self.connections.add(task)
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(self.read_request(reader), IDLE_TIMEOUT)
+                except HttpError as e:
+                    self.write_response(writer, e.status, {"error": str(e)}, keep_alive=False)
+                    await writer.drain()
+                    break
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                    break
+                if request is None:
+                    break
+                method, target, keep_alive, body = request
+                status, payload = await self.dispatch(method, target, body)
+                self.write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+            self.connections.discard(task)
+
+    async def read_request(self, reader):
+        # (method, target, keep_alive, body), or None when the client closed the connection
+        try:
+            request_line = await reader.readline()
+            if not request_line:
+                return None
+            parts = request_line.decode("latin-1").split()
+            if len(parts) != 3:
+                raise HttpError(HTTPStatus.BAD_REQUEST, "malformed request line")
+            method, target, version = parts
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+        except (ValueError, asyncio.LimitOverrunError):
+            raise HttpError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "request header too large")
+
+        connection = headers.get("connection", "").lower()
+        keep_alive = connection == "keep-alive" if version == "HTTP/1.0" else connection != "close"
+        try:
+            length = int(headers.get("content-length", 0))
+        except ValueError:
+            raise HttpError(HTTPStatus.BAD_REQUEST, "invalid Content-Length")
+        if length > MAX_BODY_BYTES:
+            raise HttpError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "request body too large")
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), target, keep_alive, body
+
+    async def dispatch(self, method, target, body):
+        url = urlsplit(target)
+        params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        handler = self.routes.get((method, url.path))
+        try:
+            if handler is None:
+                if any(path == url.path for _, path in self.routes):
+                    raise HttpError(HTTPStatus.METHOD_NOT_ALLOWED, f"{method} is not supported on {url.path}")
+                raise HttpError(HTTPStatus.NOT_FOUND, f"no such endpoint: {url.path}")
+            return HTTPStatus.OK, await handler(params, body)
+        except HttpError as e:
+            return e.status, {"error": str(e)}
+        except Exception as e:
+            print(f"Service request {method} {url.path} failed: {e}")
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {"error": str(e)}
+
+    def write_response(self, writer, status, payload, keep_alive):
+        if isinstance(payload, str):
+            body, content_type = payload.encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            body, content_type = json.dumps(payload).encode("utf-8"), "application/json"
+        head = (f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode("latin-1") + body)
+
+    async def health(self, params, body):
+        return {"status": "ok", "in_flight": self.in_flight, "indexing": self.indexing_thread is not None}
+
+    async def metrics(self, params, body):
+        return REGISTRY.render()
+
+    async def search(self, params, body):
+        query = params.get("q", "").strip()
+        if not query:
+            raise HttpError(HTTPStatus.BAD_REQUEST, "missing query parameter q")
+        try:
+            limit = int(params.get("limit", self.page_size))
+        except ValueError:
+            raise HttpError(HTTPStatus.BAD_REQUEST, "limit must be a number")
+        limit = max(1, min(limit, MAX_LIMIT))
+        cursor = parse_cursor(params["cursor"]) if params.get("cursor") else None
+        return await self.run_blocking(self._search, query, limit, cursor)
+
+    def _search(self, query, limit, cursor):
+        start = time.perf_counter()
+        rows, results, next_cursor = search_page(self.db, query, limit, cursor)
+        latency_ms = (time.perf_counter() - start) * 1000
+        response = {"query": query, "results": results, "next_cursor": format_cursor(next_cursor),
+                    "elapsed_ms": round(latency_ms, 3)}
+        # like the GUI, only the first page of a query counts as a search
+        if cursor is None:
+            total = len(rows) if next_cursor is None else self.db.count_files(*parse_query(query, with_filters=True))
+            self.search_observable.notify_observers(query, rows, latency_ms, total)
+            response["total"] = total
+        return response
+
+    async def index_status(self, params, body):
+        progress = self.indexer.progress() if self.indexer is not None else None
+        return {"running": self.indexing_thread is not None, "root": self.indexing_root, "progress": progress}
+
+    async def start_indexing(self, params, body):
+        if self.indexer is None:
+            raise HttpError(HTTPStatus.NOT_FOUND, "indexing is not enabled on this service")
+        try:
+            root = json.loads(body or b"{}").get("root") or params.get("root")
+        except (ValueError, AttributeError):
+            raise HttpError(HTTPStatus.BAD_REQUEST, "body must be a JSON object")
+        if not root or not os.path.isdir(root):
+            raise HttpError(HTTPStatus.BAD_REQUEST, f"not a directory: {root}")
+        if self.indexing_thread is not None:
+            raise HttpError(HTTPStatus.CONFLICT, f"already indexing {self.indexing_root}")
+        self.indexing_root = os.path.abspath(root)
+        self.indexing_thread = threading.Thread(target=self._index, args=(self.indexing_root,),
+                                                name="ServiceIndexing", daemon=True)
+        self.indexing_thread.start()
+        return {"running": True, "root": self.indexing_root}
+
+    def _index(self, root):
+        # searches keep being answered while the run commits its batches
+        try:
+            self.indexer.process_files(self.crawler.crawl(root), root=root)
+            if not self.indexer.cancelled and self.indexer.files_seen:
+                self.indexer.generate_report()
+        except Exception as e:
+            print(f"Indexing failed: {e}")
+            self.db.insert_log("ERROR", f"Indexing of {root} failed: {e}")
+        finally:
+            self.indexing_thread = None
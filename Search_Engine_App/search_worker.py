@@ -0,0 +1,60 @@
+import time
+
+from PyQt6.QtCore import QObject, QRunnable, pyqtSignal
+
+class SearchSignals(QObject):
+    rows_ready = pyqtSignal(int, list, dict, dict)  # query id, result rows, file_id -> snippet segments / page
+    finished = pyqtSignal(int, object, float, object)   # query id, next page cursor, seconds taken, match count
+    failed = pyqtSignal(int, str)
+
+class SearchTask(QRunnable):
+    # One page of a search, run on a QThreadPool thread so typing never blocks the GUI.
+    # Rows are emitted in small chunks as their snippets are ready. A cancelled task stops
+    # at the next stage boundary; the GUI also drops anything arriving for an old query id.
+    STREAM_CHUNK = 10
+
+    def __init__(self, db_adapter, query_id, path_terms, content_terms, limit, cursor=None, filters=None,
+                 count_matches=False):
+        super().__init__()
+        # the GUI keeps a reference to cancel it, Qt must not delete it after run()
+        self.setAutoDelete(False)
+        self.db = db_adapter
+        self.query_id = query_id
+        self.path_terms = path_terms
+        self.content_terms = content_terms
+        self.limit = limit
+        self.cursor = cursor
+        self.filters = filters
+        self.count_matches = count_matches  # also count every match (for the search history), first page only
+        self.cancelled = False
+        self.signals = SearchSignals()
+
+    def cancel(self):
+        self.cancelled = True
+
+    def run(self):
+        start_time = time.perf_counter()
+        try:
+            if self.cancelled:
+                return
+            rows, next_cursor = self.db.search_files_page(path_terms=self.path_terms,
+                                                          content_terms=self.content_terms,
+                                                          limit=self.limit, cursor=self.cursor,
+                                                          filters=self.filters)
+            for start in range(0, len(rows), self.STREAM_CHUNK):
+                if self.cancelled:
+                    return
+                chunk = list(rows[start:start + self.STREAM_CHUNK])
+                snippets, pages = self.db.get_snippets([row.id for row in chunk], self.content_terms, with_pages=True)
+                self.signals.rows_ready.emit(self.query_id, chunk, snippets, pages)
+            if not self.cancelled:
+                elapsed = time.perf_counter() - start_time
+                count = None
+                if self.count_matches and self.cursor is None:
+                    # a first page without a next one holds every match already
+                    count = len(rows) if next_cursor is None else self.db.count_files(
+                        self.path_terms, self.content_terms, self.filters)
+                self.signals.finished.emit(self.query_id, next_cursor, elapsed, count)
+        except Exception as e:
+            print(f"Search failed: {e}")
+            self.signals.failed.emit(self.query_id, str(e))
@@ -0,0 +1,58 @@
+from tokenizer import TOKEN_PATTERN
+
+SNIPPET_WINDOW = 240  # characters shown around the best matching area
+
+def best_window(hits, window=SNIPPET_WINDOW):
+    # hits: sorted (offset, query_token_index). Returns the start offset of the window
+    # covering the most distinct query tokens, then the most hits. O(len(hits)).
+    if not hits:
+        return 0
+    best_score, best_start = None, hits[0][0]
+    counts = {}
+    left = 0
+    for right, (offset, token_index) in enumerate(hits):
+        counts[token_index] = counts.get(token_index, 0) + 1
+        while offset - hits[left][0] > window:
+            left_token = hits[left][1]
+            counts[left_token] -= 1
+            if counts[left_token] == 0:
+                del counts[left_token]
+            left += 1
+        score = (len(counts), right - left + 1)
+        if best_score is None or score > best_score:
+            best_score, best_start = score, hits[left][0]
+    return best_start
+
+def trim_to_words(text, at_start, at_end):
+    # cut partial words at the fragment edges and mark the cuts
+    if not at_start:
+        space = text.find(" ")
+        if 0 <= space < 30:
+            text = text[space + 1:]
+        text = "..." + text
+    if not at_end:
+        space = text.rfind(" ")
+        if space > len(text) - 30:
+            text = text[:space]
+        text += "..."
+    return text
+
+def highlight(text, tokens):
+    # split text into (segment, is_match) where words starting with a query token are matches
+    segments = []
+    position = 0
+    for match in TOKEN_PATTERN.finditer(text):
+        word = match.group().lower()
+        if any(word.startswith(token) for token in tokens):
+            if match.start() > position:
+                segments.append((text[position:match.start()], False))
+            segments.append((match.group(), True))
+            position = match.end()
+    if position < len(text):
+        segments.append((text[position:], False))
+    return segments
+
+def format_snippet(segments, before="[", after="]", escape=None):
+    # render highlight() segments, e.g. before="<b>", after="</b>", escape=html.escape for rich text
+    escape = escape or (lambda value: value)
+    return "".join(f"{before}{escape(text)}{after}" if is_match else escape(text) for text, is_match in segments)
@@ -0,0 +1,46 @@
+import os
+import tempfile
+import unittest
+
+from benchmark_suite import generate_corpus, run_suite, check_thresholds, compare_to_baseline
+
+class TestBenchmarkSuite(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def corpus(self, name):
+        root = os.path.join(self.tmp.name, name)
+        corpus, vocabulary = generate_corpus(root, 12, 50, vocabulary_size=200, pdf_ratio=0.25, image_ratio=0.0,
+                                             depth=3)
+        files = {}
+        for directory, _, names in os.walk(root):
+            for file_name in names:
+                path = os.path.join(directory, file_name)
+                files[os.path.relpath(path, root)] = os.path.getmtime(path)
+        return root, corpus, vocabulary, files
+
+    def test_1_corpus_is_deterministic(self):
+        _, first, _, first_files = self.corpus("a")
+        _, second, _, second_files = self.corpus("b")
+        self.assertEqual(first_files, second_files)
+        self.assertEqual(first["by_type"], second["by_type"])
+        self.assertEqual(len(first_files), 12)
+
+    def test_2_suite_and_regression_checks(self):
+        root, corpus, vocabulary, _ = self.corpus("a")
+        results = run_suite(root, "sqlite:///" + os.path.join(self.tmp.name, "bench.db"), corpus, vocabulary,
+                            repeat=3)
+        self.assertEqual(results["index"]["errors"], 0)
+        latency = results["search"]["all"]
+        self.assertLessEqual(latency["p50_ms"], latency["p99_ms"])
+        self.assertEqual(check_thresholds(results, {"search.all.p50_ms": {"max": 10 ** 6}}), [])
+        self.assertEqual(len(check_thresholds(results, {"index.files_per_sec": {"min": 10 ** 9}})), 1)
+        slower = {"search": {"all": {"p95_ms": latency["p95_ms"] / 2, "queries_per_sec": 10 ** 9}}}
+        self.assertEqual(len(compare_to_baseline(results, slower, 0.25)), 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import csv
+import os
+import tempfile
+import time
+import unittest
+from datetime import datetime
+
+from config import Config
+from database import DatabaseAdapter, DeletedFile
+from export_logs import export_logs_to_txt, export_index_report
+
+class TestExportLogs(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.config = Config("config.json")
+        self.config.report_format = "csv"
+        self.db = DatabaseAdapter("sqlite:///" + os.path.join(self.tmp.name, "index.db"), self.config)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_1_log_delta_appends(self):
+        filename = os.path.join(self.tmp.name, "logs.txt")
+        self.db.insert_logs([(datetime.now(), "INFO", f"line {i}") for i in range(5)])
+        export_logs_to_txt(self.db, filename, delta=True, chunk_size=2)
+        self.db.insert_log("INFO", "line 5")
+        export_logs_to_txt(self.db, filename, delta=True, chunk_size=2)
+        with open(filename, encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        self.assertEqual([line.split("] ", 1)[1] for line in lines], [f"line {i}" for i in range(6)])
+
+    def test_2_report_delta(self):
+        report = os.path.join(self.tmp.name, "report")
+        for name in ["a.txt", "b.txt"]:
+            self.db.insert_or_update_file(f"/docs/{name}", name, 1, ".txt", "x", 1.0)
+        export_index_report(self.db, self.config, report, delta=True, chunk_size=1)
+        time.sleep(0.01)
+        self.db.insert_or_update_file("/docs/b.txt", "b.txt", 2, ".txt", "y", 2.0)
+
+        export_index_report(self.db, self.config, report, delta=True)
+        with open(report + ".csv", encoding="utf-8") as f:
+            self.assertEqual([row["file_name"] for row in csv.DictReader(f)], ["a.txt", "b.txt"])
+        with open(report + "_delta.csv", encoding="utf-8") as f:
+            self.assertEqual([row["file_size"] for row in csv.DictReader(f)], ["2"])
+
+    def test_3_report_delta_lists_deletions(self):
+        report = os.path.join(self.tmp.name, "report")
+        for name in ["a.txt", "b.txt", "c.txt", "d.txt"]:
+            self.db.insert_or_update_file(f"/docs/{name}", name, 1, ".txt", "x", 1.0)
+        export_index_report(self.db, self.config, report, delta=True)
+        time.sleep(0.01)
+        self.db.delete_files(["/docs/b.txt"])
+        self.db.rename_file("/docs/c.txt", "/docs/e.txt")
+        self.db.delete_files(["/docs/d.txt"])
+        self.db.insert_or_update_file("/docs/d.txt", "d.txt", 3, ".txt", "z", 3.0)  # deleted, then back
+
+        export_index_report(self.db, self.config, report, delta=True)
+        with open(report + "_delta.csv", encoding="utf-8") as f:
+            rows = [(row["file_path"], row["change"]) for row in csv.DictReader(f)]
+        self.assertEqual(rows, [("/docs/d.txt", "updated"), ("/docs/e.txt", "updated"),
+                                ("/docs/b.txt", "deleted"), ("/docs/c.txt", "deleted")])
+        # every export has seen these deletions now
+        session = self.db.Session()
+        self.assertEqual(session.query(DeletedFile).count(), 0)
+        session.close()
+
+if __name__ == '__main__':
+    unittest.main()
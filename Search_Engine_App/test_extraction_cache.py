@@ -0,0 +1,80 @@
+import os
+import tempfile
+import unittest
+
+from extraction_cache import ExtractionCache
+from textextractor import TXT_CHUNK_CHARS, ExtractionError, TextExtractor
+from tokenizer import PAGE_BREAK
+
+class CountingExtractor(TextExtractor):
+    def __init__(self, cache):
+        super().__init__(cache)
+        self.calls = 0
+
+    def _extract_txt(self, file_path):
+        self.calls += 1
+        return super()._extract_txt(file_path)
+
+class TestExtractionCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, name, text):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, "w") as f:
+            f.write(text)
+        return path
+
+    def test_1_identical_bytes_extracted_once(self):
+        cache = ExtractionCache(os.path.join(self.tmp.name, "cache.db"))
+        extractor = CountingExtractor(cache)
+        first = self.write("a.txt", "same bytes")
+        copy = self.write("b.txt", "same bytes")
+        self.assertEqual(extractor.extract_cached(first), ("same bytes", False))
+        self.assertEqual(extractor.extract_cached(copy), ("same bytes", True))
+        self.assertEqual(extractor.calls, 1)
+
+    def test_2_size_bounded_eviction(self):
+        cache = ExtractionCache(os.path.join(self.tmp.name, "cache.db"), max_bytes=300)
+        for i in range(20):
+            cache.put(f"k{i}", os.urandom(64).hex())
+        self.assertIsNone(cache.get("k0"))
+        self.assertIsNotNone(cache.get("k19"))
+        size, = cache._connection().execute("SELECT SUM(size) FROM cache").fetchone()
+        self.assertLessEqual(size, 300)
+
+    def test_3_max_chars_stops_reading(self):
+        path = self.write("big.txt", "x" * 3000)
+        extractor = TextExtractor(max_chars=1000)
+        # one character past the limit tells the indexer the text was cut
+        self.assertEqual(len(extractor.extract(path)), 1001)
+        pages = extractor.iter_pages(path)
+        self.assertEqual(len(next(pages)), 1001)
+        self.assertIsNone(next(pages, None))
+        self.assertEqual(len(TextExtractor(max_chars=3000).extract(path)), 3000)
+
+    def test_4_failures_are_raised_not_cached(self):
+        cache = ExtractionCache(os.path.join(self.tmp.name, "cache.db"))
+        path = self.write("broken.pdf", "not a pdf")
+        with self.assertRaises(ExtractionError):
+            TextExtractor(cache).extract_cached(path)
+        count, = cache._connection().execute("SELECT COUNT(*) FROM cache").fetchone()
+        self.assertEqual(count, 0)
+
+    def test_5_text_files_are_paged_by_size(self):
+        line = "y" * 99 + "\n"
+        path = self.write("log.txt", "a\fb\n" + line * (3 * TXT_CHUNK_CHARS // len(line)))
+        text = TextExtractor().extract(path)
+        pages = text.split(PAGE_BREAK)
+        # the form feed is text, the pages come from the size and end at line breaks
+        self.assertTrue(pages[0].startswith("a\nb\n"))
+        self.assertEqual(len(pages), 3)
+        self.assertTrue(all(page.endswith("\n") and len(page) <= 2 * TXT_CHUNK_CHARS for page in pages))
+        self.assertEqual(len(text) - len(pages) + 1, 4 + len(line) * (3 * TXT_CHUNK_CHARS // len(line)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import os
+import time
+import unittest
+
+from extraction_pool import ExtractionPool
+from textextractor import TextExtractor
+
+class ScriptedExtractor(TextExtractor):
+    # no files involved: the name says what the worker does
+    def extract_cached(self, file_path):
+        if file_path.startswith("hang"):
+            time.sleep(60)
+        if file_path.startswith("crash"):
+            os._exit(1)
+        if file_path.startswith("fail"):
+            raise ValueError(f"cannot read {file_path}")
+        return f"text of {file_path}", False
+
+class TestExtractionPool(unittest.TestCase):
+
+    def extract(self, file_paths, workers=2, timeout=2):
+        with ExtractionPool(ScriptedExtractor(), workers, timeout=timeout) as pool:
+            return {path: (content, error) for path, content, error, _ in pool.extract(file_paths)}
+
+    def test_1_every_file_comes_back(self):
+        paths = [f"doc{i}.txt" for i in range(20)]
+        results = self.extract(paths, workers=3)
+        self.assertEqual(sorted(results), sorted(paths))
+        self.assertEqual(results["doc7.txt"], (("text of doc7.txt", False), None))
+
+    def test_2_timeout_restarts_workers(self):
+        paths = ["hang.txt"] + [f"doc{i}.txt" for i in range(6)]
+        start = time.monotonic()
+        results = self.extract(paths)
+        self.assertLess(time.monotonic() - start, 30)
+        content, error = results["hang.txt"]
+        self.assertIsNone(content)
+        self.assertIsInstance(error, TimeoutError)
+        # files in flight when the pool was replaced are submitted again and still succeed
+        self.assertTrue(all(results[f"doc{i}.txt"][1] is None for i in range(6)))
+
+    def test_3_errors_and_crashes_are_reported(self):
+        results = self.extract(["fail.txt", "crash.txt", "doc.txt"])
+        self.assertIsInstance(results["fail.txt"][1], ValueError)
+        self.assertIsNone(results["crash.txt"][0])
+        self.assertIsInstance(results["crash.txt"][1], TimeoutError)
+        self.assertEqual(results["doc.txt"], (("text of doc.txt", False), None))
+
+if __name__ == '__main__':
+    unittest.main()
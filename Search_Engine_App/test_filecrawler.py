@@ -0,0 +1,36 @@
+import os
+import tempfile
+import unittest
+
+from filecrawler import FileCrawler
+
+class TestFileCrawler(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = self.tmp.name
+        for rel in ["a.txt", "b.PDF", "c.log", "sub/d.txt", "sub/deep/e.txt",
+                    ".git/config.txt", "sub/__pycache__/f.txt", "sub/skip.tmp.txt"]:
+            path = os.path.join(root, rel)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w") as f:
+                f.write("hello")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_1_filters_and_stat(self):
+        crawler = FileCrawler([".git", "__pycache__", ".tmp.txt"], [".txt", ".pdf"])
+        entries = list(crawler.crawl(self.tmp.name))
+        names = sorted(os.path.relpath(e.path, self.tmp.name) for e in entries)
+        print("Test 1:\n", names)
+        self.assertEqual(names, ["a.txt", "b.PDF", os.path.join("sub", "d.txt"),
+                                 os.path.join("sub", "deep", "e.txt")])
+        self.assertTrue(all(e.size == 5 and e.last_modified > 0 for e in entries))
+
+    def test_2_is_streamed(self):
+        crawl = FileCrawler([], [".txt"]).crawl(self.tmp.name)
+        self.assertTrue(os.path.exists(next(crawl).path))
+
+if __name__ == '__main__':
+    unittest.main()
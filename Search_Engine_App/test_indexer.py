@@ -0,0 +1,224 @@
+import os
+import tempfile
+import unittest
+
+from config import Config
+from database import DatabaseAdapter, LogEntry
+from filecrawler import FileCrawler
+from indexer import Indexer
+from textextractor import ExtractionError, TextExtractor
+
+class CancellingExtractor:
+    # cancels the indexer once it has extracted `after` files
+    def __init__(self, after):
+        self.after = after
+        self.indexer = None
+
+    def extract_cached(self, file_path):
+        self.after -= 1
+        if self.after == 0:
+            self.indexer.cancel()
+        return "some text", False
+
+class InterruptingExtractor:
+    # Ctrl+C while the `after`-th file is extracted
+    def __init__(self, after):
+        self.after = after
+
+    def extract_cached(self, file_path):
+        self.after -= 1
+        if self.after == 0:
+            raise KeyboardInterrupt
+        return "some text", False
+
+class OcrExtractor:
+    # images named slow* time out in the OCR lane
+    def extract_cached(self, file_path):
+        name = os.path.basename(file_path)
+        if name.startswith("slow"):
+            raise TimeoutError("OCR did not finish")
+        return f"text of {name}", False
+
+class FlakyExtractor:
+    # files named bad* fail until `fixed` is set
+    def __init__(self):
+        self.fixed = False
+
+    def extract_cached(self, file_path):
+        name = os.path.basename(file_path)
+        if name.startswith("bad") and not self.fixed:
+            raise ExtractionError("damaged file")
+        return f"text of {name}", False
+
+class TestIndexer(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.files = os.path.join(self.tmp.name, "files")
+        os.makedirs(self.files)
+        for i in range(10):
+            with open(os.path.join(self.files, f"f{i}.txt"), "w") as f:
+                f.write("hello")
+        self.config = Config("config.json")
+        self.config.config.update({"index_workers": 1, "write_batch_size": 2})
+        # a file database: the log sink writes from its own thread
+        self.db = DatabaseAdapter("sqlite:///" + os.path.join(self.tmp.name, "index.db"), self.config)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_1_cancel_keeps_committed_batches(self):
+        crawler = FileCrawler([], [".txt"])
+        Indexer(self.db, CancellingExtractor(100), self.config).process_files(crawler.crawl(self.files))
+        self.assertEqual(len(self.db.get_file_states(self.files)), 10)
+
+        for i in range(10):
+            os.utime(os.path.join(self.files, f"f{i}.txt"), (1, 1))
+        extractor = CancellingExtractor(3)
+        indexer = Indexer(self.db, extractor, self.config)
+        extractor.indexer = indexer
+        progress = []
+        indexer.progress_callback = progress.append
+        indexer.process_files(sorted(crawler.crawl(self.files)), root=self.files, total=10)
+        self.assertTrue(indexer.cancelled)
+        self.assertEqual((indexer.files_seen, indexer.processed_files), (3, 3))
+        # a partial crawl must not remove the files it did not reach
+        self.assertEqual(indexer.change_counts["deleted"], 0)
+        self.assertEqual(len(self.db.get_file_states(self.files)), 10)
+        self.assertFalse(indexer.cancel_event.is_set())
+        self.assertEqual(progress[-1]["total"], 10)
+
+    def test_2_per_run_statistics_and_logs(self):
+        crawler = FileCrawler([], [".txt"])
+        indexer = Indexer(self.db, CancellingExtractor(100), self.config)
+        indexer.process_files(crawler.crawl(self.files), root=self.files)
+        self.assertEqual(indexer.processed_files, 10)
+        indexer.process_files(crawler.crawl(self.files), root=self.files)
+        # the second run starts from zero and unchanged files are only counted
+        self.assertEqual((indexer.processed_files, indexer.change_counts["unchanged"]), (0, 10))
+        indexer.close()
+        session = self.db.Session()
+        logged = session.query(LogEntry).count()
+        session.close()
+        self.assertEqual(logged, 10)
+
+    def test_3_ocr_lane(self):
+        for name in ["scan.png", "slow.png"]:
+            with open(os.path.join(self.files, name), "wb") as f:
+                f.write(b"not really an image")
+        self.config.config["ocr"] = {"workers": 1, "nice": 0, "timeout": 5}
+        indexer = Indexer(self.db, OcrExtractor(), self.config)
+        indexer.process_files(FileCrawler([], [".txt", ".png"]).crawl(self.files), root=self.files)
+        self.assertEqual((indexer.processed_files, indexer.errors), (11, 1))
+        names = [row.file_name for row in self.db.search_files(content_terms=["text", "png"])]
+        self.assertEqual(names, ["scan.png"])
+        self.assertEqual(indexer.change_counts["failed"], 1)
+        # a timed out image is still found by name, and OCR'd again once it changes
+        self.assertEqual([row.file_name for row in self.db.search_files(content_terms=["slow"])], ["slow.png"])
+        states = self.db.get_file_states(self.files)
+        self.assertEqual(states[os.path.join(self.files, "slow.png")][2:], (False, True))
+        self.assertEqual(states[os.path.join(self.files, "scan.png")][2:], (False, False))
+        indexer.close()
+
+    def test_4_change_counts(self):
+        crawler = FileCrawler([], [".txt"])
+        indexer = Indexer(self.db, CancellingExtractor(100), self.config)
+        indexer.process_files(crawler.crawl(self.files), root=self.files)
+        self.assertEqual(indexer.change_counts, {"new": 10, "changed": 0, "unchanged": 0, "failed": 0, "deleted": 0})
+
+        os.utime(os.path.join(self.files, "f0.txt"), (1, 1))
+        with open(os.path.join(self.files, "f1.txt"), "a") as f:
+            f.write(" and more")   # same mtime second is possible, the size still differs
+        os.remove(os.path.join(self.files, "f2.txt"))
+        with open(os.path.join(self.files, "new.txt"), "w") as f:
+            f.write("hello")
+        indexer.process_files(crawler.crawl(self.files), root=self.files)
+        self.assertEqual(indexer.change_counts, {"new": 1, "changed": 2, "unchanged": 7, "failed": 0, "deleted": 1})
+        self.assertNotIn(os.path.join(self.files, "f2.txt"), self.db.get_file_states(self.files))
+
+        indexer.process_files(crawler.crawl(self.files), root=self.files)
+        self.assertEqual(indexer.change_counts, {"new": 0, "changed": 0, "unchanged": 10, "failed": 0, "deleted": 0})
+        indexer.close()
+
+    def test_5_failed_extraction_is_retried_once_changed(self):
+        bad = os.path.join(self.files, "bad.txt")
+        with open(bad, "w") as f:
+            f.write("hello")
+        extractor = FlakyExtractor()
+        indexer = Indexer(self.db, extractor, self.config)
+        crawler = FileCrawler([], [".txt"])
+        indexer.process_files(crawler.crawl(self.files), root=self.files)
+        self.assertEqual((indexer.processed_files, indexer.errors), (10, 1))
+        self.assertEqual((indexer.change_counts["new"], indexer.change_counts["failed"]), (10, 1))
+        # found by name meanwhile, and marked as failed
+        self.assertEqual([row.file_name for row in self.db.search_files(content_terms=["bad"])], ["bad.txt"])
+        self.assertTrue(self.db.get_file_states(self.files)[bad][3])
+
+        # unchanged: not extracted again, so no new error either
+        indexer.process_files(crawler.crawl(self.files), root=self.files)
+        self.assertEqual((indexer.processed_files, indexer.errors), (0, 0))
+        self.assertEqual((indexer.change_counts["unchanged"], indexer.change_counts["failed"]), (10, 1))
+
+        extractor.fixed = True
+        with open(bad, "a") as f:
+            f.write(" again")
+        indexer.process_files(crawler.crawl(self.files), root=self.files)
+        self.assertEqual((indexer.processed_files, indexer.change_counts["changed"]), (1, 1))
+        self.assertEqual([row.file_name for row in self.db.search_files(content_terms=["text", "bad"])], ["bad.txt"])
+        self.assertFalse(self.db.get_file_states(self.files)[bad][3])
+        indexer.close()
+
+    def test_6_process_file_runs_ocr(self):
+        image = os.path.join(self.files, "scan.png")
+        with open(image, "wb") as f:
+            f.write(b"not really an image")
+        self.config.config["ocr"] = {"workers": 1, "nice": 0, "timeout": 5}
+        indexer = Indexer(self.db, OcrExtractor(), self.config)
+        indexer.process_file(image)
+        self.assertEqual(indexer.ocr_jobs, {})
+        self.assertEqual([row.file_name for row in self.db.search_files(content_terms=["text", "scan"])],
+                         ["scan.png"])
+        self.assertFalse(self.db.get_file_states(self.files)[image][2])
+        indexer.close()
+
+    def test_7_interrupt_commits_pending_files(self):
+        self.config.config["write_batch_size"] = 100
+        indexer = Indexer(self.db, InterruptingExtractor(6), self.config)
+        with self.assertRaises(KeyboardInterrupt):
+            indexer.process_files(FileCrawler([], [".txt"]).crawl(self.files), root=self.files)
+        self.assertEqual(len(self.db.get_file_states(self.files)), 5)
+        self.assertEqual(indexer.pending, [])
+        indexer.close()
+
+    def test_8_skipped_files_are_not_deleted(self):
+        indexer = Indexer(self.db, CancellingExtractor(100), self.config)
+        indexer.process_files(FileCrawler([], [".txt"]).crawl(self.files), root=self.files)
+        os.remove(os.path.join(self.files, "f2.txt"))
+        # one run with an extra ignore pattern skips f1.txt without it being gone
+        indexer.process_files(FileCrawler(["f1.txt"], [".txt"]).crawl(self.files), root=self.files)
+        self.assertEqual(indexer.change_counts["deleted"], 1)
+        states = self.db.get_file_states(self.files)
+        self.assertIn(os.path.join(self.files, "f1.txt"), states)
+        self.assertNotIn(os.path.join(self.files, "f2.txt"), states)
+        self.assertEqual(len(states), 9)
+        indexer.close()
+
+    def test_9_truncation_is_logged_only_when_text_was_cut(self):
+        for name, text in [("exact.txt", "abcd efghi"), ("long.txt", "abcd efghi jkl")]:
+            with open(os.path.join(self.files, name), "w") as f:
+                f.write(text)
+        indexer = Indexer(self.db, TextExtractor(max_chars=10), self.config)
+        indexer.max_indexed_chars = 10
+        indexer.process_files(FileCrawler([], [".txt"]).crawl(self.files), root=self.files)
+        indexer.close()
+        session = self.db.Session()
+        logged = [message for (message,) in
+                  session.query(LogEntry.message).filter(LogEntry.message.startswith("Indexed only"))]
+        session.close()
+        self.assertEqual(logged, [f"Indexed only the first 10 characters of {os.path.join(self.files, 'long.txt')}"])
+        self.assertEqual(sorted(row.file_name for row in self.db.search_files(content_terms=["efghi"])),
+                         ["exact.txt", "long.txt"])
+        self.assertEqual(self.db.search_files(content_terms=["jkl"]), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,193 @@
+import os
+import tempfile
+import unittest
+
+from sqlalchemy import insert
+
+from config import Config
+from database import DatabaseAdapter, IndexTerm
+from query_parser import parse_query
+from snippets import format_snippet
+from tokenizer import tokenize, term_frequencies, term_offsets
+
+class TestInvertedIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.db = DatabaseAdapter("sqlite://", Config("config.json"))
+
+    def add_file(self, path, content, last_modified):
+        name = path.rsplit("/", 1)[-1]
+        self.db.insert_or_update_file(path, name, len(content), ".txt", content, last_modified,
+                                      terms=term_frequencies(name, content))
+
+    def names(self, **kwargs):
+        return [r.file_name for r in self.db.search_files(**kwargs)]
+
+    def test_1_tokenize(self):
+        self.assertEqual(tokenize("Buna ziua, Lume! foo_bar 42"), ["buna", "ziua", "lume", "foo_bar", "42"])
+        self.assertEqual(term_frequencies("a.txt", "A b a")["a"], 3)
+
+    def test_2_prefix_and_all_terms(self):
+        self.add_file("/docs/one.txt", "the quick brown fox", 1.0)
+        self.add_file("/docs/two.txt", "quicksort is quick", 1.0)
+        self.assertEqual(sorted(self.names(content_terms=["quick"])), ["one.txt", "two.txt"])
+        self.assertEqual(self.names(content_terms=["quick", "fox"]), ["one.txt"])
+        self.assertEqual(self.names(content_terms=["missing"]), [])
+        # file name and extension are indexed too
+        self.assertEqual(self.names(content_terms=["two"]), ["two.txt"])
+
+    def test_3_update_replaces_postings(self):
+        self.add_file("/docs/one.txt", "old words here", 1.0)
+        self.add_file("/docs/one.txt", "new text only", 2.0)
+        self.assertEqual(self.names(content_terms=["old"]), [])
+        self.assertEqual(self.names(content_terms=["new"]), ["one.txt"])
+
+    def test_4_bulk_upsert(self):
+        def doc(path, content, last_modified):
+            return {"file_path": path, "file_name": path.rsplit("/", 1)[-1], "file_size": len(content),
+                    "extension": ".txt", "last_modified": last_modified, "content": content,
+                    "terms": term_frequencies(content)}
+        self.db.bulk_upsert_files([doc("/a.txt", "red green", 1.0), doc("/b.txt", "red", 1.0)])
+        self.db.bulk_upsert_files([doc("/a.txt", "blue", 2.0), doc("/c.txt", "red blue", 1.0)])
+        self.assertEqual(sorted(self.names(content_terms=["red"])), ["b.txt", "c.txt"])
+        self.assertEqual(self.names(content_terms=["green"]), [])
+        session = self.db.Session()
+        doc_freq = dict(session.query(IndexTerm.term, IndexTerm.doc_freq))
+        session.close()
+        self.assertEqual((doc_freq["red"], doc_freq["blue"], doc_freq["green"]), (2, 2, 0))
+
+    def test_5_snippets_use_stored_offsets(self):
+        text = "filler words " * 500 + "the quick brown fox" + " more filler" * 500
+        self.db.bulk_upsert_files([{"file_path": "/big.txt", "file_name": "big.txt", "file_size": len(text),
+                                    "extension": ".txt", "last_modified": 1.0, "content": text,
+                                    "terms": term_frequencies("big.txt", text), "offsets": term_offsets(text)}])
+        file_id = self.db.search_files(content_terms=["fox"])[0].id
+        snippet = format_snippet(self.db.get_snippets([file_id], ["fox", "qui"])[file_id])
+        print("Test 5:\n", snippet)
+        self.assertIn("[quick] brown [fox]", snippet)
+        self.assertLess(len(snippet), 300)
+
+    def test_6_result_cache(self):
+        self.add_file("/docs/one.txt", "quick fox", 1.0)
+        self.add_file("/docs/two.txt", "quicksort", 1.0)
+        first = self.db.search_files(content_terms=["qui"])
+        self.assertIs(self.db.search_files(content_terms=["qui"]), first)
+        # a longer prefix is answered from the cached superset
+        self.assertEqual(self.names(content_terms=["quicks"]), ["two.txt"])
+        self.assertEqual(self.names(path_terms=["one"], content_terms=["qui"]), ["one.txt"])
+        self.add_file("/docs/three.txt", "quiet", 1.0)
+        self.assertEqual(len(self.db.search_files(content_terms=["qui"])), 2)
+        self.db.bump_index_generation()
+        self.assertEqual(len(self.db.search_files(content_terms=["qui"])), 3)
+
+    def test_7_filters(self):
+        self.add_file("/docs/small.txt", "report", 100.0)
+        self.db.insert_or_update_file("/docs/big.PDF", "big.PDF", 5 * 1024 * 1024, ".PDF", "report", 200.0,
+                                      terms=term_frequencies("big.PDF", "report"))
+        _, content_terms, filters = parse_query("report ext:pdf", with_filters=True)
+        self.assertEqual(self.names(content_terms=content_terms, filters=filters), ["big.PDF"])
+        _, content_terms, filters = parse_query("report size:<1MB", with_filters=True)
+        self.assertEqual(self.names(content_terms=content_terms, filters=filters), ["small.txt"])
+        self.assertEqual(self.names(filters=(("last_modified", ">", 150.0),)), ["big.PDF"])
+
+    def test_8_path_trigram_index(self):
+        self.add_file("/Home/Docs/report.txt", "a", 1.0)
+        self.add_file("/srv/data/b.txt", "b", 1.0)
+        self.assertEqual(self.names(path_terms=["docs"]), ["report.txt"])
+        self.assertEqual(sorted(self.names(path_terms=["docs", "a/"])), ["b.txt", "report.txt"])
+        # renames reach the trigram index through its triggers
+        self.db.rename_file("/srv/data/b.txt", "/srv/other/b.txt")
+        self.db.bump_index_generation()
+        self.assertEqual(self.names(path_terms=["data"]), [])
+        self.assertEqual(self.names(path_terms=["other"]), ["b.txt"])
+
+    def test_9_search_history(self):
+        for query, count in [("Quick Fox", 2), ("lazy", 0), ("quick   fox", 1)]:
+            self.db.insert_search_query(query, result_count=count, latency_ms=3.0)
+        self.assertEqual(self.db.fetch_recent_queries(limit=5), [("quick   fox", 1), ("lazy", 0)])
+        self.assertEqual(self.db.fetch_popular_queries(limit=1), [("quick   fox", 2)])
+
+    def test_10_compressed_content(self):
+        text = "filler words " * 500 + "ünïcode end"
+        self.add_file("/docs/long.txt", text, 1.0)
+        self.add_file("/docs/short.txt", "tiny", 1.0)
+        file_id = self.db.search_files(content_terms=["ünïcode"])[0].id
+        self.assertEqual(self.db.get_file_content(file_id), text)
+        raw, stored = self.db.get_storage_stats()
+        self.assertEqual(raw, len(text.encode("utf-8")) + 4)
+        self.assertLess(stored, raw / 10)
+
+    def test_11_hit_pages(self):
+        text = "\f".join(["intro page", "filler " * 100, "the needle is here", "more filler"])
+        self.db.bulk_upsert_files([{"file_path": "/book.pdf", "file_name": "book.pdf", "file_size": len(text),
+                                    "extension": ".pdf", "last_modified": 1.0, "content": text,
+                                    "terms": term_frequencies("book.pdf", text), "offsets": term_offsets(text)}])
+        file_id = self.db.search_files(content_terms=["needle"])[0].id
+        snippets, pages = self.db.get_snippets([file_id], ["needle"], with_pages=True)
+        self.assertEqual(pages, {file_id: 3})
+        self.assertNotIn("\f", format_snippet(snippets[file_id]))
+
+    def test_12_count_files(self):
+        for i in range(4):
+            self.add_file(f"/docs/{i}.txt", "quick fox" if i else "slow fox", 1.0)
+        rows, _ = self.db.search_files_page(content_terms=["fox"], limit=1)
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(self.db.count_files(content_terms=["fox"]), 4)
+        self.assertEqual(self.db.count_files(path_terms=["docs"], content_terms=["quick"]), 3)
+
+    def test_13_narrowed_cache_results(self):
+        for path in ["/alpha/a.txt", "/beta/b.txt", "/gamma/c.txt"]:
+            self.add_file(path, "hello world", 1.0)
+        first = sorted(self.names(path_terms=["alpha", "beta"], content_terms=["hello"]))
+        self.assertEqual(first, ["a.txt", "b.txt"])
+        # same query with another limit: answered from the cached result, both path terms kept
+        self.assertEqual(sorted(self.names(path_terms=["alpha", "beta"], content_terms=["hello"], limit=10)), first)
+        self.assertEqual(sorted(self.names(path_terms=["beta", "alpha"], content_terms=["hello"], limit=5)), first)
+        # a complete cached superset is cut down to the new limit
+        self.assertEqual(len(self.db.search_files(content_terms=["hello"])), 3)
+        self.assertEqual(len(self.db.search_files(content_terms=["hello"], limit=1)), 1)
+        self.assertEqual(len(self.db.search_files(content_terms=["hello"], limit=2)), 2)
+        rows, next_cursor = self.db.search_files_page(content_terms=["hello"], limit=10)
+        self.assertEqual((len(rows), next_cursor), (3, None))
+        rows, next_cursor = self.db.search_files_page(content_terms=["hello"], limit=2)
+        self.assertEqual(len(rows), 2)
+        self.assertIsNotNone(next_cursor)
+
+    def test_14_cache_sees_other_writers(self):
+        # a search service and an indexer in another process share only the database
+        with tempfile.TemporaryDirectory() as tmp:
+            url = "sqlite:///" + os.path.join(tmp, "index.db")
+            service, writer = DatabaseAdapter(url, Config("config.json")), DatabaseAdapter(url, Config("config.json"))
+            self.assertEqual(service.search_files(content_terms=["hello"]), [])
+            self.assertEqual(service.count_files(content_terms=["hello"]), 0)
+            writer.insert_or_update_file("/a.txt", "a.txt", 5, ".txt", "hello", 1.0,
+                                         terms=term_frequencies("a.txt", "hello"))
+            writer.bump_index_generation()
+            self.assertEqual([r.file_name for r in service.search_files(content_terms=["hello"])], ["a.txt"])
+            self.assertEqual(len(service.search_files_page(content_terms=["hello"])[0]), 1)
+            self.assertEqual(service.count_files(content_terms=["hello"]), 1)
+            self.assertEqual(service.index_generation, writer.index_generation)
+            service.engine.dispose()
+            writer.engine.dispose()
+
+    def test_15_bulk_upsert_without_native_upsert(self):
+        # dialects without ON CONFLICT take the row by row path
+        self.db._dialect_insert = insert
+        def doc(content, last_modified, **changes):
+            return dict({"file_path": "/a.txt", "file_name": "a.txt", "file_size": len(content), "extension": ".txt",
+                         "last_modified": last_modified, "content": content,
+                         "terms": term_frequencies("a.txt", content)}, **changes)
+        self.db.bulk_upsert_files([doc("new text", 2.0)])
+        # restored from a backup: older mtime, still rewritten like the native upsert does
+        self.db.bulk_upsert_files([doc("restored text", 1.0)])
+        self.db.bump_index_generation()
+        self.assertEqual(self.names(content_terms=["restored"]), ["a.txt"])
+        self.assertEqual(self.names(content_terms=["new"]), [])
+        # a failed batch reaches the caller and leaves nothing half written
+        with self.assertRaises(Exception):
+            self.db.bulk_upsert_files([doc("other", 3.0, file_path="/b.txt"), doc("broken", 3.0, file_name=None)])
+        self.db.bump_index_generation()
+        self.assertEqual(self.names(content_terms=["other"]), [])
+
+if __name__ == '__main__':
+    unittest.main()
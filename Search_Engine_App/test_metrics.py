@@ -0,0 +1,33 @@
+import unittest
+
+from metrics import MetricsRegistry, QUERIES, QUERY_RESULTS
+from search_observer import MetricsObserver
+
+class TestMetrics(unittest.TestCase):
+
+    def test_1_render(self):
+        registry = MetricsRegistry()
+        files = registry.counter("files_total", "Files")
+        seconds = registry.histogram("seconds", "Time", buckets=(0.1, 1.0))
+        files.inc(ext=".pdf")
+        files.inc(2, ext=".pdf")
+        seconds.observe(0.5)
+        seconds.observe(2.0)
+        text = registry.render()
+        self.assertIn('files_total{ext=".pdf"} 3', text)
+        self.assertIn('seconds_bucket{le="0.1"} 0', text)
+        self.assertIn('seconds_bucket{le="1.0"} 1', text)
+        self.assertIn('seconds_bucket{le="+Inf"} 2', text)
+        self.assertIn("seconds_sum 2.5", text)
+        self.assertIn("# TYPE seconds histogram", text)
+
+    def test_2_observer(self):
+        queries, (_, searches) = QUERIES.get(), QUERY_RESULTS.total()
+        total = QUERY_RESULTS.total()[0]
+        MetricsObserver().update("fox", [1, 2, 3], latency_ms=12.0, result_count=120)
+        self.assertEqual(QUERIES.get(), queries + 1)
+        # the full match count, not the rows of the first page
+        self.assertEqual(QUERY_RESULTS.total(), (total + 120, searches + 1))
+
+if __name__ == '__main__':
+    unittest.main()
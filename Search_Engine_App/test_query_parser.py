@@ -28,5 +28,17 @@ class TestQueryParser(unittest.TestCase):
         self.assertEqual(path_terms, expected)
         self.assertEqual(content_terms, [])
 
+    def test_4_filters(self):
+        query = "path:/docs ext:PDF,txt size:>1MB report size:1KB..2KB"
+        path_terms, content_terms, filters = parse_query(query, with_filters=True)
+        print("Test 4:\n", "Filters:", filters)
+        self.assertEqual(path_terms, ["/docs"])
+        self.assertEqual(content_terms, ["report"])
+        self.assertEqual(filters, (("extension", "in", (".pdf", ".txt")), ("file_size", ">", 1024 * 1024),
+                                   ("file_size", ">=", 1024), ("file_size", "<=", 2048)))
+        # a date-only value covers the whole day
+        _, _, filters = parse_query("modified:2026-01-01", with_filters=True)
+        self.assertEqual(filters[1][2] - filters[0][2], 24 * 3600)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
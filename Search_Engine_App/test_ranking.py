@@ -1,6 +1,8 @@
 import unittest
 
-from database import compute_lenght_score,compute_depth_score
+from config import Config
+from database import compute_lenght_score,compute_depth_score,DatabaseAdapter
+from tokenizer import term_frequencies
 
 class TestRanking(unittest.TestCase):
 
@@ -32,5 +34,72 @@ class TestRanking(unittest.TestCase):
         depth = compute_depth_score(path)
         print(f"Test 4:\nComputed score for relative path (no slash): {depth}")
         self.assertEqual(depth, 100.0)
+
+    def test_5_bm25_content_relevance(self):
+        config = Config("config.json")
+        config.ranking_method = "bm25"
+        db = DatabaseAdapter("sqlite://", config)
+        docs = {
+            "/docs/a/mention.txt": "apple " + "filler " * 60,
+            "/docs/about.txt": "apple apple apple apple banana",
+            "/docs/other.txt": "banana only",
+        }
+        for path, text in docs.items():
+            name = path.rsplit("/", 1)[-1]
+            db.insert_or_update_file(path, name, len(text), ".txt", text, 1.0, terms=term_frequencies(name, text))
+        results = db.search_files(content_terms=["apple"])
+        print(f"Test 5:\nBM25 ranking: {[(r.file_name, round(r.score, 2)) for r in results]}")
+        self.assertEqual([r.file_name for r in results], ["about.txt", "mention.txt"])
+        self.assertEqual(len(db.search_files(content_terms=["apple", "banana"], limit=1)), 1)
+
+    def test_6_collection_stats_cached(self):
+        config = Config("config.json")
+        config.ranking_method = "bm25"
+        db = DatabaseAdapter("sqlite://", config)
+        db.insert_or_update_file("/a.txt", "a.txt", 3, ".txt", "one two", 1.0, terms=term_frequencies("a.txt", "one two"))
+        db.search_files(content_terms=["one"])
+        self.assertEqual(db.collection_stats, (0, 1, 4.0))
+        db.collection_stats = (0, 99, 4.0)
+        session = db.Session()
+        self.assertEqual(db._collection_stats(session), (99, 4.0))   # no scan within a generation
+        db.bump_index_generation()
+        self.assertEqual(db._collection_stats(session), (1, 4.0))
+        session.close()
+        # a write invalidates the cached value even without a generation bump
+        db.insert_or_update_file("/b.txt", "b.txt", 3, ".txt", "one", 1.0, terms=term_frequencies("b.txt", "one"))
+        self.assertIsNone(db.collection_stats)
+
+    def test_7_fulltext_matches_names_and_content(self):
+        config = Config("config.json")
+        config.ranking_method = "fulltext"
+        db = DatabaseAdapter("sqlite://", config)
+        self.assertEqual(db.content_ranking, "fulltext")
+        docs = {
+            "/docs/invoice_2023.txt": "payment received",
+            "/docs/notes.md": "the invoice is late",
+            "/docs/report.pdf": "quarterly numbers",
+        }
+        for path, text in docs.items():
+            name = path.rsplit("/", 1)[-1]
+            db.insert_or_update_file(path, name, len(text), name[name.rindex("."):], text, 1.0,
+                                     terms=term_frequencies(name, text))
+
+        def names(*terms):
+            return sorted(r.file_name for r in db.search_files(content_terms=list(terms)))
+        # same matches as the postings: file name, extension and text, every token as a prefix
+        self.assertEqual(names("invoice"), ["invoice_2023.txt", "notes.md"])
+        self.assertEqual(names("txt"), ["invoice_2023.txt"])
+        self.assertEqual(names("invoice", "payment"), ["invoice_2023.txt"])
+        self.assertEqual(names("quart"), ["report.pdf"])
+        self.assertEqual(names("invoice", "quarterly"), [])
+        # the name part of the index follows renames and deletions
+        self.assertTrue(db.rename_file("/docs/report.pdf", "/docs/summary.pdf"))
+        db.bump_index_generation()
+        self.assertEqual(names("report"), [])
+        self.assertEqual(names("summary", "numbers"), ["summary.pdf"])
+        db.delete_files(["/docs/summary.pdf"])
+        db.bump_index_generation()
+        self.assertEqual(names("pdf"), [])
+        self.assertEqual(names("numbers"), [])
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
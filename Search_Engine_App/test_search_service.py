@@ -0,0 +1,70 @@
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import unittest
+
+from config import Config
+from database import DatabaseAdapter
+from load_test import fetch, run_load
+from search_service import SearchService
+from tokenizer import term_frequencies, term_offsets
+
+class TestSearchService(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        # a file database: every worker thread has its own pooled connection to it
+        self.db = DatabaseAdapter("sqlite:///" + os.path.join(self.tmp.name, "service.db"), Config("config.json"),
+                                  pool_size=6)
+        for i in range(30):
+            text = f"document {i} about {'foxes' if i % 3 == 0 else 'owls'}"
+            self.db.insert_or_update_file(f"/docs/{i}.txt", f"{i}.txt", len(text), ".txt", text, 1.0,
+                                          terms=term_frequencies(f"{i}.txt", text), offsets=term_offsets(text))
+        self.service = SearchService(self.db, workers=4, page_size=5)
+        self.loop = asyncio.new_event_loop()
+        self.port = self.loop.run_until_complete(self.service.start("127.0.0.1", 0))
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+
+    def tearDown(self):
+        asyncio.run_coroutine_threadsafe(self.service.stop(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        self.service.close()
+        self.db.engine.dispose()
+        self.tmp.cleanup()
+
+    def get(self, path):
+        async def request():
+            reader, writer = await asyncio.open_connection("127.0.0.1", self.port)
+            try:
+                return await fetch(reader, writer, "127.0.0.1", path)
+            finally:
+                writer.close()
+        status, body = asyncio.run(request())
+        return status, json.loads(body)
+
+    def test_1_search_pages(self):
+        status, page = self.get("/search?q=foxes")
+        self.assertEqual(status, 200)
+        self.assertEqual(len(page["results"]), 5)
+        self.assertEqual(page["total"], 10)
+        self.assertIn("[foxes]", page["results"][0]["snippet"])
+        _, rest = self.get(f"/search?q=foxes&limit=50&cursor={page['next_cursor']}")
+        self.assertEqual(len(rest["results"]), 5)
+        self.assertIsNone(rest["next_cursor"])
+        self.assertEqual(self.get("/search")[0], 400)
+        self.assertEqual(self.get("/missing")[0], 404)
+
+    def test_2_concurrent_load(self):
+        results = asyncio.run(run_load("127.0.0.1", self.port, ["foxes", "owls", "doc ext:txt"],
+                                       concurrency=16, requests=200))
+        print("Test 2:", results)
+        self.assertEqual(results["requests"], 200)
+        self.assertEqual(results["errors"], 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import os
+import tempfile
+import unittest
+
+from config import Config
+from database import DatabaseAdapter, IndexTerm
+from filecrawler import FileCrawler
+from indexer import Indexer
+from watcher import FileWatcher, PollingBackend
+
+class FileTextExtractor:
+    def extract_cached(self, file_path):
+        with open(file_path, encoding="utf-8") as f:
+            return f.read(), False
+
+class TestWatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = os.path.join(self.tmp.name, "root")
+        os.makedirs(os.path.join(self.root, "sub"))
+        self.config = Config("config.json")
+        self.config.config.update({"index_workers": 1})
+        self.db = DatabaseAdapter("sqlite:///" + os.path.join(self.tmp.name, "index.db"), self.config)
+        self.crawler = FileCrawler([], [".txt"])
+        self.indexer = Indexer(self.db, FileTextExtractor(), self.config)
+        # events are fed and flushed by hand, the watcher thread is never started
+        self.watcher = FileWatcher(self.indexer, self.crawler, [self.root])
+
+    def tearDown(self):
+        self.indexer.close()
+        self.db.engine.dispose()
+        self.tmp.cleanup()
+
+    def path(self, *parts):
+        return os.path.join(self.root, *parts)
+
+    def write(self, relative, text):
+        with open(self.path(relative), "w", encoding="utf-8") as f:
+            f.write(text)
+
+    def stored(self):
+        return sorted(os.path.relpath(path, self.root) for path in self.db.get_file_states(self.root))
+
+    def content_hits(self, token):
+        return sorted(os.path.relpath(row.file_path, self.root) for row in self.db.search_files(content_terms=[token]))
+
+    def test_1_polling_snapshot_diff(self):
+        self.write("a.txt", "a")
+        self.write("b.txt", "b")
+        backend = PollingBackend([self.root], self.crawler, poll_interval=0)
+        os.utime(self.path("a.txt"), (1, 1))
+        os.remove(self.path("b.txt"))
+        self.write("sub/c.txt", "c")
+        self.write("ignored.bin", "x")
+        events = sorted(backend.read_events(0))
+        self.assertEqual(events, [("delete", self.path("b.txt"), None), ("upsert", self.path("a.txt"), None),
+                                  ("upsert", self.path("sub", "c.txt"), None)])
+        self.assertEqual(backend.read_events(0), [])
+
+    def test_2_move_chain_is_one_rename(self):
+        self.write("a.txt", "alpha text")
+        self.indexer.process_files([self.path("a.txt")])
+        os.rename(self.path("a.txt"), self.path("c.txt"))
+        self.watcher._add_event("move", self.path("b.txt"), self.path("a.txt"))
+        self.watcher._add_event("move", self.path("c.txt"), self.path("b.txt"))
+        self.assertEqual(self.watcher.pending[self.path("c.txt")], ("move", self.path("a.txt")))
+        self.watcher.flush()
+        self.assertEqual(self.stored(), ["c.txt"])
+        self.assertEqual(self.content_hits("alpha"), ["c.txt"])
+
+    def test_3_delete_after_upsert_and_create_then_delete(self):
+        self.write("kept.txt", "old words")
+        self.indexer.process_files([self.path("kept.txt")])
+        # modified, then removed before the debounce expired
+        self.watcher._add_event("upsert", self.path("kept.txt"), None)
+        self.watcher._add_event("delete", self.path("kept.txt"), None)
+        # created and removed again: never indexed
+        self.watcher._add_event("upsert", self.path("temp.txt"), None)
+        self.watcher._add_event("delete", self.path("temp.txt"), None)
+        self.assertEqual(self.watcher.pending, {self.path("kept.txt"): ("delete", None),
+                                                self.path("temp.txt"): ("delete", None)})
+        self.watcher.flush()
+        self.assertEqual(self.stored(), [])
+        self.assertEqual(self.content_hits("old"), [])
+
+    def test_4_directory_rename_and_delete(self):
+        self.write("sub/x.txt", "needle")
+        self.indexer.process_files([self.path("sub", "x.txt")])
+        self.assertEqual(self.content_hits("needle"), ["sub/x.txt"])   # cached for this generation
+        generation = self.db.index_generation
+
+        os.rename(self.path("sub"), self.path("moved"))
+        self.watcher._add_event("move_tree", self.path("moved"), self.path("sub"))
+        self.watcher.flush()
+        self.assertGreater(self.db.index_generation, generation)
+        self.assertEqual(self.stored(), ["moved/x.txt"])
+        self.assertEqual(self.content_hits("needle"), ["moved/x.txt"])
+
+        self.watcher._add_event("delete_tree", self.path("moved"), None)
+        self.watcher.flush()
+        self.assertEqual(self.content_hits("needle"), [])
+        session = self.db.Session()
+        doc_freq = session.query(IndexTerm.doc_freq).filter(IndexTerm.term == "needle").scalar()
+        session.close()
+        self.assertEqual(doc_freq, 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,46 +1,131 @@
 # textextractor.py
 
+import math
 import os
 from PIL import Image
 import pytesseract
 import fitz
 
+from extraction_cache import ExtractionCache
+from tokenizer import PAGE_BREAK
+
+TXT_CHUNK_CHARS = 64 * 1024  # text files are read, and split into pages, this much at a time
+OCR_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp")
+
+class ExtractionError(Exception):
+    # the file could not be read; never cached, the indexer marks the file for another attempt
+    pass
+
 class TextExtractor:
+    # Bump when extraction output changes so cached texts of the old version are not reused
+    VERSION = "3"
+
+    def __init__(self, cache=None, max_chars=None, max_ocr_pixels=None, ocr_timeout=None):
+        # max_chars: extracted text kept per file, the rest of a larger file is not indexed. One
+        # character more is returned when the text goes on, so the caller can tell it was cut.
+        # max_ocr_pixels: larger images are scaled down before OCR
+        # ocr_timeout: seconds Tesseract may spend on one image
+        self.cache = cache
+        self.max_chars = max_chars
+        self.max_ocr_pixels = max_ocr_pixels
+        self.ocr_timeout = ocr_timeout
+
+    @staticmethod
+    def needs_ocr(file_path):
+        return os.path.splitext(file_path.lower())[1] in OCR_EXTENSIONS
+
     def extract(self, file_path):
-        _, ext = os.path.splitext(file_path.lower())
+        return self.extract_cached(file_path)[0]
+
+    def extract_cached(self, file_path):
+        # returns (text, cache_hit); PDF pages are separated by PAGE_BREAK
+        key = None
+        if self.cache is not None:
+            key = ExtractionCache.key_for(file_path, f"{self.VERSION}:{self.max_chars}:{self.max_ocr_pixels}")
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached, True
+
+        try:
+            # one join at the end instead of growing a string page by page
+            text = "".join(self.iter_pages(file_path))
+        except TimeoutError:
+            # reported to the caller, the file is tried again on the next run
+            raise
+        except Exception as e:
+            raise ExtractionError(f"{type(e).__name__}: {e}") from e
 
+        if key is not None:
+            self.cache.put(key, text)
+        return text, False
+
+    def iter_pages(self, file_path):
+        # Streams the text page by page (PDF) or chunk by chunk (text files) and stops once
+        # max_chars is reached, so a huge file is never read further than what gets indexed.
+        _, ext = os.path.splitext(file_path.lower())
         if ext == ".txt":
-            return self._extract_txt(file_path)
+            pages = self._extract_txt(file_path)
         elif ext == ".pdf":
-            return self._extract_pdf(file_path)
-        elif ext in [".png", ".jpg", ".jpeg", ".bmp"]:
-            return self._extract_image(file_path)
+            pages = self._extract_pdf(file_path)
+        elif ext in OCR_EXTENSIONS:
+            pages = iter([self._extract_image(file_path)])
         else:
-            return ""
+            pages = iter(())
+        remaining = self.max_chars + 1 if self.max_chars is not None else None
+        try:
+            for page in pages:
+                if remaining is not None:
+                    page = page[:remaining]
+                    remaining -= len(page)
+                yield page
+                if remaining is not None and remaining <= 0:
+                    break
+        finally:
+            # closes the file or PDF of a generator that was left early
+            if hasattr(pages, "close"):
+                pages.close()
 
     def _extract_txt(self, file_path):
-        try:
-            with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-                return f.read()
-        except Exception as e:
-            print(f"Failed to extract text file {file_path}: {e}")
-            return ""
+        # A text file has no pages of its own: it is split into chunks of about TXT_CHUNK_CHARS,
+        # at a line break where there is one. A form feed in the file is not taken for a page break.
+        with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
+            rest, separator = "", ""
+            for block in iter(lambda: f.read(TXT_CHUNK_CHARS), ""):
+                text = rest + block.replace(PAGE_BREAK, "\n")
+                cut = text.rfind("\n") + 1 or len(text)
+                text, rest = text[:cut], text[cut:]
+                yield separator + text
+                separator = PAGE_BREAK
+            if rest:
+                yield separator + rest
 
     def _extract_pdf(self, file_path):
-        text = ""
-        try:
-            with fitz.open(file_path) as doc:
-                for page in doc:
-                    text += page.get_text()
-        except Exception as e:
-            print(f"Failed to extract from PDF {file_path}: {e}")
-        return text
+        with fitz.open(file_path) as doc:
+            for number, page in enumerate(doc):
+                text = page.get_text()
+                yield text if number == 0 else PAGE_BREAK + text
 
     def _extract_image(self, file_path):
-        text = ""
-        try:
-            with Image.open(file_path) as img:
-                text = pytesseract.image_to_string(img)
-        except Exception as e:
-            print(f"Failed to extract image {file_path}: {e}")
-        return text
\ No newline at end of file
+        with Image.open(file_path) as img:
+            pixels = img.width * img.height
+            if self.max_ocr_pixels and pixels > self.max_ocr_pixels:
+                # OCR time grows with the pixel count; JPEGs are decoded at the reduced size directly
+                scale = math.sqrt(self.max_ocr_pixels / pixels)
+                size = (max(1, int(img.width * scale)), max(1, int(img.height * scale)))
+                img.draft("RGB", size)
+                img = img.resize(size)
+            try:
+                return pytesseract.image_to_string(img, timeout=self.ocr_timeout or 0)
+            except RuntimeError as e:
+                # pytesseract kills the tesseract process and raises RuntimeError on timeout
+                if "timeout" in str(e).lower():
+                    raise TimeoutError(f"OCR did not finish within {self.ocr_timeout}s") from e
+                raise
+
+def create_text_extractor(config):
+    # extractor with the extraction cache, size limit and OCR settings of config.json
+    settings = config.get_extraction_cache_settings()
+    ocr = config.get_ocr_settings()
+    cache = ExtractionCache(settings["path"], settings["max_mb"] * 1024 * 1024) if settings["path"] else None
+    return TextExtractor(cache, config.get_max_indexed_chars(),
+                         max_ocr_pixels=int(ocr["max_megapixels"] * 1000 * 1000), ocr_timeout=ocr["timeout"])
@@ -0,0 +1,48 @@
+import re
+from collections import Counter
+
+TOKEN_PATTERN = re.compile(r"\w+")
+MAX_TOKEN_LENGTH = 64  # longer "words" are usually hashes/base64 noise
+MAX_TERM_OFFSETS = 16  # occurrences per term and file kept for snippet selection
+PAGE_BREAK = "\f"  # separates the pages of an extracted text
+
+def tokenize(text):
+    if not text:
+        return []
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if len(token) <= MAX_TOKEN_LENGTH]
+
+def term_frequencies(*texts):
+    # term -> number of occurrences across all given texts (file name + content)
+    counts = Counter()
+    for text in texts:
+        counts.update(tokenize(text))
+    return counts
+
+def term_offsets(text, max_per_term=MAX_TERM_OFFSETS):
+    # term -> character offsets of its first occurrences in text
+    offsets = {}
+    if not text:
+        return offsets
+    for match in TOKEN_PATTERN.finditer(text):
+        token = match.group().lower()
+        if len(token) > MAX_TOKEN_LENGTH:
+            continue
+        positions = offsets.setdefault(token, [])
+        if len(positions) < max_per_term:
+            positions.append(match.start())
+    return offsets
+
+def prefix_upper_bound(prefix):
+    # smallest string greater than every string starting with prefix
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+def page_starts(text):
+    # character offsets at which the pages after the first one begin
+    starts = []
+    if not text:
+        return starts
+    position = text.find(PAGE_BREAK)
+    while position != -1:
+        starts.append(position + 1)
+        position = text.find(PAGE_BREAK, position + 1)
+    return starts
@@ -0,0 +1,298 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+
+# inotify(7) event masks
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+WATCH_MASK = (IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_ONLYDIR)
+EVENT_HEADER = struct.Struct("iIII")
+
+# Backends report (action, path, src) tuples:
+#   upsert / delete            a file was written / removed
+#   move / move_tree           a file / directory was renamed from src to path
+#   delete_tree                a directory was removed
+#   rescan                     events were lost, the whole root must be re-crawled
+
+class InotifyBackend:
+    def __init__(self, roots, crawler):
+        self.crawler = crawler
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.libc = libc
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.watches = {}  # wd -> directory path
+        for root in roots:
+            self._watch_tree(root)
+
+    def close(self):
+        os.close(self.fd)
+
+    def _watch_tree(self, top):
+        pending = [top]
+        while pending:
+            directory = pending.pop()
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+            if wd < 0:
+                continue
+            self.watches[wd] = directory
+            try:
+                with os.scandir(directory) as it:
+                    for entry in it:
+                        if entry.is_dir(follow_symlinks=False) and not self.crawler.is_ignored(entry.name):
+                            pending.append(entry.path)
+            except OSError:
+                continue
+
+    def _unwatch_tree(self, top):
+        prefix = os.path.join(top, "")
+        for wd, directory in list(self.watches.items()):
+            if directory == top or directory.startswith(prefix):
+                self.libc.inotify_rm_watch(self.fd, wd)
+                del self.watches[wd]
+
+    def _retarget_tree(self, old, new):
+        # watches follow the inode, only our wd -> path map has to be rewritten
+        prefix = os.path.join(old, "")
+        for wd, directory in self.watches.items():
+            if directory == old:
+                self.watches[wd] = new
+            elif directory.startswith(prefix):
+                self.watches[wd] = os.path.join(new, directory[len(prefix):])
+
+    def _tree_files(self, top):
+        return [("upsert", entry.path, None) for entry in self.crawler.crawl(top)]
+
+    def read_events(self, timeout):
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        events = []
+        moved_from = {}  # cookie -> (path, is_dir), paired with the IN_MOVED_TO that follows
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = EVENT_HEADER.unpack_from(data, offset)
+            name = data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b"\0")
+            offset += EVENT_HEADER.size + length
+
+            if mask & IN_Q_OVERFLOW:
+                events.append(("rescan", None, None))
+                continue
+            if mask & IN_IGNORED:
+                self.watches.pop(wd, None)
+                continue
+            directory = self.watches.get(wd)
+            if directory is None or not name:
+                continue
+            name = os.fsdecode(name)
+            path = os.path.join(directory, name)
+            is_dir = bool(mask & IN_ISDIR)
+            if self.crawler.is_ignored(name):
+                continue
+
+            if mask & IN_MOVED_FROM:
+                moved_from[cookie] = (path, is_dir)
+            elif mask & IN_MOVED_TO:
+                src = moved_from.pop(cookie, None)
+                if is_dir:
+                    if src is not None:
+                        self._retarget_tree(src[0], path)
+                        events.append(("move_tree", path, src[0]))
+                    else:
+                        # moved in from outside the watched roots
+                        self._watch_tree(path)
+                        events.extend(self._tree_files(path))
+                elif src is not None:
+                    events.append(("move", path, src[0]))
+                else:
+                    events.append(("upsert", path, None))
+            elif mask & IN_CREATE and is_dir:
+                # files may have landed before the watch existed
+                self._watch_tree(path)
+                events.extend(self._tree_files(path))
+            elif mask & IN_DELETE:
+                events.append(("delete_tree" if is_dir else "delete", path, None))
+            elif not is_dir:
+                events.append(("upsert", path, None))
+
+        # moved out of the watched roots
+        for path, is_dir in moved_from.values():
+            if is_dir:
+                self._unwatch_tree(path)
+            events.append(("delete_tree" if is_dir else "delete", path, None))
+        return events
+
+class PollingBackend:
+    # Fallback for platforms without inotify: diff crawl snapshots every poll_interval seconds
+    def __init__(self, roots, crawler, poll_interval=5.0):
+        self.roots = roots
+        self.crawler = crawler
+        self.poll_interval = poll_interval
+        self.snapshot = self._snapshot()
+        self.next_poll = time.monotonic() + poll_interval
+
+    def close(self):
+        pass
+
+    def _snapshot(self):
+        return {entry.path: (entry.last_modified, entry.size)
+                for root in self.roots for entry in self.crawler.crawl(root)}
+
+    def read_events(self, timeout):
+        wait = self.next_poll - time.monotonic()
+        if wait > timeout:
+            time.sleep(timeout)
+            return []
+        time.sleep(max(0.0, wait))
+        self.next_poll = time.monotonic() + self.poll_interval
+        current = self._snapshot()
+        events = [("upsert", path, None) for path, state in current.items() if self.snapshot.get(path) != state]
+        events.extend(("delete", path, None) for path in self.snapshot.keys() - current.keys())
+        self.snapshot = current
+        return events
+
+class FileWatcher:
+    # Background service keeping the index in sync with the watched roots.
+    # Events are coalesced per path and applied once nothing happened for `debounce` seconds.
+    def __init__(self, indexer, crawler, roots, debounce=1.0, poll_interval=5.0, backend="auto"):
+        self.indexer = indexer
+        self.db_adapter = indexer.db_adapter
+        self.crawler = crawler
+        self.roots = [os.path.abspath(root) for root in roots]
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.backend_name = backend
+        self.backend = None
+        self.pending = {}  # path -> (action, src)
+        self.last_event = 0.0
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def _create_backend(self):
+        if self.backend_name in ("auto", "inotify") and sys.platform.startswith("linux"):
+            try:
+                return InotifyBackend(self.roots, self.crawler)
+            except Exception as e:
+                if self.backend_name == "inotify":
+                    raise
+                print(f"[Watcher] inotify unavailable ({e}), falling back to polling")
+        return PollingBackend(self.roots, self.crawler, self.poll_interval)
+
+    def start(self):
+        self.backend = self._create_backend()
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, name="FileWatcher", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def is_running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def _run(self):
+        try:
+            while not self.stop_event.is_set():
+                events = self.backend.read_events(min(self.debounce, 0.5))
+                for action, path, src in events:
+                    self._add_event(action, path, src)
+                if events:
+                    self.last_event = time.monotonic()
+                elif self.pending and time.monotonic() - self.last_event >= self.debounce:
+                    self.flush()
+            self.flush()
+        finally:
+            self.backend.close()
+
+    def _is_indexable(self, path):
+        return self.crawler.is_allowed(os.path.basename(path))
+
+    def _add_event(self, action, path, src):
+        if action == "rescan":
+            self.pending = {root: ("rescan", None) for root in self.roots}
+            return
+        if action in ("upsert", "delete") and not self._is_indexable(path):
+            return
+        if action == "move":
+            if not self._is_indexable(path):
+                action, path = "delete", src
+            elif not self._is_indexable(src):
+                action, src = "upsert", None
+        if action in ("move", "move_tree"):
+            previous = self.pending.pop(src, None)
+            self.pending[src] = ("delete_tree" if action == "move_tree" else "delete", None)
+            if action == "move_tree":
+                # pending work inside the moved directory follows it
+                prefix = os.path.join(src, "")
+                for old in [p for p in self.pending if p.startswith(prefix)]:
+                    self.pending[os.path.join(path, old[len(prefix):])] = self.pending.pop(old)
+            if previous is not None and previous[0] == action:
+                src = previous[1]  # a -> b -> c is one rename a -> c
+            elif previous is not None and previous[0] == "upsert":
+                action, src = "upsert", None
+        self.pending[path] = (action, src)
+
+    def flush(self):
+        if not self.pending:
+            return
+        pending, self.pending = self.pending, {}
+        by_action = {}
+        for path, (action, src) in pending.items():
+            by_action.setdefault(action, []).append((path, src))
+
+        if "rescan" in by_action:
+            for root, _ in by_action["rescan"]:
+                self.indexer.process_files(self.crawler.crawl(root), root=root)
+            return
+
+        upserts = [path for path, _ in by_action.get("upsert", [])]
+        moved = removed = 0
+        # renames first, so deleting the old path afterwards is a no-op
+        for path, src in by_action.get("move_tree", []):
+            count = self.indexer.move_directory(src, path)
+            moved += count
+            if count == 0:
+                upserts.extend(entry.path for entry in self.crawler.crawl(path))
+        for path, src in by_action.get("move", []):
+            if self.indexer.move_file(src, path):
+                moved += 1
+            else:
+                upserts.append(path)
+        for path, _ in by_action.get("delete_tree", []):
+            removed += self.indexer.remove_directory(path)
+        deleted = [path for path, _ in by_action.get("delete", [])]
+        # a file can vanish again before the debounce expires
+        deleted.extend(path for path in upserts if not os.path.isfile(path))
+        upserts = [path for path in upserts if os.path.isfile(path)]
+        if deleted:
+            removed += self.indexer.remove_files(deleted)
+        indexed = 0
+        if upserts:
+            self.indexer.process_files(upserts)
+            indexed = self.indexer.processed_files
+
+        msg = f"Watch update: {indexed} file(s) indexed, {removed} removed, {moved} moved."
+        print(f"[Watcher] {msg}")
+        self.db_adapter.insert_log("INFO", msg)